@@ -0,0 +1,105 @@
+__author__ = "Jose Antonio Martin H."
+__copyright__ = "Copyright 2015, Jose Antonio Martin H."
+__credits__ = ["The Orange Machine Learning Project, Jose Antonio Martin H. "]
+__license__ = "Apache License 2.0"
+__maintainer__ = "JOse Antonio Martin H."
+__email__ = "xjamartinh@gmail.com"
+
+from pyspark.sql import functions as F
+from pyspark.sql.types import ArrayType, MapType, StructType
+
+from orangecontrib.spark.utils.spark_api_utils import quote_column
+from orangecontrib.spark.utils.stats_utils import quantile_name
+
+AGGREGATIONS = ['count', 'sum', 'mean', 'min', 'max', 'stddev', 'approx quantiles', 'approx distinct', 'collect set']
+GROUPINGS = ['group by', 'rollup', 'cube']
+
+
+def _approx_count_distinct(column, relative_error):
+    approx = getattr(F, 'approx_count_distinct', None) or F.approxCountDistinct
+    return approx(column, relative_error)
+
+
+def aggregate_columns(column, aggregation, quantiles = (0.25, 0.5, 0.75), relative_error = 0.01, max_set_size = 100):
+    """
+    The aggregate expressions computing `aggregation` over `column`, named '<aggregation>(<column>)'.
+    Approximate quantiles give one expression per quantile. Sets are truncated to `max_set_size` values,
+    the cap bounds the size of the output rows only: collect_set still builds the complete set of every group
+    while aggregating, so it needs memory for all the distinct values of the largest group.
+    'collect set' needs Spark >= 2.4 (slice), older versions fail with an AnalysisException.
+    """
+    name = quote_column(column)
+    value = F.col(name)
+    if aggregation == 'count':
+        return [F.count(value).alias('count({0})'.format(column))]
+    if aggregation in ('sum', 'min', 'max', 'stddev'):
+        return [getattr(F, aggregation)(value).alias('{0}({1})'.format(aggregation, column))]
+    if aggregation == 'mean':
+        return [F.avg(value).alias('mean({0})'.format(column))]
+    if aggregation == 'approx distinct':
+        return [_approx_count_distinct(value, relative_error).alias('distinct({0})'.format(column))]
+    if aggregation == 'approx quantiles':
+        accuracy = max(1, int(round(1.0 / relative_error)))
+        return [F.expr('percentile_approx(CAST({0} AS DOUBLE), {1!r}, {2})'.format(name, float(q), accuracy))
+                .alias('{0}({1})'.format(quantile_name(q), column)) for q in quantiles]
+    if aggregation == 'collect set':
+        # Spark >= 2.4
+        return [F.expr('slice(collect_set({0}), 1, {1})'.format(name, int(max_set_size))).alias('set({0})'.format(column))]
+    raise ValueError('Unknown aggregation: {0}'.format(aggregation))
+
+
+def pivot_values(df, column, max_values = 100):
+    """
+    The distinct values of the pivot `column`, sorted. Passing them to GroupedData.pivot saves the
+    distinct pass pivot would run otherwise, and they can be reused for every new aggregation.
+    :raise ValueError: if the column has more than `max_values` distinct values.
+    """
+    rows = df.select(F.col(quote_column(column))).distinct().limit(max_values + 1).collect()
+    if len(rows) > max_values:
+        raise ValueError('The pivot column {0} has more than {1} distinct values'.format(column, max_values))
+    return sorted((r[0] for r in rows), key = lambda v: (v is None, v))
+
+
+def aggregate(df, keys, columns, aggregations, grouping = 'group by', pivot_column = None, values = None, quantiles = (0.25, 0.5, 0.75),
+              relative_error = 0.01, max_set_size = 100):
+    """
+    Aggregate `columns` of `df` by `keys` with every function in `aggregations`, plus a row count.
+    :param grouping: one of GROUPINGS. Rollup and cube add a `grouping_id` column telling the subtotal levels apart.
+    :param pivot_column: pivot the aggregations on the values of this column, only with 'group by'.
+    :param values: the pivot values, see pivot_values. Spark computes them with an extra job when None.
+    """
+    expressions = [F.count(F.lit(1)).alias('count')]
+    for column in columns:
+        for aggregation in aggregations:
+            expressions += aggregate_columns(column, aggregation, quantiles, relative_error, max_set_size)
+
+    key_columns = [F.col(quote_column(k)) for k in keys]
+    if pivot_column:
+        if grouping != 'group by':
+            raise ValueError('Pivot is only supported with group by, not with {0}'.format(grouping))
+        pivot_name = quote_column(pivot_column)
+        grouped = df.groupBy(*key_columns).pivot(pivot_name, values) if values is not None else \
+            df.groupBy(*key_columns).pivot(pivot_name)
+        return grouped.agg(*expressions)
+
+    if grouping == 'group by':
+        return df.groupBy(*key_columns).agg(*expressions)
+    grouped = df.rollup(*key_columns) if grouping == 'rollup' else df.cube(*key_columns)
+    return grouped.agg(F.grouping_id().alias('grouping_id'), *expressions)
+
+
+def flatten_for_orange(df):
+    """
+    Turn the nested columns of `df` into strings so that it can go through toPandas to Orange:
+    arrays of primitive values as comma separated values, maps, structs and arrays of them as JSON.
+    """
+    nested = (ArrayType, MapType, StructType)
+    columns = []
+    for f in df.schema.fields:
+        column = F.col(quote_column(f.name))
+        if isinstance(f.dataType, ArrayType) and not isinstance(f.dataType.elementType, nested):
+            column = F.concat_ws(', ', column.cast('array<string>')).alias(f.name)
+        elif isinstance(f.dataType, nested):
+            column = F.to_json(column).alias(f.name)
+        columns.append(column)
+    return df.select(*columns)
@@ -5,6 +5,8 @@ Created on 20/02/2014
 '''
 
 import csv
+import re
+from bisect import bisect_left, bisect_right
 from collections import OrderedDict
 from io import StringIO
 
@@ -12,18 +14,172 @@ import Orange
 import numpy as np
 import pandas as pd
 import sqlparse
+from sqlparse.sql import Identifier, IdentifierList, Parenthesis
+from sqlparse.tokens import Keyword, Comment
 
 
 def format_sql(str_sql):
     return str(sqlparse.format(str_sql, reindent = True, keyword_case = 'upper'))
 
 
+def normalize_sql(str_sql):
+    """
+    Normalize a query text so that queries differing only in layout, comments or keyword case compare equal.
+    Only the whitespace between tokens is collapsed, string literals and quoted identifiers are kept verbatim.
+    """
+    text = sqlparse.format(str_sql, strip_comments = True, keyword_case = 'upper')
+    parts = []
+    for statement in sqlparse.parse(text):
+        for token in statement.flatten():
+            if token.is_whitespace:
+                if parts and parts[-1] != ' ':
+                    parts.append(' ')
+            else:
+                parts.append(token.value)
+    return ''.join(parts).strip().rstrip(';').strip()
+
+
+def extract_table_names(str_sql):
+    """
+    Find the tables and views a SQL text reads from, i.e. the names following FROM and JOIN clauses.
+    Names defined by a WITH clause are not reported.
+    :return: a list of (possibly qualified) names in order of appearance, without duplicates.
+    """
+    tables = []
+    cte_names = set()
+    for statement in sqlparse.parse(str_sql):
+        _collect_table_names(statement, tables, cte_names)
+    return [t for t in OrderedDict.fromkeys(tables) if t.lower() not in cte_names]
+
+
+_DEFINED_NAME = re.compile(r'^\s*(?:CREATE\s+(?:OR\s+REPLACE\s+)?(?:GLOBAL\s+)?(?:TEMPORARY\s+|TEMP\s+)?(?:VIEW|TABLE)\s+'
+                           r'(?:IF\s+NOT\s+EXISTS\s+)?|CACHE\s+(?:LAZY\s+)?TABLE\s+)([\w.`]+)', re.IGNORECASE)
+
+SELECT = 'SELECT'
+DEFINE = 'DEFINE'
+BARRIER = 'BARRIER'
+
+
+def _normalize_name(name):
+    return name.replace('`', '').lower()
+
+
+def split_sql_script(str_sql):
+    """
+    Split a SQL script into statements and classify them.
+    :return: a list of (statement, kind, defined names, referenced names) where kind is
+             SELECT, DEFINE (CREATE VIEW/TABLE, CACHE TABLE) or BARRIER (anything else, e.g. SET, INSERT, DROP).
+    """
+    statements = []
+    for statement in sqlparse.split(str_sql):
+        code = sqlparse.format(statement, strip_comments = True).strip().rstrip(';').strip()
+        if not code:
+            continue
+        referenced = set(_normalize_name(t) for t in extract_table_names(code))
+        match = _DEFINED_NAME.match(code)
+        if match:
+            kind, defined = DEFINE, {_normalize_name(match.group(1))}
+        elif sqlparse.parse(code)[0].get_type() == 'SELECT':
+            kind, defined = SELECT, set()
+        else:
+            kind, defined = BARRIER, set()
+        statements.append((code, kind, defined, referenced))
+    return statements
+
+
+def sql_script_dependencies(statements):
+    """
+    Build the dependency graph of the statements returned by split_sql_script.
+    A statement depends on an earlier one if it reads or redefines a name the earlier one defines,
+    or if it redefines a name the earlier one reads. BARRIER statements are ordered against everything.
+    :return: a list with the set of indexes each statement depends on.
+    """
+    dependencies = []
+    last_barrier = None
+    for j, (_, kind_j, defined_j, referenced_j) in enumerate(statements):
+        if kind_j == BARRIER:
+            depends = set(range(j))
+            last_barrier = j
+        else:
+            depends = set() if last_barrier is None else {last_barrier}
+            for i, (_, kind_i, defined_i, referenced_i) in enumerate(statements[:j]):
+                if defined_i & (referenced_j | defined_j) or referenced_i & defined_j:
+                    depends.add(i)
+        dependencies.append(depends)
+    return dependencies
+
+
+def _identifier_name(identifier):
+    name = identifier.get_real_name()
+    parent = identifier.get_parent_name()
+    return parent + '.' + name if parent else name
+
+
+def _collect_table_names(token_list, tables, cte_names):
+    from_seen = cte_seen = False
+    for token in token_list.tokens:
+        if token.is_whitespace or token.ttype in Comment:
+            continue
+        if token.ttype is Keyword.CTE:
+            cte_seen = True
+            continue
+        if token.ttype is Keyword:
+            from_seen = token.normalized == 'FROM' or token.normalized.endswith('JOIN')
+            continue
+
+        identifiers = []
+        if isinstance(token, IdentifierList):
+            identifiers = [t for t in token.get_identifiers() if isinstance(t, Identifier)]
+        elif isinstance(token, Identifier):
+            identifiers = [token]
+
+        if (from_seen or cte_seen) and identifiers:
+            for identifier in identifiers:
+                subqueries = [t for t in identifier.tokens if isinstance(t, Parenthesis)]
+                if cte_seen:
+                    cte_names.add(identifier.get_real_name().lower())
+                elif not subqueries:
+                    tables.append(_identifier_name(identifier))
+                for subquery in subqueries:
+                    _collect_table_names(subquery, tables, cte_names)
+        elif token.is_group:
+            _collect_table_names(token, tables, cte_names)
+        from_seen = cte_seen = False
+
+
 def pandas_to_orange(df):
     domain, attributes, metas = construct_domain(df)
     orange_table = Orange.data.Table.from_numpy(domain = domain, X = df[attributes].values, Y = None, metas = df[metas].values, W = None)
     return orange_table
 
 
+def arrays_to_orange(numeric_names, X, meta_names = (), M = None, integer_columns = ()):
+    """
+    Build an Orange Table straight from preallocated buffers, without an intermediate pandas DataFrame.
+    Variables are inferred as in construct_domain: integer columns with few distinct values are discrete,
+    the other numeric columns continuous and the rest string meta attributes.
+    :param numeric_names: the names of the columns of X.
+    :param X: a float 2D array (NaN for missing), discrete columns are replaced in place by value indexes.
+    :param meta_names: the names of the columns of M.
+    :param M: an object 2D array with the non numeric columns.
+    :param integer_columns: the names of the numeric columns holding integer values.
+    """
+    attributes = []
+    for j, name in enumerate(numeric_names):
+        column = X[:, j]
+        missing = np.isnan(column)
+        uniques = np.unique(column[~missing])
+        if name in integer_columns and len(uniques) < 13 and (not len(uniques) or uniques.max() <= len(uniques)):
+            attributes.append(Orange.data.DiscreteVariable(name, values = [str(int(v)) for v in uniques]))
+            column[~missing] = np.searchsorted(uniques, column[~missing])
+        else:
+            attributes.append(Orange.data.ContinuousVariable(name))
+
+    metas = [Orange.data.StringVariable(name) for name in meta_names]
+    domain = Orange.data.Domain(attributes = attributes, metas = metas)
+    return Orange.data.Table.from_numpy(domain = domain, X = X, Y = None, metas = M if metas else None, W = None)
+
+
 def orange_to_pandas(dt):
     fileIO = StringIO()
     save_csv_IO(dt, fileIO, delimiter = ',')
@@ -112,3 +268,92 @@ def load_csvIO(fileIO, domain):
     table = Orange.data.Table(domain, data)
 
     return table
+
+
+NUMERIC_TYPES = ('tinyint', 'smallint', 'int', 'bigint', 'float', 'double', 'decimal')
+TYPE_GROUPS = ['numeric', 'string', 'boolean', 'vector', 'other']
+
+
+def type_group(type_name):
+    """
+    Group a Spark simpleString type name, e.g. 'decimal(10,2)' -> 'numeric'.
+    """
+    base = type_name.split('(', 1)[0]
+    if base in NUMERIC_TYPES:
+        return 'numeric'
+    if base in ('string', 'boolean', 'vector'):
+        return base
+    return 'other'
+
+
+class ColumnIndex:
+    """
+    Name and type index over the columns of a (very wide) schema.
+
+    Prefix lookups bisect a sorted list of lower case names and substring lookups scan a single
+    joined string with str.find, so filtering does not run Python code for every column.
+    """
+
+    def __init__(self, fields):
+        """
+        :param fields: a list of (column name, Spark simpleString type).
+        """
+        self.names = [name for name, _ in fields]
+        self.types = dict((name, type_group(type_name)) for name, type_name in fields)
+        lower = [name.lower() for name in self.names]
+        order = sorted(range(len(lower)), key = lower.__getitem__)
+        self.sorted_keys = [lower[i] for i in order]
+        self.sorted_names = [self.names[i] for i in order]
+        self.text = '\n'.join(lower)
+        self.starts = []
+        start = 0
+        for name in lower:
+            self.starts.append(start)
+            start += len(name) + 1
+
+    def __len__(self):
+        return len(self.names)
+
+    def prefix(self, prefix):
+        prefix = prefix.lower()
+        lo = bisect_left(self.sorted_keys, prefix)
+        hi = bisect_left(self.sorted_keys, prefix + '\uffff')
+        return set(self.sorted_names[lo:hi])
+
+    def substring(self, substring):
+        substring = substring.lower()
+        found = set()
+        position = self.text.find(substring)
+        while position >= 0:
+            i = bisect_right(self.starts, position) - 1
+            found.add(self.names[i])
+            if i + 1 == len(self.starts):
+                break
+            position = self.text.find(substring, self.starts[i + 1])
+        return found
+
+    def search(self, filter_string):
+        """
+        Columns matching every word of `filter_string`, words starting with '^' match a name prefix,
+        the others any part of the name.
+        :return: a set of names, or None when the filter is empty.
+        """
+        words = filter_string.split()
+        if not words:
+            return None
+        matched = None
+        for word in words:
+            found = self.prefix(word[1:]) if word.startswith('^') else self.substring(word)
+            matched = found if matched is None else matched & found
+            if not matched:
+                break
+        return matched
+
+    def match(self, pattern = '', group = None):
+        """
+        Columns whose name matches the regular expression `pattern` and whose type is in `group` (see TYPE_GROUPS).
+        Raises re.error for an invalid pattern.
+        """
+        regex = re.compile(pattern) if pattern else None
+        return [name for name in self.names
+                if (group is None or self.types[name] == group) and (regex is None or regex.search(name))]
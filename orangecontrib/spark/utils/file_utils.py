@@ -0,0 +1,94 @@
+__author__ = "Jose Antonio Martin H."
+__copyright__ = "Copyright 2015, Jose Antonio Martin H."
+__credits__ = ["The Orange Machine Learning Project, Jose Antonio Martin H. "]
+__license__ = "Apache License 2.0"
+__maintainer__ = "JOse Antonio Martin H."
+__email__ = "xjamartinh@gmail.com"
+
+import hashlib
+import json
+
+from pyspark.sql.types import StructType
+
+SOURCE_FORMATS = ['parquet', 'orc', 'json', 'csv']
+# Self describing formats, the schema is read from the file footers.
+FOOTER_FORMATS = ('parquet', 'orc')
+# Inferred schemas kept by read_files, the least recently used are dropped first.
+MAX_SCHEMA_CACHE_ENTRIES = 100
+
+
+def path_fingerprint(sc, path):
+    """
+    A digest of the path, size and modification time of every file under `path` (file, directory or glob),
+    recursively: rewriting a file inside a partition subdirectory does not change the directory mtimes.
+    :return: the hex digest, None if nothing matches.
+    """
+    jvm = sc._jvm
+    jpath = jvm.org.apache.hadoop.fs.Path(path)
+    fs = jpath.getFileSystem(sc._jsc.hadoopConfiguration())
+    statuses = fs.globStatus(jpath)
+    if not statuses:
+        return None
+    entries = []
+    for status in statuses:
+        if status.isDirectory():
+            files = fs.listFiles(status.getPath(), True)
+            while files.hasNext():
+                f = files.next()
+                entries.append((f.getPath().toString(), f.getLen(), f.getModificationTime()))
+        else:
+            entries.append((status.getPath().toString(), status.getLen(), status.getModificationTime()))
+    digest = hashlib.sha1()
+    for entry in sorted(entries):
+        digest.update(repr(entry).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def infer_schema_from_sample(hc, path, fmt, n_rows = 10000, options = None):
+    """
+    Infer the schema of json (one record per line) or csv files from their first `n_rows` lines only,
+    instead of the full scan the readers do by default.
+    """
+    lines = hc.read.text(path).limit(n_rows).rdd.map(lambda row: row[0])
+    reader = hc.read
+    for k, v in (options or { }).items():
+        reader = reader.option(k, v)
+    if fmt == 'json':
+        return reader.json(lines).schema
+    return reader.option('inferSchema', 'true').csv(lines).schema
+
+
+def schema_cache_key(path, fmt, options, fingerprint):
+    return json.dumps([path, fmt, sorted((options or { }).items()), fingerprint])
+
+
+def read_files(sc, hc, path, fmt, options = None, schema_cache = None, sample_rows = 10000, max_entries = MAX_SCHEMA_CACHE_ENTRIES):
+    """
+    Read the files at `path` into a DataFrame, partition columns (key=value directories) are discovered by Spark.
+    For json and csv the schema is inferred from a bounded sample and kept in `schema_cache`
+    (a dict, e.g. a widget setting) by path and path_fingerprint, so reopening does not infer again.
+    The dict is kept in least recently used order and bounded to `max_entries`.
+    :return: the DataFrame and whether the schema came from the cache.
+    """
+    reader = hc.read.format(fmt)
+    for k, v in (options or { }).items():
+        reader = reader.option(k, v)
+    if fmt in FOOTER_FORMATS:
+        return reader.load(path), False
+
+    key = schema_cache_key(path, fmt, options, path_fingerprint(sc, path))
+    cached = schema_cache is not None and key in schema_cache
+    if cached:
+        # Move to the most recently used end.
+        schema_cache[key] = schema_cache.pop(key)
+        schema = StructType.fromJson(json.loads(schema_cache[key]))
+    else:
+        schema = infer_schema_from_sample(hc, path, fmt, sample_rows, options)
+        if schema_cache is not None:
+            # Only the current version of a path is kept.
+            for k in [k for k in schema_cache if json.loads(k)[:3] == json.loads(key)[:3]]:
+                del schema_cache[k]
+            schema_cache[key] = schema.json()
+            for k in list(schema_cache)[:max(0, len(schema_cache) - max_entries)]:
+                del schema_cache[k]
+    return reader.schema(schema).load(path), cached
@@ -101,3 +101,56 @@ def create_auto_combobox(parent_widget, values, callback_func = None):
 
     combo.activated[str].connect(callback_func)
     return combo
+
+
+def create_filtered_list_view(parent_widget, model, place_holder_text = 'Filter'):
+    """
+    Create a multi-selection list view over `model` with a filter line edit on top.
+    Qt item views only paint the visible rows, so this stays responsive for very long lists.
+    :return: the view, its rows are mapped through a QSortFilterProxyModel.
+    """
+    filter_edit = QtGui.QLineEdit(parent_widget)
+    filter_edit.setPlaceholderText(place_holder_text)
+    proxy = QtGui.QSortFilterProxyModel(parent_widget)
+    proxy.setSourceModel(model)
+    proxy.setFilterCaseSensitivity(QtCore.Qt.CaseInsensitive)
+    filter_edit.textChanged.connect(proxy.setFilterFixedString)
+
+    view = QtGui.QListView(parent_widget)
+    view.setSelectionMode(QtGui.QListView.ExtendedSelection)
+    view.setUniformItemSizes(True)
+    view.setModel(proxy)
+
+    layout = parent_widget.layout()
+    layout.addWidget(filter_edit)
+    layout.addWidget(view)
+    return view
+
+
+def selected_rows(view):
+    """
+    Return the selected rows of `view` in terms of its source model.
+    """
+    rows = view.selectionModel().selectedRows()
+    model = view.model()
+    if isinstance(model, QtGui.QSortFilterProxyModel):
+        rows = [model.mapToSource(r) for r in rows]
+    return sorted(r.row() for r in rows)
+
+
+def select_rows(view, rows):
+    """
+    Select the given source model `rows` in `view`, contiguous rows are selected as a single range.
+    """
+    model = view.model()
+    source = model.sourceModel() if isinstance(model, QtGui.QSortFilterProxyModel) else model
+    selection = QtGui.QItemSelection()
+    rows = sorted(rows)
+    start = 0
+    for i in range(1, len(rows) + 1):
+        if i == len(rows) or rows[i] != rows[i - 1] + 1:
+            selection.select(source.index(rows[start], 0), source.index(rows[i - 1], 0))
+            start = i
+    if isinstance(model, QtGui.QSortFilterProxyModel):
+        selection = model.mapSelectionFromSource(selection)
+    view.selectionModel().select(selection, QtGui.QItemSelectionModel.ClearAndSelect)
@@ -0,0 +1,107 @@
+__author__ = "Jose Antonio Martin H."
+__copyright__ = "Copyright 2015, Jose Antonio Martin H."
+__credits__ = ["The Orange Machine Learning Project, Jose Antonio Martin H. "]
+__license__ = "Apache License 2.0"
+__maintainer__ = "JOse Antonio Martin H."
+__email__ = "xjamartinh@gmail.com"
+
+from collections import OrderedDict
+
+from pyspark.ml import Model
+from pyspark.sql import functions as F, Window
+from pyspark.sql.types import NumericType, StringType, BooleanType, FloatType, DoubleType
+
+from orangecontrib.spark.utils.spark_api_utils import quote_column
+
+STRATEGIES = ['constant', 'mean', 'median', 'mode']
+
+
+def numeric_columns(df, columns):
+    types = dict((f.name, f.dataType) for f in df.schema.fields)
+    return [c for c in columns if isinstance(types[c], NumericType)]
+
+
+def is_missing(column, data_type):
+    """
+    The missing values of a column: nulls, and NaN for float and double columns as DataFrame.fillna does.
+    """
+    if isinstance(data_type, (FloatType, DoubleType)):
+        return column.isNull() | F.isnan(column)
+    return column.isNull()
+
+
+def constant_fill_values(df, value, columns):
+    """
+    The fill values of DataFrame.fillna(value, subset): the value applies to the columns of a matching type only.
+    """
+    types = dict((f.name, f.dataType) for f in df.schema.fields)
+    if isinstance(value, bool):
+        compatible = BooleanType
+    elif isinstance(value, (int, float)):
+        compatible = NumericType
+    else:
+        compatible = StringType
+    return OrderedDict((c, value) for c in columns if isinstance(types[c], compatible))
+
+
+def compute_fill_values(df, columns, strategy, relative_error = 0.001):
+    """
+    Compute the fill value of every column with one distributed pass.
+    mean: a single aggregation, median: a single approxQuantile call over all the columns,
+    mode: all the columns are stacked as (column, value) pairs and counted in a single groupBy.
+    Mean and median only apply to numeric columns, the other columns are left out.
+    NaN counts as missing, it never becomes a fill value.
+    :return: an OrderedDict {column: value}, columns that are entirely missing are left out.
+    """
+    if strategy in ('mean', 'median'):
+        columns = numeric_columns(df, columns)
+    if not columns:
+        return OrderedDict()
+
+    # The columns named by their position, with NaN turned into null so that every aggregate skips it.
+    types = dict((f.name, f.dataType) for f in df.schema.fields)
+    present = df.select(*[F.when(~is_missing(F.col(quote_column(c)), types[c]), F.col(quote_column(c))).alias(str(i))
+                          for i, c in enumerate(columns)])
+    if strategy == 'mean':
+        row = present.agg(*[F.avg(str(i)).alias(str(i)) for i in range(len(columns))]).collect()[0]
+        values = list(row)
+    elif strategy == 'median':
+        values = [q[0] if q else None for q in present.approxQuantile([str(i) for i in range(len(columns))], [0.5], relative_error)]
+    elif strategy == 'mode':
+        pairs = F.explode(F.array(*[F.struct(F.lit(i).alias('column'), F.col(str(i)).cast('string').alias('value'))
+                                    for i in range(len(columns))])).alias('pair')
+        counts = present.select(pairs).select('pair.column', 'pair.value').where(F.col('value').isNotNull()) \
+            .groupBy('column', 'value').count()
+        rank = F.row_number().over(Window.partitionBy('column').orderBy(F.desc('count'), 'value'))
+        modes = dict((r['column'], r['value']) for r in counts.withColumn('rank', rank).where(F.col('rank') == 1).collect())
+        values = [modes.get(i) for i in range(len(columns))]
+    else:
+        raise ValueError('Unknown strategy: ' + str(strategy))
+
+    return OrderedDict((c, v) for c, v in zip(columns, values) if v is not None)
+
+
+class FillNaModel(Model):
+    """
+    A fitted imputation: replaces the nulls, and NaN of float and double columns, of every column by its fill value
+    in a single projection.
+    Emitted by the FillNa widget so the same values can be applied to scoring data.
+    """
+
+    def __init__(self, fill_values = None, strategy = 'constant'):
+        super().__init__()
+        self.fill_values = OrderedDict(fill_values or ())
+        self.strategy = strategy
+
+    def _transform(self, dataset):
+        types = dict((f.name, f.dataType) for f in dataset.schema.fields)
+        projection = []
+        for c in dataset.columns:
+            column = F.col(quote_column(c))
+            if c in self.fill_values:
+                column = F.when(is_missing(column, types[c]), F.lit(self.fill_values[c]).cast(types[c])).otherwise(column).alias(c)
+            projection.append(column)
+        return dataset.select(*projection)
+
+    def __repr__(self):
+        return 'FillNaModel({0}, {1!r})'.format(self.strategy, dict(self.fill_values))
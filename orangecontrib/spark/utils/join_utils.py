@@ -0,0 +1,120 @@
+__author__ = "Jose Antonio Martin H."
+__copyright__ = "Copyright 2015, Jose Antonio Martin H."
+__credits__ = ["The Orange Machine Learning Project, Jose Antonio Martin H. "]
+__license__ = "Apache License 2.0"
+__maintainer__ = "JOse Antonio Martin H."
+__email__ = "xjamartinh@gmail.com"
+
+from functools import reduce
+
+from pyspark.sql import functions as F
+
+from orangecontrib.spark.utils.spark_api_utils import quote_column, estimate_size_in_bytes
+
+JOIN_TYPES = ['inner', 'left', 'right', 'full', 'left_semi', 'left_anti', 'cross']
+
+# The sides that may be broadcast for every join type, the other side is streamed and keeps its unmatched rows.
+BROADCASTABLE = {
+    'inner': ('left', 'right'),
+    'cross': ('left', 'right'),
+    'left': ('right',),
+    'left_semi': ('right',),
+    'left_anti': ('right',),
+    'right': ('left',),
+    'full': (),
+}
+
+# The side whose skewed keys are spread over salt buckets, the other side is replicated once per bucket.
+# Full outer joins cannot be salted: the replicated rows without a match would come out once per bucket.
+SALTED_SIDE = {
+    'inner': 'left',
+    'left': 'left',
+    'left_semi': 'left',
+    'left_anti': 'left',
+    'right': 'right',
+}
+
+SALT = '__salt'
+
+
+def choose_broadcast_side(left, right, how, threshold):
+    """
+    The side to broadcast, the smallest allowed one whose estimated size is under `threshold` bytes.
+    :return: ('left', 'right' or None, left estimated size, right estimated size), sizes are None when unknown.
+    """
+    sizes = { 'left': estimate_size_in_bytes(left), 'right': estimate_size_in_bytes(right) }
+    candidates = [side for side in BROADCASTABLE[how] if sizes[side] is not None and sizes[side] <= threshold]
+    side = min(candidates, key = lambda s: sizes[s]) if candidates else None
+    return side, sizes['left'], sizes['right']
+
+
+def _key_columns(df, keys):
+    return [df[quote_column(k)] for k in keys]
+
+
+def skewed_keys(df, keys, fraction = 0.01, skew_factor = 10.0, max_keys = 100, seed = None):
+    """
+    Find the skewed join keys of `df` from the key frequencies of a sample.
+    A key is skewed when its frequency is over `skew_factor` times the mean key frequency.
+    :return: a list of (key values tuple, estimated number of rows), most frequent first.
+        Null keys never match and are ignored.
+    """
+    sample = df.sample(False, fraction, seed) if fraction < 1 else df
+    counts = sample.where(reduce(lambda a, b: a & b, [c.isNotNull() for c in _key_columns(sample, keys)])) \
+        .groupBy(*_key_columns(sample, keys)).count()
+    counts = counts.persist()
+    try:
+        row = counts.agg(F.sum('count'), F.count(F.lit(1))).collect()[0]
+        if not row[1]:
+            return []
+        threshold = max(2.0, skew_factor * row[0] / row[1])
+        top = counts.where(F.col('count') >= threshold).orderBy(F.desc('count')).limit(max_keys).collect()
+    finally:
+        counts.unpersist()
+    return [(tuple(r[:-1]), r[-1] / fraction) for r in top]
+
+
+def _matches_any(df, keys, values):
+    columns = _key_columns(df, keys)
+    return reduce(lambda a, b: a | b, [reduce(lambda a, b: a & b, [c == v for c, v in zip(columns, key)]) for key in values])
+
+
+def join(left, right, left_keys, right_keys = None, how = 'inner', broadcast = None, skewed = (), n_salts = 8, seed = None):
+    """
+    Join `left` with `right` on equal keys.
+    :param right_keys: the key names on the right side, when None they are the same as `left_keys` and appear once in the output.
+    :param broadcast: 'left', 'right' or None, the side to hint as broadcast.
+    :param skewed: key values tuples, see skewed_keys, found on the salted side of SALTED_SIDE.
+        Their rows are spread over `n_salts` random buckets and the matching rows of the other side are replicated
+        into every bucket. Ignored when a side is broadcast, broadcast joins do not suffer from skew.
+    """
+    right_keys = left_keys if right_keys is None else right_keys
+    if broadcast == 'left':
+        left = F.broadcast(left)
+    elif broadcast == 'right':
+        right = F.broadcast(right)
+    if how == 'cross':
+        return left.crossJoin(right)
+
+    salted = SALTED_SIDE.get(how) if skewed and not broadcast else None
+    if salted:
+        buckets = F.array(*[F.lit(i) for i in range(n_salts)])
+        if salted == 'left':
+            left = left.withColumn(SALT, F.when(_matches_any(left, left_keys, skewed), F.floor(F.rand(seed) * n_salts).cast('int')).otherwise(0))
+            right = right.withColumn(SALT, F.explode(F.when(_matches_any(right, right_keys, skewed), buckets).otherwise(F.array(F.lit(0)))))
+        else:
+            right = right.withColumn(SALT, F.when(_matches_any(right, right_keys, skewed), F.floor(F.rand(seed) * n_salts).cast('int')).otherwise(0))
+            left = left.withColumn(SALT, F.explode(F.when(_matches_any(left, left_keys, skewed), buckets).otherwise(F.array(F.lit(0)))))
+        left_keys, right_keys = list(left_keys) + [SALT], list(right_keys) + [SALT]
+
+    if list(left_keys) == list(right_keys):
+        out = left.join(right, list(left_keys), how)
+        return out.drop(SALT) if salted else out
+
+    condition = reduce(lambda a, b: a & b, [l == r for l, r in zip(_key_columns(left, left_keys), _key_columns(right, right_keys))])
+    out = left.join(right, condition, how)
+    if salted:
+        out = out.drop(left[SALT])
+        if how not in ('left_semi', 'left_anti'):
+            out = out.drop(right[SALT])
+    return out
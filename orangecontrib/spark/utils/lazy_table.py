@@ -0,0 +1,312 @@
+__author__ = "Jose Antonio Martin H."
+__copyright__ = "Copyright 2015, Jose Antonio Martin H."
+__credits__ = ["The Orange Machine Learning Project, Jose Antonio Martin H. "]
+__license__ = "Apache License 2.0"
+__maintainer__ = "JOse Antonio Martin H."
+__email__ = "xjamartinh@gmail.com"
+
+from collections import defaultdict
+
+import numpy as np
+from Orange.data import Table, Domain, ContinuousVariable, DiscreteVariable, StringVariable
+from pyspark.sql import functions as F
+from pyspark.sql.types import NumericType, StringType, BooleanType, DateType, TimestampType
+
+from orangecontrib.spark.utils.spark_api_utils import quote_column
+
+MAX_DISCRETE_VALUES = 100
+# Continuous columns with more distinct values are binned for distributions and contingencies.
+MAX_BINS = 1000
+AUTO_DL_LIMIT = 10000
+
+
+def _approx_count_distinct(column):
+    approx = getattr(F, 'approx_count_distinct', None) or F.approxCountDistinct
+    return approx(column)
+
+
+def _col(name):
+    return F.col(quote_column(name))
+
+
+def spark_domain(df, class_column = None, max_discrete_values = MAX_DISCRETE_VALUES):
+    """
+    Build an Orange Domain from the schema of a DataFrame: numeric columns are continuous, booleans and
+    strings with at most `max_discrete_values` distinct values are discrete, other strings, dates and
+    timestamps are string metas. Other types (vectors, arrays, ...) are left out.
+    At most two aggregations are run: approximate distinct counts of the strings, then their values.
+    """
+    fields = df.schema.fields
+    strings = [f.name for f in fields if isinstance(f.dataType, StringType)]
+    values = { }
+    if strings:
+        counts = df.agg(*[_approx_count_distinct(_col(c)) for c in strings]).collect()[0]
+        discrete = [c for c, n in zip(strings, counts) if n <= max_discrete_values]
+        if discrete:
+            row = df.agg(*[F.collect_set(_col(c)) for c in discrete]).collect()[0]
+            values = dict((c, sorted(v)) for c, v in zip(discrete, row))
+
+    attributes, class_vars, metas = [], [], []
+    for f in fields:
+        if isinstance(f.dataType, NumericType):
+            var = ContinuousVariable(f.name)
+        elif isinstance(f.dataType, BooleanType):
+            var = DiscreteVariable(f.name, values = ['false', 'true'])
+        elif f.name in values:
+            var = DiscreteVariable(f.name, values = values[f.name])
+        elif isinstance(f.dataType, (StringType, DateType, TimestampType)):
+            metas.append(StringVariable(f.name))
+            continue
+        else:
+            continue
+        (class_vars if f.name == class_column else attributes).append(var)
+    return Domain(attributes, class_vars, metas)
+
+
+class SparkTable(Table):
+    """
+    A lazy Orange Table over a Spark DataFrame, in the spirit of Orange's SqlTable.
+
+    Length, basic statistics, distributions and contingencies are computed by Spark aggregations,
+    only X, Y and metas are downloaded, as a random sample of at most `download_limit` rows.
+    """
+
+    def __new__(cls, *args, **kwargs):
+        # Table.__new__ dispatches on its arguments, none of its constructors applies here.
+        return super().__new__(cls)
+
+    def __init__(self, df, domain = None, class_column = None, max_discrete_values = MAX_DISCRETE_VALUES, download_limit = AUTO_DL_LIMIT,
+                 name = 'Spark DataFrame'):
+        self.df = df
+        self.domain = domain if domain is not None else spark_domain(df, class_column, max_discrete_values)
+        self.download_limit = download_limit
+        self.name = name
+        self.attributes = { }
+        self._len = None
+        self._bins = { }
+        self._X = self._Y = self._metas = self._W = self._ids = None
+
+    # Data access: a bounded sample is downloaded on first use.
+
+    def _select_expression(self, var):
+        column = _col(var.name)
+        if var.is_continuous:
+            return column.cast('double')
+        if var.is_discrete and var.values == ['false', 'true']:
+            return F.lower(column.cast('string'))
+        return column.cast('string')
+
+    def download_data(self, limit = None):
+        limit = limit or self.download_limit
+        variables = list(self.domain.variables) + list(self.domain.metas)
+        df = self.df
+        if len(self) > limit:
+            # Oversample a bit so the limit is almost always reached.
+            df = df.sample(False, min(1.0, 1.1 * limit / len(self)))
+        rows = df.select(*[self._select_expression(var).alias(str(i)) for i, var in enumerate(variables)]).limit(limit).collect()
+
+        def to_numeric(var, values):
+            if var.is_continuous:
+                return np.array([np.nan if v is None else v for v in values], dtype = float)
+            index = dict((value, i) for i, value in enumerate(var.values))
+            return np.array([index.get(v, np.nan) for v in values], dtype = float)
+
+        columns = list(zip(*rows)) if rows else [()] * len(variables)
+        n_attributes = len(self.domain.attributes)
+        n_class_vars = len(self.domain.class_vars)
+        numeric = [to_numeric(var, columns[i]) for i, var in enumerate(variables[:n_attributes + n_class_vars])]
+        self._X = np.column_stack(numeric[:n_attributes]) if n_attributes else np.empty((len(rows), 0))
+        self._Y = np.column_stack(numeric[n_attributes:]) if n_class_vars else np.empty((len(rows), 0))
+        if n_class_vars == 1:
+            self._Y = self._Y[:, 0]
+        self._metas = np.array([['' if v is None else v for v in columns[i]] for i in range(n_attributes + n_class_vars, len(variables))],
+                               dtype = object).T.reshape(len(rows), len(self.domain.metas))
+        self._W = np.empty((len(rows), 0))
+        self._ids = np.arange(len(rows))
+
+    def _downloaded(self, attribute):
+        if getattr(self, attribute) is None:
+            self.download_data()
+        return getattr(self, attribute)
+
+    X = property(lambda self: self._downloaded('_X'), lambda self, value: setattr(self, '_X', value))
+    Y = property(lambda self: self._downloaded('_Y'), lambda self, value: setattr(self, '_Y', value))
+    metas = property(lambda self: self._downloaded('_metas'), lambda self, value: setattr(self, '_metas', value))
+    W = property(lambda self: self._downloaded('_W'), lambda self, value: setattr(self, '_W', value))
+    ids = property(lambda self: self._downloaded('_ids'), lambda self, value: setattr(self, '_ids', value))
+
+    def __len__(self):
+        if self._len is None:
+            self._len = self.df.count()
+        return self._len
+
+    def approx_len(self, timeout_ms = 1000):
+        if self._len is not None:
+            return self._len
+        return int(self.df.rdd.countApprox(timeout_ms, 0.95))
+
+    def __bool__(self):
+        return True
+
+    def __iter__(self):
+        for i in range(self.X.shape[0]):
+            yield self[i]
+
+    def has_weights(self):
+        return False
+
+    def copy(self):
+        table = SparkTable(self.df, self.domain, download_limit = self.download_limit, name = self.name)
+        table._len = self._len
+        table._bins = dict(self._bins)
+        return table
+
+    def checksum(self, include_metas = True):
+        return hash(self.df._jdf.queryExecution().analyzed().toString())
+
+    def sample_percentage(self, percentage, no_cache = False):
+        return SparkTable(self.df.sample(False, percentage / 100.0), self.domain, download_limit = self.download_limit, name = self.name)
+
+    # Statistics, each one is a Spark aggregation.
+
+    def _variables(self, columns, include_metas = False):
+        if columns is None:
+            variables = list(self.domain.variables)
+            if include_metas:
+                variables += list(self.domain.metas)
+            return variables
+        return [self.domain[c] for c in columns]
+
+    def _compute_basic_stats(self, columns = None, include_metas = False, compute_variance = False):
+        """
+        :return: a (min, max, mean, variance, nans, non nans) tuple per column, from a single aggregation.
+        """
+        variables = self._variables(columns, include_metas)
+        aggregates = []
+        for var in variables:
+            column = _col(var.name)
+            if var.is_continuous:
+                value = column.cast('double')
+                aggregates += [F.min(value), F.max(value), F.avg(value), F.var_pop(value) if compute_variance else F.lit(0.0)]
+            else:
+                aggregates += [F.lit(None).cast('double')] * 3 + [F.lit(0.0)]
+            aggregates += [F.sum(column.isNull().cast('int')), F.count(column)]
+        if not aggregates:
+            return []
+        row = self.df.agg(*aggregates).collect()[0]
+        if self._len is None:
+            # Nulls plus non nulls of any column.
+            self._len = row[4] + row[5]
+        stats = []
+        for i in range(len(variables)):
+            values = row[6 * i:6 * i + 6]
+            stats.append(tuple(np.nan if v is None else float(v) for v in values))
+        return stats
+
+    def _update_bins(self, variables):
+        """
+        Decide once per continuous column whether it is grouped on exact values or on MAX_BINS fixed width bins.
+        """
+        missing = [var for var in variables if var.is_continuous and var.name not in self._bins]
+        if not missing:
+            return
+        aggregates = []
+        for var in missing:
+            value = _col(var.name).cast('double')
+            aggregates += [F.min(value), F.max(value), _approx_count_distinct(value)]
+        row = self.df.agg(*aggregates).collect()[0]
+        for i, var in enumerate(missing):
+            low, high, n_distinct = row[3 * i:3 * i + 3]
+            if low is None or n_distinct <= MAX_BINS or high == low:
+                self._bins[var.name] = None
+            else:
+                self._bins[var.name] = (low, (high - low) / MAX_BINS)
+
+    def _key_expression(self, var):
+        value = self._select_expression(var)
+        bins = self._bins.get(var.name) if var.is_continuous else None
+        if bins is not None:
+            low, width = bins
+            # The bin midpoint, the maximum goes to the last bin.
+            k = F.least(F.floor((value - low) / width), F.lit(MAX_BINS - 1))
+            value = F.lit(low) + (k + 0.5) * width
+        return value.cast('string')
+
+    def _grouped_counts(self, variables, row_var = None):
+        """
+        Count the values of all the `variables` (optionally by the values of `row_var`) with a single groupBy:
+        the columns are stacked as (column index, value) pairs.
+        :return: {(column index, row value, value): count}
+        """
+        self._update_bins(variables + ([row_var] if row_var is not None else []))
+        pairs = F.explode(F.array(*[F.struct(F.lit(i).alias('i'), self._key_expression(var).alias('k'))
+                                    for i, var in enumerate(variables)])).alias('p')
+        row_key = self._key_expression(row_var) if row_var is not None else F.lit(None).cast('string')
+        stacked = self.df.select(row_key.alias('r'), pairs).select('r', 'p.i', 'p.k')
+        return dict(((row['i'], row['r'], row['k']), row['count']) for row in stacked.groupBy('i', 'r', 'k').count().collect())
+
+    def _compute_distributions(self, columns = None):
+        """
+        :return: a (distribution, unknowns) pair per column. A distribution is an array of counts for discrete
+                 columns and a 2 x n array of values and counts for continuous ones.
+        """
+        variables = self._variables(columns)
+        if not variables:
+            return []
+        counts = self._grouped_counts(variables)
+        per_column = defaultdict(dict)
+        for (i, _, k), n in counts.items():
+            per_column[i][k] = n
+
+        distributions = []
+        for i, var in enumerate(variables):
+            column_counts = per_column[i]
+            unknowns = column_counts.pop(None, 0)
+            if var.is_discrete:
+                dist = np.array([column_counts.get(value, 0) for value in var.values], dtype = float)
+            else:
+                items = sorted((float(k), n) for k, n in column_counts.items())
+                dist = np.array([[k for k, _ in items], [n for _, n in items]], dtype = float).reshape(2, len(items))
+            distributions.append((dist, unknowns))
+        return distributions
+
+    def _compute_contingency(self, col_vars = None, row_var = None):
+        """
+        :return: a (contingency, unknowns) pair per column, as Table._compute_contingency.
+        """
+        col_vars = self._variables(col_vars)
+        row_var = self.domain[row_var] if row_var is not None else self.domain.class_var
+        if row_var is None or not row_var.is_discrete:
+            raise ValueError('contingencies need a discrete row variable')
+        counts = self._grouped_counts(col_vars, row_var)
+        row_index = dict((value, i) for i, value in enumerate(row_var.values))
+        n_rows = len(row_var.values)
+
+        per_column = defaultdict(list)
+        for (i, r, k), n in counts.items():
+            if r in row_index:
+                per_column[i].append((row_index[r], k, n))
+
+        contingencies = []
+        for i, var in enumerate(col_vars):
+            unknowns = np.zeros(n_rows)
+            known = []
+            for r, k, n in per_column[i]:
+                if k is None:
+                    unknowns[r] += n
+                else:
+                    known.append((r, k, n))
+            if var.is_discrete:
+                col_index = dict((value, j) for j, value in enumerate(var.values))
+                contingency = np.zeros((n_rows, len(var.values)))
+                for r, k, n in known:
+                    contingency[r, col_index[k]] += n
+            else:
+                values = sorted(set(float(k) for _, k, _ in known))
+                value_index = dict((v, j) for j, v in enumerate(values))
+                counts_array = np.zeros((n_rows, len(values)))
+                for r, k, n in known:
+                    counts_array[r, value_index[float(k)]] += n
+                contingency = (np.array(values), counts_array)
+            contingencies.append((contingency, unknowns))
+        return contingencies
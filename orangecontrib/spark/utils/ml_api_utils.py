@@ -1,7 +1,14 @@
 import inspect
+import zlib
 from collections import OrderedDict
 
 from pyspark import SparkConf, SparkContext
+from pyspark.ml import Pipeline
+from pyspark.ml.feature import StringIndexer, VectorAssembler
+from pyspark.sql import functions as F
+from pyspark.sql.types import StringType, BooleanType
+
+from orangecontrib.spark.utils.spark_api_utils import quote_column
 
 
 def get_object_info(obj, sc = None):
@@ -72,6 +79,15 @@ def get_estimators(self = None, module = None):
     return { name: c for name, c in members if 'fit' in dir(c) and not inspect.isabstract(c) and not name.startswith('Java') }
 
 
+def get_feature_stages(self = None, module = None):
+    """
+    Transformers and Estimators of a module, e.g. Tokenizer as well as StringIndexer or StandardScaler.
+    """
+    stages = get_transformers(self, module)
+    stages.update(get_estimators(self, module))
+    return stages
+
+
 def get_ml_modules():
     from pyspark.ml import feature, classification, clustering, recommendation, regression, tuning, evaluation
 
@@ -81,3 +97,137 @@ def get_ml_modules():
 
 def get_module_info(module):
     return str(inspect.getdoc(module)).split('>>>')[0].strip()
+
+
+def has_param(cls, name):
+    return name in inspect.signature(cls.__init__).parameters
+
+
+def _one_hot_encoders(input_cols, output_cols):
+    from pyspark.ml import feature
+    if has_param(feature.OneHotEncoder, 'inputCols'):
+        # Spark >= 3.0, the category counts are read from the indexer metadata, no pass over the data.
+        return [feature.OneHotEncoder(inputCols = input_cols, outputCols = output_cols, handleInvalid = 'keep')]
+    if hasattr(feature, 'OneHotEncoderEstimator'):
+        return [feature.OneHotEncoderEstimator(inputCols = input_cols, outputCols = output_cols, handleInvalid = 'keep')]
+    return [feature.OneHotEncoder(inputCol = i, outputCol = o) for i, o in zip(input_cols, output_cols)]
+
+
+def unique_names(names, taken):
+    """
+    `names` made unique against `taken` and each other by appending _1, _2, ... to the duplicates.
+    """
+    taken = set(taken)
+    result = []
+    for name in names:
+        unique, i = name, 1
+        while unique in taken:
+            unique, i = '{0}_{1}'.format(name, i), i + 1
+        taken.add(unique)
+        result.append(unique)
+    return result
+
+
+def assembly_pipeline(df, feature_columns, label_column = None, features_col = 'features', label_col = 'label'):
+    """
+    Build a Pipeline assembling `feature_columns` of `df` into a vector, according to the schema:
+    string columns are indexed and one hot encoded, boolean columns are indexed, the rest goes as is.
+    A string or boolean label is indexed into `label_col`, or into a new column when `df` already has one
+    named `label_col`; the caller then replaces `label_col` by it.
+    The intermediate <column>_index and <column>_vec columns never overwrite a column of `df`.
+    With Spark >= 3.0 all the columns are indexed by a single multi column StringIndexer, so fitting
+    the pipeline reads the data once.
+    Unseen and null values are kept in an extra index, rows are never dropped.
+    :return: the pipeline, the list of categorical feature columns and the indexed label column, None if the label
+        is not indexed.
+    :raise ValueError: if StringIndexer does not support handleInvalid='keep'.
+    """
+    types = dict((f.name, f.dataType) for f in df.schema.fields)
+    categorical = [c for c in feature_columns if isinstance(types[c], (StringType, BooleanType))]
+    index_label = label_column is not None and isinstance(types[label_column], (StringType, BooleanType))
+    strings = [c for c in categorical if isinstance(types[c], StringType)]
+
+    taken = set(df.columns) | { features_col }
+    index_names = unique_names([c + '_index' for c in categorical], taken)
+    vector_names = unique_names([c + '_vec' for c in strings], taken | set(index_names))
+    index_cols = dict(zip(categorical, index_names))
+    vector_cols = dict(zip(strings, vector_names))
+    label_output = unique_names([label_col], taken | set(index_names) | set(vector_names))[0] if index_label else None
+
+    index_inputs = list(categorical)
+    index_outputs = list(index_names)
+    if index_label:
+        index_inputs.append(label_column)
+        index_outputs.append(label_output)
+
+    stages = []
+    if index_inputs:
+        if has_param(StringIndexer, 'inputCols'):
+            stages.append(StringIndexer(inputCols = index_inputs, outputCols = index_outputs, handleInvalid = 'keep'))
+        elif "'keep'" in StringIndexer.handleInvalid.doc:
+            stages.extend(StringIndexer(inputCol = i, outputCol = o, handleInvalid = 'keep') for i, o in zip(index_inputs, index_outputs))
+        else:
+            # Spark < 2.2 could only skip the rows with unseen or null values, the output would depend on the version.
+            raise ValueError("Encoding categorical columns needs StringIndexer handleInvalid='keep' (Spark >= 2.2)")
+
+    if strings:
+        stages.extend(_one_hot_encoders([index_cols[c] for c in strings], [vector_cols[c] for c in strings]))
+
+    inputs = [vector_cols[c] if c in vector_cols else index_cols[c] if c in index_cols else c for c in feature_columns]
+    stages.append(VectorAssembler(inputCols = inputs, outputCol = features_col))
+    return Pipeline(stages = stages), categorical, label_output
+
+
+def _hash_row(num_features, names, categorical, *values):
+    from pyspark.ml.linalg import SparseVector
+    buckets = { }
+    for name, is_categorical, value in zip(names, categorical, values):
+        if value is None:
+            continue
+        if is_categorical:
+            key, value = name + '=' + str(value), 1.0
+        else:
+            key, value = name, float(value)
+        i = zlib.crc32(key.encode('utf-8')) % num_features
+        buckets[i] = buckets.get(i, 0.0) + value
+    return SparseVector(num_features, sorted(buckets.items()))
+
+
+def hash_features(df, input_cols, num_features = 1 << 18, output_col = 'features', categorical_cols = ()):
+    """
+    Hash any mix of columns into a SparseVector of size `num_features` in a single projection.
+    String and boolean columns, and the numeric ones in `categorical_cols`, set the bucket of 'column=value' to 1,
+    numeric columns add their value to the bucket of the column name. Nulls are ignored.
+    Uses FeatureHasher when available (Spark >= 2.3), a Python UDF otherwise.
+    """
+    from pyspark.ml import feature
+    input_cols = list(input_cols)
+    if hasattr(feature, 'FeatureHasher'):
+        hasher = feature.FeatureHasher(inputCols = input_cols, outputCol = output_col, numFeatures = num_features,
+                                       categoricalCols = list(categorical_cols))
+        return hasher.transform(df)
+
+    from pyspark.ml.linalg import VectorUDT
+    types = dict((f.name, f.dataType) for f in df.schema.fields)
+    categorical = [c in categorical_cols or isinstance(types[c], (StringType, BooleanType)) for c in input_cols]
+    hash_udf = F.udf(lambda *values: _hash_row(num_features, input_cols, categorical, *values), VectorUDT())
+    return df.withColumn(output_col, hash_udf(*[F.col(quote_column(c)) for c in input_cols]))
+
+
+def hashing_collision_stats(df, input_cols, num_features, categorical_cols = ()):
+    """
+    Estimate the bucket collisions of hash_features with one aggregation of approximate distinct counts.
+    Assuming a uniform hash, D features fill num_features * (1 - (1 - 1 / num_features) ** D) buckets.
+    :return: an OrderedDict with the number of features, the expected used buckets, colliding features and collision rate.
+    """
+    types = dict((f.name, f.dataType) for f in df.schema.fields)
+    categorical = [c for c in input_cols if c in categorical_cols or isinstance(types[c], (StringType, BooleanType))]
+    approx_count_distinct = getattr(F, 'approx_count_distinct', None) or F.approxCountDistinct
+    n_features = len(input_cols) - len(categorical)
+    if categorical:
+        n_features += sum(df.agg(*[approx_count_distinct(F.col(quote_column(c))) for c in categorical]).collect()[0])
+    used = num_features * (1.0 - (1.0 - 1.0 / num_features) ** n_features)
+    colliding = n_features - used
+    return OrderedDict([('features', n_features), ('buckets', num_features), ('expected used buckets', int(round(used))),
+                        ('expected colliding features', int(round(colliding))),
+                        ('collision rate', colliding / n_features if n_features else 0.0)])
@@ -0,0 +1,130 @@
+__author__ = "Jose Antonio Martin H."
+__copyright__ = "Copyright 2015, Jose Antonio Martin H."
+__credits__ = ["The Orange Machine Learning Project, Jose Antonio Martin H. "]
+__license__ = "Apache License 2.0"
+__maintainer__ = "JOse Antonio Martin H."
+__email__ = "xjamartinh@gmail.com"
+
+import glob
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from orangecontrib.spark.utils.data_utils import normalize_sql
+
+try:
+    import pyarrow as pa
+    from pyarrow import feather
+except ImportError:
+    pa = feather = None
+
+METADATA_KEY = b'orange_spark'
+# Part of every key, bumped when the key derivation changes so that older entries are never matched.
+KEY_VERSION = '2'
+
+
+class ODBCResultCache:
+    """
+    An on disk cache of ODBC query results.
+
+    The numeric block X is stored as a single C-ordered .npy file and read back as a copy-on-write memory map,
+    so a hit costs no read nor copy of X until its pages are touched. The string columns and the metadata are
+    stored in an uncompressed Feather (Arrow IPC) file next to it, they are converted to Python objects anyway.
+    Entries are keyed by connect string, normalized query text and row limit, expire after
+    `ttl_seconds` and the least recently used ones are removed when the directory grows over `max_bytes`.
+    Requires pyarrow.
+    """
+
+    def __init__(self, directory, max_bytes = 2 << 30, ttl_seconds = 24 * 3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def available():
+        return feather is not None
+
+    def path(self, connect_string, query, max_rows = None):
+        """
+        The Feather file of an entry, its numeric block has the same name with the '.npy' extension.
+        """
+        # Hashed so that credentials of the connect string are not written to disk.
+        key = '\0'.join((KEY_VERSION, connect_string, normalize_sql(query), str(max_rows)))
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.feather')
+
+    @staticmethod
+    def numeric_path(path):
+        return path[:-len('.feather')] + '.npy'
+
+    def remove(self, path):
+        for f in (path, self.numeric_path(path)):
+            if os.path.exists(f):
+                os.remove(f)
+
+    def get(self, connect_string, query, max_rows = None):
+        """
+        :return: the cached fetch_arrays result and its age in seconds, or None on a miss or an expired entry.
+            X is a copy-on-write memory map, writing to it never changes the cached entry.
+        """
+        path = self.path(connect_string, query, max_rows)
+        if not os.path.exists(path) or not os.path.exists(self.numeric_path(path)):
+            return None
+        table = feather.read_table(path, memory_map = True)
+        metadata = json.loads(table.schema.metadata[METADATA_KEY].decode('utf-8'))
+        age = time.time() - metadata['created']
+        if age > self.ttl_seconds:
+            del table
+            self.remove(path)
+            return None
+        # The modification time tracks the last use, for the LRU eviction.
+        os.utime(path, None)
+
+        numeric_names, object_names = metadata['numeric'], metadata['objects']
+        X = np.load(self.numeric_path(path), mmap_mode = 'c')
+        M = np.empty((table.num_rows, len(object_names)), dtype = object)
+        for k in range(len(object_names)):
+            M[:, k] = table.column(k).to_numpy(zero_copy_only = False)
+        result = numeric_names, X, object_names, M, set(metadata['integer']), metadata['truncated']
+        return result, age
+
+    def put(self, connect_string, query, result, max_rows = None):
+        """
+        Store a fetch_arrays result, must be called before the buffers are modified.
+        """
+        numeric_names, X, object_names, M, integer_columns, truncated = result
+        # Positional column names, query results may repeat a name.
+        arrays = [pa.array(M[:, k], type = pa.string()) for k in range(M.shape[1])]
+        metadata = { 'numeric': numeric_names, 'objects': object_names, 'integer': sorted(integer_columns),
+                     'truncated': truncated, 'created': time.time() }
+        schema = pa.schema([pa.field('c' + str(i), a.type) for i, a in enumerate(arrays)],
+                           metadata = { METADATA_KEY: json.dumps(metadata).encode('utf-8') })
+        table = pa.Table.from_arrays(arrays, schema = schema)
+
+        os.makedirs(self.directory, exist_ok = True)
+        path = self.path(connect_string, query, max_rows)
+        # The Feather file marks a complete entry, so it is written last.
+        with open(self.numeric_path(path) + '.tmp', 'wb') as f:
+            np.save(f, np.ascontiguousarray(X, dtype = float))
+        os.replace(self.numeric_path(path) + '.tmp', self.numeric_path(path))
+        tmp_path = path + '.tmp'
+        feather.write_feather(table, tmp_path, compression = 'uncompressed')
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        files = sorted(glob.glob(os.path.join(self.directory, '*.feather')), key = os.path.getmtime)
+        entry_size = lambda f: os.path.getsize(f) + (os.path.getsize(self.numeric_path(f)) if os.path.exists(self.numeric_path(f)) else 0)
+        sizes = [entry_size(f) for f in files]
+        total = sum(sizes)
+        for f, size in zip(files, sizes):
+            if total <= self.max_bytes:
+                break
+            total -= size
+            self.remove(f)
+
+    def clear(self):
+        for f in glob.glob(os.path.join(self.directory, '*.feather')) + glob.glob(os.path.join(self.directory, '*.npy')):
+            os.remove(f)
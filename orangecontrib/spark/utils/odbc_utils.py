@@ -0,0 +1,390 @@
+__author__ = "Jose Antonio Martin H."
+__copyright__ = "Copyright 2015, Jose Antonio Martin H."
+__credits__ = ["The Orange Machine Learning Project, Jose Antonio Martin H. "]
+__license__ = "Apache License 2.0"
+__maintainer__ = "JOse Antonio Martin H."
+__email__ = "xjamartinh@gmail.com"
+
+import datetime
+import decimal
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+
+import numpy as np
+import pyodbc
+from pyspark.sql.types import StructType, StructField, LongType, DoubleType, StringType, BooleanType, DateType, \
+    TimestampType, BinaryType
+
+NUMERIC_TYPES = (int, float, decimal.Decimal, bool)
+INTEGER_TYPES = (int, bool)
+
+
+class ConnectionPool:
+    """
+    A pool of open pyodbc connections keyed by connect string.
+    Idle connections are health checked with `health_query` before being handed out again.
+    """
+
+    def __init__(self, max_idle = 4, max_idle_seconds = 600, health_query = 'SELECT 1'):
+        self.max_idle = max_idle
+        self.max_idle_seconds = max_idle_seconds
+        self.health_query = health_query
+        self.idle = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def is_healthy(self, cnxn):
+        try:
+            cursor = cnxn.cursor()
+            cursor.execute(self.health_query)
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except pyodbc.Error:
+            return False
+
+    def acquire(self, connect_string):
+        while True:
+            with self.lock:
+                if not self.idle[connect_string]:
+                    break
+                cnxn, last_used = self.idle[connect_string].pop()
+            if time.time() - last_used < self.max_idle_seconds and self.is_healthy(cnxn):
+                return cnxn
+            self.close(cnxn)
+        return pyodbc.connect(connect_string, autocommit = True)
+
+    def release(self, connect_string, cnxn):
+        with self.lock:
+            if len(self.idle[connect_string]) < self.max_idle:
+                self.idle[connect_string].append((cnxn, time.time()))
+                return
+        self.close(cnxn)
+
+    @contextmanager
+    def connection(self, connect_string):
+        """
+        Borrow a connection, it goes back to the pool unless the block raised
+        (a failed or cancelled statement may leave it in an unknown state).
+        """
+        cnxn = self.acquire(connect_string)
+        try:
+            yield cnxn
+        except BaseException:
+            self.close(cnxn)
+            raise
+        else:
+            self.release(connect_string, cnxn)
+
+    @staticmethod
+    def close(cnxn):
+        try:
+            cnxn.close()
+        except pyodbc.Error:
+            pass
+
+    def close_all(self):
+        with self.lock:
+            idle, self.idle = self.idle, defaultdict(list)
+        for connections in idle.values():
+            for cnxn, _ in connections:
+                self.close(cnxn)
+
+
+def _resize(buffer, n_rows):
+    # In place for C ordered buffers, existing rows are kept.
+    buffer.resize((n_rows, buffer.shape[1]), refcheck = False)
+
+
+def fetch_arrays(cursor, batch_size = 10000, max_rows = None, progress_callback = None):
+    """
+    Read the result set of an executed cursor in fetchmany batches straight into numpy buffers.
+    Buffers grow geometrically and are trimmed in place at the end, no intermediate DataFrame is built.
+    :param cursor: a pyodbc cursor on which a query has been executed.
+    :param max_rows: stop after this many rows, None reads everything.
+    :param progress_callback: called with the number of rows read after every batch.
+    :return: (numeric names, X, object names, M, integer columns, truncated) where X is a float
+             array (NaN for NULL) with the numeric columns and M an object array with the rest as strings.
+    """
+    description = cursor.description
+    numeric = [j for j, d in enumerate(description) if d[1] in NUMERIC_TYPES]
+    objects = [j for j, d in enumerate(description) if d[1] not in NUMERIC_TYPES]
+    numeric_names = [description[j][0] for j in numeric]
+    object_names = [description[j][0] for j in objects]
+    integer_columns = set(description[j][0] for j in numeric if description[j][1] in INTEGER_TYPES)
+
+    capacity = min(batch_size, max_rows) if max_rows else batch_size
+    X = np.empty((capacity, len(numeric)), dtype = float)
+    M = np.empty((capacity, len(objects)), dtype = object)
+    n_rows = 0
+    while max_rows is None or n_rows < max_rows:
+        rows = cursor.fetchmany(batch_size if max_rows is None else min(batch_size, max_rows - n_rows))
+        if not rows:
+            break
+        end = n_rows + len(rows)
+        if end > capacity:
+            capacity = max(end, 2 * capacity)
+            if max_rows:
+                capacity = min(capacity, max_rows)
+            _resize(X, capacity)
+            _resize(M, capacity)
+        if numeric:
+            # None becomes NaN when converting to float.
+            X[n_rows:end] = np.array([[row[j] for j in numeric] for row in rows], dtype = float)
+        if objects:
+            M[n_rows:end] = [['' if row[j] is None else str(row[j]) for j in objects] for row in rows]
+        n_rows = end
+        if progress_callback is not None:
+            progress_callback(n_rows)
+
+    truncated = bool(max_rows) and n_rows >= max_rows and cursor.fetchone() is not None
+    _resize(X, n_rows)
+    _resize(M, n_rows)
+    return numeric_names, X, object_names, M, integer_columns, truncated
+
+
+class QueryCancelled(Exception):
+    pass
+
+
+class QueryTask:
+    """
+    Run a query and fetch its result with fetch_arrays on a worker thread.
+    The owner polls `rows_fetched`, `elapsed` and `done()`, and may call `cancel()` at any time.
+    """
+
+    def __init__(self, pool, connect_string, query, batch_size = 10000, max_rows = None, timeout = 0):
+        self.pool = pool
+        self.connect_string = connect_string
+        self.query = query
+        self.batch_size = batch_size
+        self.max_rows = max_rows
+        self.timeout = timeout
+        self.rows_fetched = 0
+        self.result = None
+        self.error = None
+        self.cancelled = False
+        self.timed_out = False
+        self.cursor = None
+        self.start_time = None
+        self.thread = threading.Thread(target = self.run, daemon = True)
+
+    @property
+    def elapsed(self):
+        return 0.0 if self.start_time is None else time.time() - self.start_time
+
+    def start(self):
+        self.start_time = time.time()
+        self.thread.start()
+
+    def done(self):
+        return self.start_time is not None and not self.thread.is_alive()
+
+    def run(self):
+        try:
+            with self.pool.connection(self.connect_string) as cnxn:
+                # Server side query timeout, honoured by most drivers.
+                cnxn.timeout = self.timeout
+                self.cursor = cnxn.cursor()
+                if self.cancelled:
+                    raise QueryCancelled()
+                self.cursor.execute(self.query)
+                self.result = fetch_arrays(self.cursor, self.batch_size, self.max_rows, self.progress)
+                self.cursor.close()
+        except Exception as e:
+            self.error = QueryCancelled() if self.cancelled else e
+
+    def progress(self, n_rows):
+        self.rows_fetched = n_rows
+        if self.cancelled:
+            raise QueryCancelled()
+
+    def cancel(self):
+        self.cancelled = True
+        cursor = self.cursor
+        if cursor is not None:
+            try:
+                cursor.cancel()
+            except pyodbc.Error:
+                pass
+
+    def check_timeout(self):
+        """
+        Cancel the query if it runs longer than `timeout` seconds, for drivers ignoring the server side timeout.
+        """
+        if self.timeout and self.elapsed > self.timeout and not self.cancelled:
+            self.timed_out = True
+            self.cancel()
+        return self.timed_out
+
+
+_DATE_FORMATS = ('%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d')
+
+
+def _parse_date_string(text):
+    """
+    Parse an ISO date or timestamp returned as a string (e.g. by SQLite).
+    :return: (datetime, format) or (None, None) if `text` is not a date.
+    """
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(text.strip(), fmt), fmt
+        except ValueError:
+            continue
+    return None, None
+
+
+def split_range(lower, upper, n_partitions):
+    """
+    Split [lower, upper] into at most `n_partitions` contiguous ranges.
+    Works for integer, float, Decimal, date and datetime bounds, and for dates or timestamps returned as ISO strings,
+    whose boundaries are formatted back as strings so that the database still compares text with text.
+    Other strings get a single range.
+    :return: the list of boundaries, range i is [b[i], b[i + 1]) except the last one which includes its upper bound.
+    """
+    if lower is None or upper is None:
+        return []
+    n_partitions = max(1, n_partitions)
+    if isinstance(lower, str) or isinstance(upper, str):
+        (low, low_format), (high, high_format) = _parse_date_string(str(lower)), _parse_date_string(str(upper))
+        if low is None or high is None or low_format != high_format:
+            return [lower, upper]
+        bounds = [b.strftime(low_format) for b in split_range(low, high, n_partitions)[:-1]]
+        if low_format.endswith('.%f'):
+            # The database may store fewer fractional digits, keep the original bounds at both ends.
+            bounds[0] = lower
+        return sorted(set(bounds)) + [upper]
+    if isinstance(lower, int) and not isinstance(lower, bool):
+        bounds = [lower + (upper - lower) * i // n_partitions for i in range(n_partitions)]
+    elif isinstance(lower, (datetime.date, datetime.datetime)):
+        step = (upper - lower) / n_partitions
+        bounds = [lower + step * i for i in range(n_partitions)]
+    else:
+        bounds = [lower + (upper - lower) * i / n_partitions for i in range(n_partitions)]
+    bounds = sorted(set(bounds))
+    return bounds + [upper]
+
+
+def partition_queries(query, column, bounds):
+    """
+    Build one parameterized query per range of `bounds` (see split_range) plus one for NULL values of `column`.
+    :return: a list of (sql, params) covering the whole result of `query` without overlap.
+    """
+    base = 'SELECT * FROM (' + query.strip().rstrip(';') + ') q WHERE '
+    queries = []
+    for i in range(len(bounds) - 1):
+        operator = '<=' if i == len(bounds) - 2 else '<'
+        queries.append((base + '{0} >= ? AND {0} {1} ?'.format(column, operator), (bounds[i], bounds[i + 1])))
+    queries.append((base + column + ' IS NULL', ()))
+    return queries
+
+
+_SPARK_TYPES = [(bool, BooleanType), (int, LongType), ((float, decimal.Decimal), DoubleType),
+                (datetime.datetime, TimestampType), (datetime.date, DateType), ((bytes, bytearray), BinaryType)]
+
+
+def spark_schema(description):
+    """
+    Map a pyodbc cursor description to a Spark schema, unknown types become strings.
+    """
+    fields = []
+    for d in description:
+        spark_type = next((t for python_type, t in _SPARK_TYPES if isinstance(d[1], type) and issubclass(d[1], python_type)), StringType)
+        fields.append(StructField(d[0], spark_type(), nullable = True))
+    return StructType(fields)
+
+
+def _converter(spark_type):
+    if isinstance(spark_type, DoubleType):
+        return lambda v: None if v is None else float(v)
+    if isinstance(spark_type, StringType):
+        return lambda v: None if v is None else str(v)
+    if isinstance(spark_type, BinaryType):
+        return lambda v: None if v is None else bytearray(v)
+    return lambda v: v
+
+
+def fetch_batches(connect_string, schema, batch_size, partitions):
+    """
+    Yield the converted rows of the given (sql, params) partition queries, `batch_size` rows at a time.
+    """
+    converters = [_converter(f.dataType) for f in schema.fields]
+    cnxn = pyodbc.connect(connect_string, autocommit = True)
+    try:
+        for sql, params in partitions:
+            cursor = cnxn.cursor()
+            cursor.execute(sql, *params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [tuple(convert(v) for convert, v in zip(converters, row)) for row in rows]
+            cursor.close()
+    finally:
+        cnxn.close()
+
+
+def fetch_partition(connect_string, schema, batch_size, partitions):
+    """
+    Yield the converted rows of the given (sql, params) partition queries, runs on the executors.
+    """
+    for rows in fetch_batches(connect_string, schema, batch_size, partitions):
+        for row in rows:
+            yield row
+
+
+def stage_partition(hc, connect_string, schema, batch_size, query, path, cancelled = None):
+    """
+    Fetch one (sql, params) partition query on the driver and append it to Parquet files under `path`,
+    one batch at a time, so that at most `batch_size` rows of the partition are held in memory.
+    :param cancelled: a threading.Event, checked between batches.
+    :return: whether any row was written.
+    """
+    written = False
+    for rows in fetch_batches(connect_string, schema, batch_size, [query]):
+        if cancelled is not None and cancelled.is_set():
+            raise QueryCancelled()
+        hc.createDataFrame(rows, schema).write.mode('append').parquet(path)
+        written = True
+    return written
+
+
+def odbc_to_spark(sc, hc, cnxn, connect_string, query, column, n_partitions, batch_size = 10000, on_executors = True, max_workers = 4,
+                  staging_directory = '/tmp/orange_spark_odbc', cancelled = None):
+    """
+    Read the result of an ODBC query into a Spark DataFrame, split on the numeric or date `column`.
+
+    With `on_executors` every range is fetched by a Spark task through mapPartitions, so rows never go
+    through the driver (the ODBC driver and DSN must be available on the executors, which is always the
+    case with a local master). Otherwise the ranges are fetched concurrently by at most `max_workers` driver threads,
+    each streaming its rows batch by batch into Parquet files under a new directory of `staging_directory`, which
+    the DataFrame reads. The driver never holds more than `max_workers` batches.
+    :param cnxn: an open connection, used to read the schema and the bounds of `column`.
+    :param cancelled: a threading.Event that stops the driver threads between batches with QueryCancelled.
+    """
+    cursor = cnxn.cursor()
+    cursor.execute('SELECT * FROM (' + query.strip().rstrip(';') + ') q WHERE 1 = 0')
+    schema = spark_schema(cursor.description)
+    cursor.execute('SELECT MIN({0}), MAX({0}) FROM ('.format(column) + query.strip().rstrip(';') + ') q')
+    lower, upper = cursor.fetchone()
+    cursor.close()
+
+    queries = partition_queries(query, column, split_range(lower, upper, n_partitions))
+    fetch = partial(fetch_partition, connect_string, schema, batch_size)
+    if on_executors:
+        rdd = sc.parallelize(queries, len(queries)).mapPartitions(fetch)
+        return hc.createDataFrame(rdd, schema)
+
+    # One directory per range: appends to the same directory from several threads would share its _temporary files.
+    root = os.path.join(staging_directory, uuid.uuid4().hex)
+    paths = [os.path.join(root, str(i)) for i in range(len(queries))]
+    stage = partial(stage_partition, hc, connect_string, schema, batch_size, cancelled = cancelled)
+    with ThreadPoolExecutor(max_workers = max(1, min(max_workers, len(queries)))) as executor:
+        written = list(executor.map(stage, queries, paths))
+    paths = [path for path, w in zip(paths, written) if w]
+    return hc.read.schema(schema).parquet(*paths) if paths else hc.createDataFrame(sc.emptyRDD(), schema)
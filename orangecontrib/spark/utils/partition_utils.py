@@ -0,0 +1,130 @@
+__author__ = "Jose Antonio Martin H."
+__copyright__ = "Copyright 2015, Jose Antonio Martin H."
+__credits__ = ["The Orange Machine Learning Project, Jose Antonio Martin H. "]
+__license__ = "Apache License 2.0"
+__maintainer__ = "JOse Antonio Martin H."
+__email__ = "xjamartinh@gmail.com"
+
+import math
+
+from pyspark.sql import functions as F
+
+from orangecontrib.spark.utils.spark_api_utils import quote_column
+from orangecontrib.spark.utils.write_utils import row_size_in_bytes
+
+METHODS = ['keep', 'coalesce', 'repartition', 'repartitionByRange']
+
+
+def num_partitions(df):
+    """
+    The number of partitions of `df`, from the JVM RDD so that no row is converted to Python.
+    """
+    return df._jdf.rdd().getNumPartitions()
+
+
+def adaptive_execution(df):
+    """
+    Whether adaptive query execution is on (the default since Spark 3.2), it may change the partitioning at run time.
+    """
+    try:
+        return df.sql_ctx.getConf('spark.sql.adaptive.enabled').strip().lower() == 'true'
+    except Exception:
+        # Spark 1.x, unknown key.
+        return False
+
+
+def partition_sizes(df, measure_bytes = False):
+    """
+    Rows and bytes of every partition of `df`, with one aggregation by spark_partition_id() on the JVM.
+    Without `measure_bytes` no column is read, the bytes are the rows times the default row size of the schema.
+    With it the bytes are the lengths of the rows serialized as JSON, every column is read.
+    The number of partitions is taken from the same execution, as the largest partition id plus one. Without adaptive
+    query execution the partitioning is static and the trailing empty partitions come from the plan as well. With it
+    they cannot be told apart: the empty partitions after the last non empty one are not reported.
+    :return: a list of (rows, bytes) indexed by partition, empty partitions included.
+    """
+    columns = [F.spark_partition_id().alias('partition')]
+    if measure_bytes:
+        columns.append(F.length(F.to_json(F.struct(*[F.col(quote_column(c)) for c in df.columns]))).alias('bytes'))
+    aggregates = [F.count(F.lit(1)).alias('rows')] + ([F.sum('bytes').alias('bytes')] if measure_bytes else [])
+    counts = df.select(*columns).groupBy('partition').agg(*aggregates).collect()
+
+    row_size = row_size_in_bytes(df)
+    n = max([r['partition'] + 1 for r in counts] or [0])
+    if not adaptive_execution(df):
+        n = max(n, num_partitions(df))
+    sizes = [(0, 0)] * n
+    for r in counts:
+        sizes[r['partition']] = (r['rows'], r['bytes'] if measure_bytes else r['rows'] * row_size)
+    return sizes
+
+
+def _median(values):
+    values = sorted(values)
+    n = len(values)
+    return 0 if not n else values[n // 2] if n % 2 else (values[n // 2 - 1] + values[n // 2]) / 2.0
+
+
+def size_summary(sizes):
+    """
+    Summary statistics of partition_sizes: counts, totals, min/median/max bytes and the skew (max over median).
+    """
+    rows = [r for r, _ in sizes]
+    sizes_bytes = [b for _, b in sizes]
+    median = _median(sizes_bytes)
+    largest = max(sizes_bytes) if sizes else 0
+    if median:
+        skew = float(largest) / median
+    else:
+        skew = float('inf') if largest else 1.0
+    return {
+        'partitions': len(sizes),
+        'empty': sum(1 for r in rows if not r),
+        'rows': sum(rows),
+        'bytes': sum(sizes_bytes),
+        'min bytes': min(sizes_bytes) if sizes else 0,
+        'median bytes': median,
+        'max bytes': largest,
+        'skew': skew,
+    }
+
+
+def recommend_layout(summary, target_bytes = 128 * 1024 * 1024, skew_factor = 4.0, range_columns = (), tolerance = 0.25):
+    """
+    Recommend a partitioning for a DataFrame from its size_summary.
+    The number of partitions targets `target_bytes` per partition. Fewer partitions without skew only need coalesce,
+    which merges partitions without a shuffle. More partitions, or skewed ones, need a shuffle: repartitionByRange when
+    `range_columns` are given, round robin repartition otherwise. Nothing changes when the number of partitions is
+    within `tolerance` of the target and there is no skew.
+    :return: (method, number of partitions, reason).
+    """
+    current = summary['partitions']
+    target = max(1, int(math.ceil(float(summary['bytes']) / target_bytes)))
+    skewed = summary['skew'] > skew_factor
+    if not skewed and abs(current - target) <= tolerance * target:
+        return 'keep', current, '{0} partitions are close to the {1} targeted.'.format(current, target)
+    if not skewed and target < current:
+        return 'coalesce', target, '{0} partitions smaller than the target, merged without a shuffle into {1}.'.format(current, target)
+    method = 'repartitionByRange' if range_columns else 'repartition'
+    reason = 'The largest partition is {0:.1f} times the median.'.format(summary['skew']) if skewed else \
+        '{0} partitions larger than the target.'.format(current)
+    return method, target, reason + ' Shuffled into {0} partitions.'.format(target)
+
+
+def apply_layout(df, method, n_partitions, columns = ()):
+    """
+    Apply a layout from recommend_layout, `columns` are the repartitioning columns of repartition and repartitionByRange.
+    """
+    columns = [F.col(quote_column(c)) for c in columns]
+    if method == 'keep':
+        return df
+    if method == 'coalesce':
+        return df.coalesce(n_partitions)
+    if method == 'repartition':
+        return df.repartition(n_partitions, *columns)
+    if method == 'repartitionByRange':
+        if not columns:
+            raise ValueError('repartitionByRange needs at least one column')
+        # Spark >= 2.3
+        return df.repartitionByRange(n_partitions, *columns)
+    raise ValueError('Unknown method: {0}'.format(method))
@@ -0,0 +1,251 @@
+__author__ = "Jose Antonio Martin H."
+__copyright__ = "Copyright 2015, Jose Antonio Martin H."
+__credits__ = ["The Orange Machine Learning Project, Jose Antonio Martin H. "]
+__license__ = "Apache License 2.0"
+__maintainer__ = "JOse Antonio Martin H."
+__email__ = "xjamartinh@gmail.com"
+
+import re
+from collections import OrderedDict
+
+from orangecontrib.spark.utils.spark_api_utils import format_bytes, plan_size_in_bytes
+
+SHUFFLE_JOINS = ('SortMergeJoin', 'ShuffledHashJoin')
+CARTESIAN_JOINS = ('CartesianProduct', 'BroadcastNestedLoopJoin')
+SCANS = ('FileScan', 'Scan', 'HiveTableScan', 'InMemoryTableScan', 'PhysicalRDD', 'ExistingRDD')
+
+_TREE_PREFIX = re.compile(r'^[\s:|+\-]*')
+_CODEGEN_PREFIX = re.compile(r'^\*(\(\d+\))?\s*')
+_EXPRESSION_ID = re.compile(r'#(\d+)')
+# The projection DataFrame.fillna produces: coalesce(<col>, <literal>) AS <col>, with nanvl(<col>, null) for floating point columns.
+_FILLNA = re.compile(r'coalesce\((?:nanvl\()?(?P<name>[^\s#(),]+)#\d+L?(?:, null\))?, [^(),#]*\) AS (?P=name)#\d+')
+AGGREGATES = ('HashAggregate', 'SortAggregate', 'ObjectHashAggregate', 'Aggregate')
+
+
+class PlanNode:
+    def __init__(self, text, indent, parent = None):
+        self.text = text
+        self.indent = indent
+        self.parent = parent
+        self.children = []
+        name = _CODEGEN_PREFIX.sub('', text)
+        self.name = re.split(r'[\s(\[]', name, 1)[0]
+
+    def ancestors(self):
+        node = self.parent
+        while node is not None:
+            yield node
+            node = node.parent
+
+    def descendants(self):
+        for child in self.children:
+            yield child
+            yield from child.descendants()
+
+    def __repr__(self):
+        return 'PlanNode({0!r})'.format(self.text)
+
+
+def parse_plan_tree(plan_string):
+    """
+    Parse the tree string of a Spark plan, e.g. QueryExecution.executedPlan().toString()
+    :return: the list of all the nodes in pre-order, the first one is the root.
+    """
+    nodes = []
+    stack = []
+    for line in plan_string.splitlines():
+        if not line.strip() or line.startswith('=='):
+            continue
+        indent = len(_TREE_PREFIX.match(line).group(0))
+        text = line[indent:].strip()
+        while stack and stack[-1].indent >= indent:
+            stack.pop()
+        node = PlanNode(text, indent, stack[-1] if stack else None)
+        if node.parent is not None:
+            node.parent.children.append(node)
+        nodes.append(node)
+        stack.append(node)
+    return nodes
+
+
+def _jchildren(jplan):
+    children = jplan.children()
+    return [children.apply(i) for i in range(children.size())]
+
+
+def expression_ids(text):
+    """
+    The expression ids of the attributes referenced in a plan or expression string, e.g. {1, 5} for 'id#1L = id#5L'.
+    """
+    return set(int(i) for i in _EXPRESSION_ID.findall(text))
+
+
+def logical_joins(df):
+    """
+    Describe the joins of the optimized logical plan of a DataFrame.
+    :return: a list of dicts with the join type, whether it has a join condition, the estimated size of both sides,
+        and the expression ids of the condition and of both sides output, to match them with the physical joins.
+    """
+    jdf = df._jdf
+    joins = []
+    stack = [jdf.queryExecution().optimizedPlan()]
+    while stack:
+        jplan = stack.pop()
+        children = _jchildren(jplan)
+        if jplan.nodeName() == 'Join' and len(children) == 2:
+            condition = jplan.condition()
+            joins.append({ 'type': jplan.joinType().toString(),
+                           'has_condition': condition.isDefined(),
+                           'condition_ids': expression_ids(condition.get().toString()) if condition.isDefined() else set(),
+                           'side_ids': expression_ids(children[0].output().toString()) | expression_ids(children[1].output().toString()),
+                           'left_bytes': plan_size_in_bytes(children[0], jdf),
+                           'right_bytes': plan_size_in_bytes(children[1], jdf) })
+        stack.extend(children)
+    return joins
+
+
+def match_logical_join(node, joins, used):
+    """
+    The logical join, out of `joins` and not in `used`, that a physical join node comes from.
+    Joins are matched on the expression ids of their keys or condition first, then on the attributes of their sides.
+    :return: the index in `joins` or None.
+    """
+    key_ids = expression_ids(node.text)
+    side_ids = set()
+    for child in node.children:
+        side_ids |= expression_ids(child.text)
+        for n in child.descendants():
+            side_ids |= expression_ids(n.text)
+    best, best_score = None, (0, 0)
+    for i, join in enumerate(joins):
+        if i in used:
+            continue
+        score = (len(key_ids & join['condition_ids']), len(side_ids & join['side_ids']))
+        if score > best_score:
+            best, best_score = i, score
+    return best
+
+
+def get_plan_strings(df):
+    """
+    :return: an OrderedDict {plan name: tree string} with the parsed, analyzed, optimized and physical plans.
+    """
+    query_execution = df._jdf.queryExecution()
+    return OrderedDict([('Parsed', query_execution.logical().toString()),
+                        ('Analyzed', query_execution.analyzed().toString()),
+                        ('Optimized', query_execution.optimizedPlan().toString()),
+                        ('Physical', query_execution.executedPlan().toString())])
+
+
+def _is_fillna(node):
+    return node.name == 'Project' and _FILLNA.search(node.text) is not None
+
+
+def _is_wide(node):
+    return node.name == 'Exchange' or node.name.endswith('Join') or node.name in CARTESIAN_JOINS or node.name in AGGREGATES
+
+
+def _first_wide_nodes(node):
+    """
+    The nearest shuffle, join or aggregation on every path below `node`.
+    """
+    result = []
+    for child in node.children:
+        if _is_wide(child):
+            result.append(child)
+        else:
+            result += _first_wide_nodes(child)
+    return result
+
+
+def _subtree_ids(node):
+    ids = expression_ids(node.text)
+    for n in node.descendants():
+        ids |= expression_ids(n.text)
+    return ids
+
+
+def _filter_could_run_earlier(node):
+    """
+    True when a Filter above a shuffle or join only references the columns of one side below it,
+    never when it references aggregate outputs or columns of both sides of a join.
+    """
+    filter_ids = expression_ids(node.text)
+    if not filter_ids:
+        return False
+    for wide in _first_wide_nodes(node):
+        if wide.name in AGGREGATES:
+            keys = re.search(r'keys=\[([^\]]*)\]', wide.text)
+            if keys is not None and filter_ids <= expression_ids(keys.group(1)):
+                return True
+        elif wide.name == 'Exchange':
+            if filter_ids <= _subtree_ids(wide):
+                return True
+        elif len(wide.children) == 2:
+            if any(filter_ids <= _subtree_ids(side) for side in wide.children):
+                return True
+    return False
+
+
+def lint_physical_plan(nodes, joins = (), broadcast_threshold = 100 * 1024 * 1024):
+    """
+    Flag the usual performance anti-patterns in a physical plan.
+    :param nodes: the physical plan as returned by parse_plan_tree.
+    :param joins: the logical joins as returned by logical_joins, used for the size estimates.
+    :param broadcast_threshold: joins with a side smaller than this should be broadcast.
+    :return: a list of (rule, node text, details).
+    """
+    issues = []
+
+    def side_sizes(join):
+        return 'sides: {0} / {1}'.format(format_bytes(join['left_bytes']), format_bytes(join['right_bytes']))
+
+    used = set()
+    for node in nodes:
+        if node.name in CARTESIAN_JOINS and (node.name == 'CartesianProduct' or node.text.rstrip().endswith(('Cross', 'Inner'))):
+            details = 'Join without an equality condition, every row is matched with every row'
+            i = match_logical_join(node, joins, used)
+            if i is not None:
+                used.add(i)
+                details += ' (' + side_sizes(joins[i]) + ')'
+            issues.append(('Cartesian product', node.text, details))
+
+    for node in nodes:
+        if node.name not in SHUFFLE_JOINS or any(c.name == 'BroadcastExchange' for c in node.children):
+            continue
+        i = match_logical_join(node, joins, used)
+        if i is None:
+            continue
+        used.add(i)
+        join = joins[i]
+        if join['has_condition'] and any(b is not None and b <= broadcast_threshold for b in (join['left_bytes'], join['right_bytes'])):
+            issues.append(('Missing broadcast join', node.text,
+                           'One side is below {0}, consider broadcast() ({1})'.format(format_bytes(broadcast_threshold), side_sizes(join))))
+
+    for node in nodes:
+        if node.name != 'Filter':
+            continue
+        if _filter_could_run_earlier(node):
+            issues.append(('Filter not pushed down', node.text, 'Filter on the columns of one side is evaluated after a shuffle or join, it could run earlier'))
+        elif any(c.name in SCANS and 'PushedFilters: []' in c.text for c in node.children):
+            issues.append(('Filter not pushed down', node.text, 'Filter is not pushed into the data source scan'))
+
+    for node in nodes:
+        if node.name == 'Sample' or _is_fillna(node):
+            if any(a.name == 'Exchange' for a in node.ancestors()):
+                what = 'sample' if node.name == 'Sample' else 'fillna'
+                issues.append(('{0} before a wide shuffle'.format(what), node.text,
+                               'Runs on the full input before a shuffle (Exchange), move it after filters and aggregations'))
+    return issues
+
+
+def lint_dataframe(df, broadcast_threshold = 100 * 1024 * 1024):
+    """
+    Lint the physical plan of a DataFrame, see lint_physical_plan.
+    """
+    nodes = parse_plan_tree(df._jdf.queryExecution().executedPlan().toString())
+    try:
+        joins = logical_joins(df)
+    except Exception:
+        joins = []
+    return lint_physical_plan(nodes, joins, broadcast_threshold)
@@ -0,0 +1,127 @@
+__author__ = "Jose Antonio Martin H."
+__copyright__ = "Copyright 2015, Jose Antonio Martin H."
+__credits__ = ["The Orange Machine Learning Project, Jose Antonio Martin H. "]
+__license__ = "Apache License 2.0"
+__maintainer__ = "JOse Antonio Martin H."
+__email__ = "xjamartinh@gmail.com"
+
+import threading
+import uuid
+
+
+def schema_tree_string(df):
+    """
+    The schema of `df` as printed by DataFrame.printSchema().
+    """
+    return df._jdf.schema().treeString()
+
+
+def approx_count(sc, df, timeout = 2.0, confidence = 0.95):
+    """
+    Approximate row count of `df` with RDD.countApprox, computed on the JVM so no row is sent to Python.
+    countApprox returns at the timeout but its job would go on counting every row, so its job group (the one of
+    the calling thread, e.g. a SparkJob, or a new one) is cancelled as soon as the partial result is read.
+    :param timeout: maximum number of seconds to wait for the count.
+    :return: (estimate, low, high), exact when the count completed within `timeout`.
+    """
+    group = sc.getLocalProperty('spark.jobGroup.id')
+    if group is None:
+        group = 'orange_' + uuid.uuid4().hex
+        sc.setJobGroup(group, 'Approximate count', True)
+    result = df._jdf.rdd().countApprox(int(timeout * 1000), float(confidence))
+    bounded = result.initialValue()
+    if not result.isInitialValueFinal():
+        sc.cancelJobGroup(group)
+    return int(bounded.mean()), int(bounded.low()), int(bounded.high())
+
+
+def _local_iterator(df):
+    try:
+        # Spark >= 3.0, fetch the next partition while the current one is consumed.
+        return df.toLocalIterator(prefetchPartitions = True)
+    except TypeError:
+        return df.toLocalIterator()
+
+
+class RowPager:
+    """
+    Fetch the rows of a DataFrame page by page without collecting it.
+
+    The first page comes from `take`, which only scans as many partitions as needed. Further rows come
+    from `toLocalIterator`, consumed on a worker thread that stays `prefetch_rows` ahead of the rows requested,
+    so at most one partition plus the prefetched rows are held on the driver. The iterator restarts from the
+    first row and skips the rows already taken, the DataFrame must produce its rows in a deterministic order.
+    """
+
+    def __init__(self, sc, df, page_size = 100, prefetch_rows = 200):
+        self.sc = sc
+        self.df = df
+        self.page_size = page_size
+        self.prefetch_rows = prefetch_rows
+        self.rows = []
+        self.requested = 0
+        self.exhausted = False
+        self.error = None
+        self.closed = False
+        self.group = 'orange_' + uuid.uuid4().hex
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def first_page(self):
+        """
+        Take the first page, blocking. Call it from a worker thread, e.g. inside a SparkJob.
+        """
+        rows = self.df.take(self.page_size)
+        with self.condition:
+            self.rows = rows
+            self.requested = len(rows)
+            self.exhausted = len(rows) < self.page_size
+        return rows
+
+    def fetching(self):
+        """
+        True while the worker thread is filling the requested and prefetched rows.
+        """
+        return self.thread is not None and self.thread.is_alive() and len(self.rows) < self.requested + self.prefetch_rows
+
+    def request(self, n_rows):
+        """
+        Ask for at least `n_rows` rows, non blocking. The new rows are appended to `rows` as they arrive.
+        """
+        if self.exhausted or self.closed:
+            return
+        with self.condition:
+            self.requested = max(self.requested, n_rows)
+            self.condition.notify()
+        if self.thread is None:
+            self.thread = threading.Thread(target = self.run, daemon = True)
+            self.thread.start()
+
+    def request_page(self):
+        self.request(len(self.rows) + self.page_size)
+
+    def run(self):
+        self.sc.setJobGroup(self.group, 'Preview rows', True)
+        try:
+            skip = len(self.rows)
+            for i, row in enumerate(_local_iterator(self.df)):
+                if i < skip:
+                    continue
+                with self.condition:
+                    while not self.closed and len(self.rows) >= self.requested + self.prefetch_rows:
+                        self.condition.wait()
+                    if self.closed:
+                        return
+                    self.rows.append(row)
+            self.exhausted = True
+        except Exception as e:
+            if not self.closed:
+                self.error = e
+            self.exhausted = True
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        if self.thread is not None:
+            self.sc.cancelJobGroup(self.group)
@@ -0,0 +1,165 @@
+__author__ = "Jose Antonio Martin H."
+__copyright__ = "Copyright 2015, Jose Antonio Martin H."
+__credits__ = ["The Orange Machine Learning Project, Jose Antonio Martin H. "]
+__license__ = "Apache License 2.0"
+__maintainer__ = "JOse Antonio Martin H."
+__email__ = "xjamartinh@gmail.com"
+
+import hashlib
+import os
+import uuid
+from collections import OrderedDict
+
+from pyspark import StorageLevel
+
+from orangecontrib.spark.utils.data_utils import normalize_sql, extract_table_names
+from orangecontrib.spark.utils.spark_api_utils import estimate_size_in_bytes
+
+MEMORY = 'memory'
+PARQUET = 'parquet'
+
+
+def get_table_version(hc, table_name):
+    """
+    Return a value that changes whenever the content of a table or view changes.
+    Hive tables are versioned by their last DDL time, number of files and total size,
+    temporary views by their analyzed plan.
+    """
+    try:
+        rows = hc.sql('SHOW TBLPROPERTIES ' + table_name).collect()
+        # Spark 1.x returns a single tab separated `result` column, Spark 2.x (key, value) columns.
+        properties = dict(tuple(row[0].split('\t', 1)) if len(row) == 1 else (row[0], row[1]) for row in rows)
+        version = tuple(properties.get(k) for k in ('transient_lastDdlTime', 'numFiles', 'totalSize'))
+        if any(version):
+            return version
+    except Exception:
+        pass
+    plan = hc.table(table_name)._jdf.queryExecution().analyzed().toString()
+    return hashlib.sha1(plan.encode('utf-8')).hexdigest()
+
+
+def path_size_in_bytes(sc, path):
+    jvm = sc._jvm
+    jpath = jvm.org.apache.hadoop.fs.Path(path)
+    return jpath.getFileSystem(sc._jsc.hadoopConfiguration()).getContentSummary(jpath).getLength()
+
+
+def delete_path(sc, path):
+    jvm = sc._jvm
+    jpath = jvm.org.apache.hadoop.fs.Path(path)
+    jpath.getFileSystem(sc._jsc.hadoopConfiguration()).delete(jpath, True)
+
+
+class CacheEntry:
+    def __init__(self, df, size_in_bytes, path = None):
+        self.df = df
+        self.size_in_bytes = size_in_bytes
+        self.path = path
+
+
+class QueryResultCache:
+    """
+    A size bounded LRU cache of SparkSQL query results.
+
+    Results are keyed by the normalized query text plus the version of every source table,
+    so a query is re-run as soon as one of the tables it reads from changes.
+    Results are materialized either as persisted DataFrames (MEMORY) or as Parquet files under
+    `directory` (PARQUET) which are read back, in both cases the lineage is cut at the result.
+
+    DataFrames read from Parquet files stay lazily backed by them after they are sent downstream,
+    so evicting or clearing an entry only forgets it: its files are kept in `files`, outside of `max_bytes`,
+    and deleted by `shutdown` or when the SparkContext changes.
+    """
+
+    def __init__(self, max_bytes = 1 << 30, mode = MEMORY, directory = '/tmp/orange_spark_query_cache'):
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.directory = directory
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.sc = None
+        self.files = []
+
+    @property
+    def size_in_bytes(self):
+        return sum(e.size_in_bytes for e in self.entries.values())
+
+    def key(self, hc, query):
+        tables = extract_table_names(query)
+        versions = tuple((t, get_table_version(hc, t)) for t in tables)
+        return normalize_sql(query), versions
+
+    def get(self, sc, hc, query):
+        """
+        Return (DataFrame, hit), running and caching the query on a miss.
+        """
+        if sc is not self.sc:
+            # Cached DataFrames do not survive their SparkContext, neither do the ones sent downstream.
+            self.entries.clear()
+            self.sc = sc
+            self.delete_files()
+
+        key = self.key(hc, query)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry.df, True
+
+        self.misses += 1
+        df = hc.sql(query)
+        entry = self.materialize(sc, hc, df, key)
+        if entry.size_in_bytes > self.max_bytes:
+            # Too big to keep, hand out the plain query result, the materialized one was never sent.
+            self.release(entry)
+            if entry.path is not None:
+                self.files.remove(entry.path)
+                delete_path(sc, entry.path)
+            return df, False
+        self.entries[key] = entry
+        self.evict()
+        return entry.df, False
+
+    def materialize(self, sc, hc, df, key):
+        if self.mode == PARQUET:
+            # Unique per run, a re-run of an evicted query must not overwrite the files of its earlier result.
+            path = os.path.join(self.directory, hashlib.sha1(repr(key).encode('utf-8')).hexdigest() + '_' + uuid.uuid4().hex)
+            df.write.parquet(path)
+            self.files.append(path)
+            return CacheEntry(hc.read.parquet(path), path_size_in_bytes(sc, path), path)
+
+        df = df.persist(StorageLevel.MEMORY_AND_DISK)
+        df.count()
+        size = estimate_size_in_bytes(df)
+        return CacheEntry(df, size if size is not None else 0)
+
+    def release(self, entry):
+        """
+        Forget the storage of an entry. Persisted DataFrames are unpersisted, sent ones recompute from their lineage.
+        Parquet files are left in place for the DataFrames already sent, see `shutdown`.
+        """
+        if entry.path is None:
+            entry.df.unpersist()
+
+    def evict(self):
+        while self.entries and self.size_in_bytes > self.max_bytes:
+            _, entry = self.entries.popitem(last = False)
+            self.release(entry)
+
+    def clear(self):
+        while self.entries:
+            _, entry = self.entries.popitem(last = False)
+            self.release(entry)
+
+    def delete_files(self):
+        while self.files:
+            delete_path(self.sc, self.files.pop())
+
+    def shutdown(self):
+        """
+        Clear the cache and delete every Parquet file it wrote, once no DataFrame read from them is used any more.
+        """
+        self.clear()
+        if self.sc is not None:
+            self.delete_files()
@@ -6,8 +6,16 @@ __maintainer__ = "JOse Antonio Martin H."
 __email__ = "xjamartinh@gmail.com"
 
 import inspect
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from urllib.parse import unquote
 
 from pyspark.sql import DataFrame
+from pyspark.sql import functions as F
 
 
 def get_dataframe_function_info(func_name):
@@ -28,3 +36,220 @@ def get_dataframe_function_info(func_name):
     full_description += "</body></html>"
 
     return full_description
+
+
+def quote_identifier(name):
+    """
+    Quote a table name for use inside a SparkSQL expression.
+    :param name: the raw identifier, may be qualified with dots, e.g. db.table
+    :return: the identifier quoted with backticks.
+    """
+    return '.'.join(quote_column(part) for part in str(name).split('.'))
+
+
+def quote_column(name):
+    """
+    Quote a column name for use inside a SparkSQL expression or F.col.
+    The whole name is quoted, a dot in it is part of the name and not a struct field access.
+    """
+    return '`' + str(name).replace('`', '``') + '`'
+
+
+def quote_literal(value):
+    """
+    Quote a python value as a SparkSQL string literal.
+    """
+    return "'" + str(value).replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+
+def get_table_partitions(hc, table_name):
+    """
+    List the partitions of a Hive table.
+    :param hc: a HiveContext
+    :param table_name: the qualified name of the table, e.g. db.table
+    :return: a list of OrderedDict partition specs {column: value}, empty if the table is not partitioned.
+    """
+    try:
+        rows = hc.sql('SHOW PARTITIONS ' + table_name).collect()
+    except Exception:
+        # Not a partitioned table (AnalysisException) or not a Hive table at all.
+        return []
+
+    partitions = []
+    for row in rows:
+        spec = OrderedDict()
+        for part in row[0].split('/'):
+            column, _, value = part.partition('=')
+            spec[unquote(column)] = unquote(value)
+        partitions.append(spec)
+    return partitions
+
+
+def partition_predicates(partition_filters):
+    """
+    Build the SparkSQL predicates for a partition filter.
+    :param partition_filters: a dict {partition column: list of accepted values}, empty lists accept every value.
+    :return: a list of predicate strings to be AND-ed.
+    """
+    return [quote_column(column) + ' IN (' + ', '.join(quote_literal(v) for v in values) + ')'
+            for column, values in partition_filters.items() if values]
+
+
+def filter_partitions(partitions, partition_filters):
+    """
+    Return the partition specs accepted by `partition_filters` (see partition_predicates).
+    """
+    return [spec for spec in partitions
+            if all(not values or spec.get(column) in values for column, values in partition_filters.items())]
+
+
+def plan_size_in_bytes(jplan, jdf):
+    """
+    The estimated size in bytes of a JVM logical plan node, None if the plan has no usable statistics.
+    """
+    for get_stats in (lambda: jplan.stats(),  # Spark >= 2.3
+                      lambda: jplan.stats(jdf.sparkSession().sessionState().conf()),  # Spark 2.2
+                      lambda: jplan.statistics()):  # Spark 1.x - 2.1
+        try:
+            return int(get_stats().sizeInBytes().toString())
+        except Exception:
+            continue
+    return None
+
+
+def estimate_size_in_bytes(df):
+    """
+    Estimate the size in bytes of a DataFrame from the statistics of its optimized logical plan.
+    No Spark job is run.
+    :return: the estimated size as an int, or None if the plan has no usable statistics.
+    """
+    return plan_size_in_bytes(df._jdf.queryExecution().optimizedPlan(), df._jdf)
+
+
+def format_bytes(n_bytes):
+    if n_bytes is None:
+        return 'unknown'
+    for unit in ('B', 'KB', 'MB', 'GB', 'TB'):
+        if abs(n_bytes) < 1024 or unit == 'TB':
+            break
+        n_bytes /= 1024.0
+    return '{0:.1f} {1}'.format(n_bytes, unit) if unit != 'B' else '{0} B'.format(int(n_bytes))
+
+
+def run_concurrently(sc, statements, dependencies, execute, max_workers = 4, pool_prefix = 'orange_sql'):
+    """
+    Run statements on a thread pool as soon as all the statements they depend on are done.
+    Each statement runs in its own FAIR scheduler pool (effective when spark.scheduler.mode is FAIR)
+    so that independent statements share the cluster instead of queueing behind each other.
+    :param statements: the statements to run.
+    :param dependencies: for every statement, the set of indexes of the statements it depends on.
+    :param execute: a function statement -> result, e.g. HiveContext.sql
+    :return: a list of (result, seconds) in the order of the statements.
+    :raises: the first exception raised by a statement, pending statements are not started.
+    """
+
+    def run(i):
+        sc.setLocalProperty('spark.scheduler.pool', '{0}_{1}'.format(pool_prefix, i))
+        try:
+            start = time.time()
+            result = execute(statements[i])
+            return result, time.time() - start
+        finally:
+            sc.setLocalProperty('spark.scheduler.pool', None)
+
+    results = [None] * len(statements)
+    remaining = OrderedDict((i, set(d)) for i, d in enumerate(dependencies))
+    running = { }
+    with ThreadPoolExecutor(max_workers = max_workers) as executor:
+        while remaining or running:
+            for i in [i for i, d in remaining.items() if not d]:
+                del remaining[i]
+                running[executor.submit(run, i)] = i
+            done, _ = wait(list(running), return_when = FIRST_COMPLETED)
+            for future in done:
+                i = running.pop(future)
+                results[i] = future.result()
+                for d in remaining.values():
+                    d.discard(i)
+    return results
+
+
+def stratified_fractions(df, column, fraction = None, rows_per_stratum = None):
+    """
+    Compute per-stratum sampling fractions for DataFrame.sampleBy with a single aggregation pass.
+    :param fraction: keep this fraction of every stratum, i.e. preserve the class distribution.
+    :param rows_per_stratum: aim at this many rows in every stratum, i.e. balance the classes.
+    :return: a dict {stratum value: fraction}
+    """
+    counts = dict(tuple(row) for row in df.groupBy(column).count().collect())
+    if rows_per_stratum is not None:
+        return { k: min(1.0, float(rows_per_stratum) / n) for k, n in counts.items() if k is not None }
+    return { k: float(fraction) for k in counts if k is not None }
+
+
+def sample_exact(df, n_rows, seed = None, n_total = None):
+    """
+    Sample (close to) exactly `n_rows` rows: oversample by three standard deviations of the
+    binomial sample size, then limit.
+    :param n_total: the row count of df if already known, otherwise one count pass is run.
+    """
+    n_total = df.count() if n_total is None else n_total
+    if n_total <= n_rows:
+        return df
+    fraction = min(1.0, (n_rows + 3 * math.sqrt(n_rows) + 10) / n_total)
+    return df.sample(False, fraction, seed).limit(n_rows)
+
+
+def sample_hash(df, fraction, columns = None, buckets = 1000000):
+    """
+    Deterministic sample: keep the rows whose hash of `columns` (all columns by default) falls below `fraction`.
+    The same rows are selected on every run, whatever the partitioning of the data.
+    """
+    columns = columns or df.columns
+    bucket = F.pmod(F.hash(*[F.col(quote_column(c)) for c in columns]), F.lit(buckets))
+    return df.where(bucket < int(round(fraction * buckets)))
+
+
+class SparkJob:
+    """
+    Run `func()` on a worker thread inside its own Spark job group, so that it can be cancelled.
+    The owner polls `done()` and `elapsed`, then reads `result` or `error`.
+    """
+
+    def __init__(self, sc, func, description = ''):
+        self.sc = sc
+        self.func = func
+        self.description = description
+        self.group = 'orange_' + uuid.uuid4().hex
+        self.result = None
+        self.error = None
+        self.cancelled = False
+        self.start_time = None
+        self.end_time = None
+        self.thread = threading.Thread(target = self.run, daemon = True)
+
+    @property
+    def elapsed(self):
+        if self.start_time is None:
+            return 0.0
+        return (self.end_time or time.time()) - self.start_time
+
+    def start(self):
+        self.start_time = time.time()
+        self.thread.start()
+
+    def done(self):
+        return self.start_time is not None and not self.thread.is_alive()
+
+    def run(self):
+        self.sc.setJobGroup(self.group, self.description, True)
+        try:
+            self.result = self.func()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.end_time = time.time()
+
+    def cancel(self):
+        self.cancelled = True
+        self.sc.cancelJobGroup(self.group)
@@ -0,0 +1,286 @@
+__author__ = "Jose Antonio Martin H."
+__copyright__ = "Copyright 2015, Jose Antonio Martin H."
+__credits__ = ["The Orange Machine Learning Project, Jose Antonio Martin H. "]
+__license__ = "Apache License 2.0"
+__maintainer__ = "JOse Antonio Martin H."
+__email__ = "xjamartinh@gmail.com"
+
+from collections import OrderedDict
+
+import numpy as np
+import Orange
+from pyspark.sql import functions as F, Window
+from pyspark.sql.types import NumericType
+
+from orangecontrib.spark.utils.spark_api_utils import quote_column
+
+PROFILE_NUMERIC = ['count', 'nulls', 'null fraction', 'distinct', 'min', 'max', 'mean', 'stddev']
+
+
+def _approx_count_distinct(column):
+    approx = getattr(F, 'approx_count_distinct', None) or F.approxCountDistinct
+    return approx(column)
+
+
+def quantile_name(q):
+    return 'median' if q == 0.5 else 'q{0:g}'.format(100 * q)
+
+
+def profile_dataframe(df, quantiles = (0.25, 0.5, 0.75), top_k = 5, relative_error = 0.01):
+    """
+    Profile every column of a DataFrame in two passes.
+    The first one is a single aggregation: counts, nulls, approximate distinct counts (HyperLogLog),
+    min/max, mean/stddev and approximate quantiles (percentile_approx) of the numeric columns.
+    The second one finds the `top_k` most frequent values of all the columns with a single groupBy
+    over the columns stacked as (column, value) pairs, it is skipped when `top_k` is 0.
+    :return: a list with an OrderedDict of statistics per column.
+    """
+    fields = df.schema.fields
+    numeric = [isinstance(f.dataType, NumericType) for f in fields]
+    accuracy = max(1, int(round(1.0 / relative_error)))
+    quantile_array = 'array(' + ', '.join(repr(float(q)) for q in quantiles) + ')'
+
+    aggregates = [F.count(F.lit(1))]
+    for f, is_numeric in zip(fields, numeric):
+        column = F.col(quote_column(f.name))
+        aggregates += [F.count(column), _approx_count_distinct(column)]
+        if is_numeric:
+            value = column.cast('double')
+            aggregates += [F.min(value), F.max(value), F.avg(value), F.stddev(value)]
+            if quantiles:
+                aggregates.append(F.expr('percentile_approx(CAST({0} AS DOUBLE), {1}, {2})'.format(quote_column(f.name), quantile_array, accuracy)))
+    row = df.agg(*aggregates).collect()[0]
+
+    n_rows = row[0]
+    profile = []
+    position = 1
+    for f, is_numeric in zip(fields, numeric):
+        stats = OrderedDict([('column', f.name), ('type', f.dataType.simpleString())])
+        non_nulls, distinct = row[position], row[position + 1]
+        position += 2
+        stats['count'] = non_nulls
+        stats['nulls'] = n_rows - non_nulls
+        stats['null fraction'] = float(n_rows - non_nulls) / n_rows if n_rows else 0.0
+        stats['distinct'] = distinct
+        if is_numeric:
+            stats['min'], stats['max'], stats['mean'], stats['stddev'] = row[position:position + 4]
+            position += 4
+            if quantiles:
+                values = row[position] or [None] * len(quantiles)
+                position += 1
+                for q, v in zip(quantiles, values):
+                    stats[quantile_name(q)] = v
+        profile.append(stats)
+
+    if top_k:
+        for stats, values in zip(profile, top_values(df, [f.name for f in fields], top_k)):
+            stats['top values'] = values
+    return profile
+
+
+def top_values(df, columns, k = 5):
+    """
+    The `k` most frequent non null values of every column, with a single groupBy.
+    :return: a list (one per column) of lists of (value as string, count).
+    """
+    if not columns:
+        return []
+    pairs = F.explode(F.array(*[F.struct(F.lit(i).alias('i'), F.col(quote_column(c)).cast('string').alias('value'))
+                                for i, c in enumerate(columns)])).alias('pair')
+    counts = df.select(pairs).select('pair.i', 'pair.value').where(F.col('value').isNotNull()).groupBy('i', 'value').count()
+    rank = F.row_number().over(Window.partitionBy('i').orderBy(F.desc('count'), 'value'))
+    result = [[] for _ in columns]
+    for r in counts.withColumn('rank', rank).where(F.col('rank') <= k).orderBy('i', 'rank').collect():
+        result[r['i']].append((r['value'], r['count']))
+    return result
+
+
+def profile_to_orange(profile, quantiles = (0.25, 0.5, 0.75)):
+    """
+    A small Orange Table with one row per profiled column.
+    """
+    names = PROFILE_NUMERIC + [quantile_name(q) for q in quantiles]
+    attributes = [Orange.data.ContinuousVariable(name) for name in names]
+    metas = [Orange.data.StringVariable(name) for name in ('column', 'type', 'top values')]
+    domain = Orange.data.Domain(attributes = attributes, metas = metas)
+
+    X = np.array([[np.nan if stats.get(name) is None else float(stats[name]) for name in names] for stats in profile], dtype = float)
+    M = np.array([[stats['column'], stats['type'], ', '.join('{0} ({1})'.format(v, n) for v, n in stats.get('top values', []))]
+                  for stats in profile], dtype = object)
+    return Orange.data.Table.from_numpy(domain = domain, X = X.reshape(len(profile), len(names)), Y = None,
+                                        metas = M.reshape(len(profile), len(metas)), W = None)
+
+
+HISTOGRAM_METHODS = ['fixed width', 'quantile', 'categorical']
+
+
+def column_ranges(df, columns):
+    """
+    Min, max and non null count of the numeric `columns` with one aggregation.
+    :return: {column: (min, max, count)}
+    """
+    if not columns:
+        return { }
+    aggregates = []
+    for c in columns:
+        value = F.col(quote_column(c)).cast('double')
+        aggregates += [F.min(value), F.max(value), F.count(value)]
+    row = df.agg(*aggregates).collect()[0]
+    return dict((c, tuple(row[3 * i:3 * i + 3])) for i, c in enumerate(columns))
+
+
+def quantile_edges(df, columns, n_bins, relative_error = 0.001, ranges = None):
+    """
+    Bin edges with (about) the same number of rows in each bin, the splits QuantileDiscretizer would use,
+    computed with a single approxQuantile call over all the columns.
+    """
+    ranges = ranges or column_ranges(df, columns)
+    probabilities = [float(i) / n_bins for i in range(1, n_bins)]
+    splits = df.approxQuantile([quote_column(c) for c in columns], probabilities, relative_error) if probabilities else [[]] * len(columns)
+    edges = { }
+    for c, column_splits in zip(columns, splits):
+        low, high, _ = ranges[c]
+        if low is None:
+            edges[c] = []
+        else:
+            edges[c] = sorted(set([low] + [s for s in column_splits if low < s < high] + [high]))
+            if len(edges[c]) == 1:
+                edges[c] = [low, high]
+    return edges
+
+
+def fixed_width_edges(ranges, n_bins):
+    edges = { }
+    for c, (low, high, _) in ranges.items():
+        if low is None:
+            edges[c] = []
+        elif low == high:
+            edges[c] = [low, high]
+        else:
+            edges[c] = list(np.linspace(low, high, n_bins + 1))
+    return edges
+
+
+def bin_index(column, edges):
+    """
+    The index of the bin of `column` for the sorted `edges`, the last bin includes its upper edge, null for nulls.
+    Evenly spaced edges use arithmetic, the others a CASE expression.
+    """
+    value = F.col(quote_column(column)).cast('double')
+    n_bins = len(edges) - 1
+    if n_bins <= 1:
+        return F.when(value.isNotNull(), F.lit(0))
+    widths = np.diff(edges)
+    if np.allclose(widths, widths[0]):
+        return F.least(F.floor((value - float(edges[0])) / float(widths[0])), F.lit(n_bins - 1)).cast('int')
+    index = F.when(value < float(edges[1]), F.lit(0))
+    for i in range(1, n_bins - 1):
+        index = index.when(value < float(edges[i + 1]), F.lit(i))
+    return index.when(value.isNotNull(), F.lit(n_bins - 1))
+
+
+def _stacked_bin_counts(df, keys):
+    """
+    Count the rows per key tuple for every entry of `keys` (a list of lists of column expressions)
+    with a single groupBy over the stacked entries.
+    :return: a list (one per entry) of {key tuple: count}
+    """
+    n_keys = max(len(k) for k in keys)
+    structs = [F.struct(*([F.lit(i).alias('i')] + [key.alias('k' + str(j)) for j, key in enumerate(entry)]))
+               for i, entry in enumerate(keys)]
+    names = ['k' + str(j) for j in range(n_keys)]
+    stacked = df.select(F.explode(F.array(*structs)).alias('p')).select('p.*')
+    result = [{ } for _ in keys]
+    for row in stacked.groupBy('i', *names).count().collect():
+        key = tuple(row[name] for name in names)
+        if None not in key:
+            result[row['i']][key] = row['count']
+    return result
+
+
+def histograms(df, columns, method = 'fixed width', n_bins = 20, relative_error = 0.001, max_categories = 50):
+    """
+    Histograms of `columns` computed in Spark, numeric columns are binned by `method`, the others
+    (and all of them with the 'categorical' method) are counted per value, keeping the `max_categories`
+    most frequent values and an 'other' bin.
+    :return: a list (one per column) of lists of (bin label, low, high, count), low and high are None for categories.
+    """
+    types = dict((f.name, f.dataType) for f in df.schema.fields)
+    numeric = [c for c in columns if method != 'categorical' and isinstance(types[c], NumericType)]
+    categorical = [c for c in columns if c not in numeric]
+
+    result = dict()
+    if numeric:
+        ranges = column_ranges(df, numeric)
+        if method == 'quantile':
+            edges = quantile_edges(df, numeric, n_bins, relative_error, ranges)
+        else:
+            edges = fixed_width_edges(ranges, n_bins)
+        binned = [c for c in numeric if edges[c]]
+        counts = _stacked_bin_counts(df, [[bin_index(c, edges[c])] for c in binned]) if binned else []
+        for c in numeric:
+            result[c] = []
+        for c, column_counts in zip(binned, counts):
+            column_edges = edges[c]
+            result[c] = [('[{0:.4g}, {1:.4g}{2}'.format(column_edges[i], column_edges[i + 1], ']' if i == len(column_edges) - 2 else ')'),
+                          column_edges[i], column_edges[i + 1], column_counts.get((i,), 0)) for i in range(len(column_edges) - 1)]
+
+    if categorical:
+        totals = df.agg(*[F.count(F.col(quote_column(c))) for c in categorical]).collect()[0]
+        for c, total, values in zip(categorical, totals, top_values(df, categorical, max_categories)):
+            result[c] = [(value, None, None, n) for value, n in values]
+            other = total - sum(n for _, n in values)
+            if other:
+                result[c].append(('other', None, None, other))
+    return [result[c] for c in columns]
+
+
+def histograms_2d(df, pairs, n_bins = 20):
+    """
+    Fixed width 2-D bin counts of pairs of numeric columns, all the pairs in a single groupBy.
+    :return: a list (one per pair) of lists of (x low, x high, y low, y high, count) for the non empty bins.
+    """
+    if not pairs:
+        return []
+    columns = sorted(set(c for pair in pairs for c in pair))
+    edges = fixed_width_edges(column_ranges(df, columns), n_bins)
+    valid = [(x, y) for x, y in pairs if edges[x] and edges[y]]
+    counts = dict(zip(valid, _stacked_bin_counts(df, [[bin_index(x, edges[x]), bin_index(y, edges[y])] for x, y in valid]))) if valid else { }
+    result = []
+    for x, y in pairs:
+        bins = []
+        for (i, j), n in sorted(counts.get((x, y), { }).items()):
+            bins.append((edges[x][i], edges[x][i + 1], edges[y][j], edges[y][j + 1], n))
+        result.append(bins)
+    return result
+
+
+def histograms_to_orange(columns, column_histograms):
+    """
+    A long Orange Table with one row per bin: the column, the bin bounds and center, and the count.
+    """
+    column_var = Orange.data.DiscreteVariable('column', values = list(columns))
+    attributes = [column_var] + [Orange.data.ContinuousVariable(name) for name in ('low', 'high', 'center', 'count')]
+    domain = Orange.data.Domain(attributes = attributes, metas = [Orange.data.StringVariable('bin')])
+    X, M = [], []
+    for i, bins in enumerate(column_histograms):
+        for label, low, high, count in bins:
+            if low is None:
+                X.append([i, np.nan, np.nan, np.nan, count])
+            else:
+                X.append([i, low, high, (low + high) / 2.0, count])
+            M.append([label])
+    return Orange.data.Table.from_numpy(domain = domain, X = np.array(X, dtype = float).reshape(len(X), len(attributes)), Y = None,
+                                        metas = np.array(M, dtype = object).reshape(len(M), 1), W = None)
+
+
+def histograms_2d_to_orange(pairs, pair_histograms):
+    pair_var = Orange.data.DiscreteVariable('pair', values = ['{0} x {1}'.format(x, y) for x, y in pairs])
+    names = ('x low', 'x high', 'y low', 'y high', 'x center', 'y center', 'count')
+    attributes = [pair_var] + [Orange.data.ContinuousVariable(name) for name in names]
+    domain = Orange.data.Domain(attributes = attributes)
+    X = []
+    for i, bins in enumerate(pair_histograms):
+        for x_low, x_high, y_low, y_high, count in bins:
+            X.append([i, x_low, x_high, y_low, y_high, (x_low + x_high) / 2.0, (y_low + y_high) / 2.0, count])
+    return Orange.data.Table.from_numpy(domain = domain, X = np.array(X, dtype = float).reshape(len(X), len(attributes)), Y = None)
@@ -0,0 +1,165 @@
+__author__ = "Jose Antonio Martin H."
+__copyright__ = "Copyright 2015, Jose Antonio Martin H."
+__credits__ = ["The Orange Machine Learning Project, Jose Antonio Martin H. "]
+__license__ = "Apache License 2.0"
+__maintainer__ = "JOse Antonio Martin H."
+__email__ = "xjamartinh@gmail.com"
+
+import math
+from collections import OrderedDict
+from urllib.parse import unquote
+
+from pyspark.sql import functions as F
+
+from orangecontrib.spark.utils.spark_api_utils import estimate_size_in_bytes, quote_column
+
+FORMATS = ['parquet', 'orc', 'csv', 'json']
+
+# plan_file_layout never asks for more than this many times max(default parallelism, current partitions).
+MAX_PARTITIONS_FACTOR = 8
+
+
+def row_size_in_bytes(df):
+    """
+    The default (uncompressed) size of a row of the schema, as used by the Spark planner.
+    """
+    return max(1, df._jdf.schema().defaultSize())
+
+
+def default_size_in_bytes(df):
+    """
+    The size the planner assumes for plans without statistics, Long.MaxValue unless configured.
+    """
+    return int(df.sql_ctx.getConf('spark.sql.defaultSizeInBytes', str(2 ** 63 - 1)))
+
+
+def plan_file_layout(df, partition_cols = (), target_file_bytes = 128 * 1024 * 1024):
+    """
+    Arrange `df` so that the writer produces files close to `target_file_bytes`.
+    Without partition columns the number of tasks follows the estimated size of the plan, bounded by
+    MAX_PARTITIONS_FACTOR times the current parallelism and skipped when the plan has no statistics. With partition
+    columns every partition value goes to one task, large values are split in several files by maxRecordsPerFile.
+    :return: the rearranged DataFrame and the maxRecordsPerFile option (0 for no limit).
+    """
+    max_records = max(1, target_file_bytes // row_size_in_bytes(df)) if target_file_bytes else 0
+    if partition_cols:
+        return df.repartition(*[F.col(quote_column(c)) for c in partition_cols]), max_records
+    size = estimate_size_in_bytes(df) if target_file_bytes else None
+    # Sources without statistics (RDDs, unanalysed Hive or JDBC tables) report spark.sql.defaultSizeInBytes.
+    if size and size < default_size_in_bytes(df):
+        current = df._jdf.rdd().getNumPartitions()
+        max_partitions = max(df._sc.defaultParallelism, current) * MAX_PARTITIONS_FACTOR
+        df = df.repartition(min(max_partitions, max(1, int(math.ceil(float(size) / target_file_bytes)))))
+    return df, max_records
+
+
+def write_dataframe(df, target, fmt = 'parquet', mode = 'overwrite', partition_cols = (), target_file_bytes = 128 * 1024 * 1024,
+                    columns = None, as_table = False, bucket_cols = (), n_buckets = 0, options = None):
+    """
+    Write `df` to the path or, with `as_table`, to the metastore table `target`.
+    :param columns: the output projection, None writes all the columns.
+    :param bucket_cols: bucket the table by these columns into `n_buckets` buckets, only with `as_table`.
+    :param options: extra writer options, e.g. {'header': 'true'} for csv.
+    """
+    if columns:
+        df = df.select(*[F.col(quote_column(c)) for c in columns])
+    df, max_records = plan_file_layout(df, partition_cols, target_file_bytes)
+
+    writer = df.write.format(fmt).mode(mode)
+    if max_records:
+        # Spark >= 2.2, ignored by older versions.
+        writer = writer.option('maxRecordsPerFile', max_records)
+    for k, v in (options or { }).items():
+        writer = writer.option(k, v)
+    if partition_cols:
+        writer = writer.partitionBy(*partition_cols)
+    if as_table:
+        if bucket_cols and n_buckets:
+            writer = writer.bucketBy(n_buckets, *bucket_cols).sortBy(*bucket_cols)
+        writer.saveAsTable(target)
+    else:
+        writer.save(target)
+
+
+def read_back(hc, target, fmt = 'parquet', as_table = False, schema = None, options = None):
+    """
+    Read what write_dataframe wrote, the text formats are read with the `schema` of the written data.
+    """
+    if as_table:
+        return hc.table(target)
+    reader = hc.read.format(fmt)
+    if schema is not None and fmt in ('csv', 'json'):
+        reader = reader.schema(schema)
+    for k, v in (options or { }).items():
+        reader = reader.option(k, v)
+    return reader.load(target)
+
+
+def table_location(hc, table_name):
+    for row in hc.sql('DESCRIBE FORMATTED ' + table_name).collect():
+        if row[0] and row[0].strip().rstrip(':') == 'Location':
+            return row[1].strip()
+    return None
+
+
+def list_data_files(sc, path):
+    """
+    The data files under `path`, recursively, skipping the hidden and metadata ones ('_SUCCESS', '.crc', ...).
+    :return: an OrderedDict {qualified file path: length in bytes}, empty if the path does not exist.
+    """
+    jpath = sc._jvm.org.apache.hadoop.fs.Path(path)
+    fs = jpath.getFileSystem(sc._jsc.hadoopConfiguration())
+    result = OrderedDict()
+    if not fs.exists(jpath):
+        return result
+    files = fs.listFiles(jpath, True)
+    while files.hasNext():
+        status = files.next()
+        file_path = status.getPath().toString()
+        if not file_path.rsplit('/', 1)[-1].startswith(('_', '.')):
+            result[file_path] = status.getLen()
+    return result
+
+
+def partition_stats(sc, hc, path, fmt = 'parquet', partition_cols = (), exclude_files = (), options = None):
+    """
+    Rows, bytes and files written under `path` for every partition.
+    Bytes come from a single recursive file listing and rows from a count grouped by input file,
+    which reads no column data.
+    :param exclude_files: files to leave out, e.g. the list_data_files taken before an append, so that
+        only the files of the last write are reported.
+    :param options: the reader options matching the writer ones, e.g. {'header': 'true'} for csv, so that
+        header lines are not counted as rows.
+    :return: a list of OrderedDicts with the partition values, 'rows', 'bytes' and 'files'.
+    """
+    jpath = sc._jvm.org.apache.hadoop.fs.Path(path)
+    fs = jpath.getFileSystem(sc._jsc.hadoopConfiguration())
+    root = fs.makeQualified(jpath).toString().rstrip('/')
+
+    def partition_values(file_path):
+        relative = file_path[file_path.index(root) + len(root):].strip('/').split('/') if root in file_path else [file_path]
+        return tuple(unquote(p.split('=', 1)[1]) for p in relative[:-1] if '=' in p)
+
+    exclude_files = set(exclude_files)
+    files = [(f, n) for f, n in list_data_files(sc, path).items() if f not in exclude_files]
+    if not files:
+        return []
+    stats = OrderedDict()
+    for file_path, n_bytes in files:
+        entry = stats.setdefault(partition_values(file_path), { 'rows': 0, 'bytes': 0, 'files': 0 })
+        entry['bytes'] += n_bytes
+        entry['files'] += 1
+
+    reader = hc.read.format(fmt).option('basePath', path)
+    for k, v in (options or { }).items():
+        reader = reader.option(k, v)
+    read_back = reader.load([f for f, _ in files])
+    for file_path, n_rows in read_back.groupBy(F.input_file_name()).count().collect():
+        stats.setdefault(partition_values(file_path), { 'rows': 0, 'bytes': 0, 'files': 0 })['rows'] += n_rows
+
+    result = []
+    for values, entry in sorted(stats.items()):
+        item = OrderedDict(zip(partition_cols, values))
+        item.update(entry)
+        result.append(item)
+    return result
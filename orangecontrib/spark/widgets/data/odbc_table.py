@@ -1,11 +1,18 @@
 import os.path
+import threading
+from functools import partial
+
 import pyodbc
 
 from Orange.widgets.widget import OWWidget
 import pandas as pd
-import pandas.io.sql as psql
+import pyspark
 
-from orangecontrib.spark.utils.data_utils import pandas_to_orange, format_sql
+from orangecontrib.spark.base.shared_spark_context import SharedSparkContext
+from orangecontrib.spark.utils.data_utils import pandas_to_orange, format_sql, arrays_to_orange
+from orangecontrib.spark.utils.odbc_cache import ODBCResultCache
+from orangecontrib.spark.utils.odbc_utils import ConnectionPool, QueryTask, QueryCancelled, odbc_to_spark
+from orangecontrib.spark.utils.spark_api_utils import SparkJob
 import Orange
 
 # from Orange.widgets import widget, gui, settings
@@ -26,7 +33,7 @@ def convert_dataframe_to_orange(df):
     return pandas_to_orange(df)
 
 
-class OWodbcTable(OWWidget):
+class OWodbcTable(SharedSparkContext, OWWidget):
     priority = 3
     allSQLSelectWidgets = []
     settingsList = ["recentConnections", "lastQuery"]
@@ -36,10 +43,29 @@ class OWodbcTable(OWWidget):
     inputs = []
     outputs = [("Data", Orange.data.Table, widget.Default),
                ("Feature Definitions", Orange.data.Domain, widget.Default),
-               ("Pandas", pd.DataFrame, widget.Default)]
+               ("Pandas", pd.DataFrame, widget.Default),
+               ("DataFrame", pyspark.sql.DataFrame, widget.Dynamic)]
 
     settingsHandler = settings.DomainContextHandler()
 
+    out_df = None
+
+    # Shared by all the ODBC widgets, connections are reused across queries.
+    connection_pool = ConnectionPool()
+    batch_size = settings.Setting(10000)
+    max_rows = settings.Setting(0)
+    send_pandas = settings.Setting(True)
+    health_query = settings.Setting('SELECT 1')
+    partition_column = settings.Setting('')
+    n_partitions = settings.Setting(8)
+    fetch_on_executors = settings.Setting(0)
+    staging_directory = settings.Setting('/tmp/orange_spark_odbc')
+    use_disk_cache = settings.Setting(False)
+    cache_directory = settings.Setting(os.path.join(os.path.expanduser('~'), '.cache', 'orange-spark', 'odbc'))
+    cache_ttl_hours = settings.Setting(24)
+    cache_max_mb = settings.Setting(2048)
+    query_timeout = settings.Setting(0)
+
     def __init__(self):
         super().__init__()
         gui.label(self.controlArea, self, "from pandas:")
@@ -69,6 +95,7 @@ class OWodbcTable(OWWidget):
         self.connectLineEdit = gui.lineEdit(self.connectBox, self, 'connectString', callback = None)
         self.connectCombo = gui.comboBox(self.connectBox, self, 'connectString', items = self.recentConnections, valueType = str, sendSelectedValue = True)
         self.button = gui.button(self.connectBox, self, 'connect', callback = self.connectDB, disabled = 0)
+        gui.lineEdit(self.connectBox, self, 'health_query', label = 'Health check query:')
         # query
         self.splitCanvas = QSplitter(QtCore.Qt.Vertical, self.mainArea)
         self.mainArea.layout().addWidget(self.splitCanvas)
@@ -87,7 +114,29 @@ class OWodbcTable(OWWidget):
         gui.button(self.selectBox, self, "Save...", callback = self.saveScript)
         self.selectBox.setSizePolicy(QSizePolicy(QSizePolicy.MinimumExpanding, QSizePolicy.MinimumExpanding))
         gui.button(self.selectBox, self, 'format SQL!', callback = self.format_sql, disabled = 0)
-        gui.button(self.selectBox, self, 'execute!', callback = self.executeQuery, disabled = 0)
+        self.executeButton = gui.button(self.selectBox, self, 'execute!', callback = self.executeQuery, disabled = 0)
+        self.cancelButton = gui.button(self.selectBox, self, 'cancel', callback = self.cancelQuery, disabled = 1)
+        gui.spin(self.selectBox, self, 'query_timeout', 0, 7 * 24 * 3600, step = 10, label = 'Timeout in seconds (0 = none):')
+        gui.spin(self.selectBox, self, 'batch_size', 100, 1000000, step = 100, label = 'Fetch batch size:')
+        gui.spin(self.selectBox, self, 'max_rows', 0, 2 ** 31 - 1, step = 1000, label = 'Max rows (0 = all):')
+        gui.checkBox(self.selectBox, self, 'send_pandas', 'Send pandas DataFrame')
+
+        # on disk result cache
+        self.cacheBox = gui.widgetBox(self.controlArea, "Result cache")
+        gui.checkBox(self.cacheBox, self, 'use_disk_cache', 'Cache results on disk (needs pyarrow)', disabled = not ODBCResultCache.available())
+        gui.lineEdit(self.cacheBox, self, 'cache_directory', label = 'Directory:')
+        gui.spin(self.cacheBox, self, 'cache_ttl_hours', 1, 24 * 365, label = 'Expire after (hours):')
+        gui.spin(self.cacheBox, self, 'cache_max_mb', 1, 1024 * 1024, label = 'Max size (MB):')
+        self.refreshButton = gui.button(self.cacheBox, self, 'refresh!', callback = partial(self.executeQuery, refresh = True), disabled = 0)
+        gui.button(self.cacheBox, self, 'Clear cache', callback = self.clear_cache)
+
+        # partitioned extraction into Spark
+        self.sparkBox = gui.widgetBox(self.controlArea, "To Spark")
+        gui.lineEdit(self.sparkBox, self, 'partition_column', label = 'Partition column (numeric or date):')
+        gui.spin(self.sparkBox, self, 'n_partitions', 1, 1024, label = 'Partitions:')
+        gui.comboBox(self.sparkBox, self, 'fetch_on_executors', label = 'Fetch on:', items = ['Spark executors', 'driver threads'], orientation = 'horizontal')
+        gui.lineEdit(self.sparkBox, self, 'staging_directory', label = 'Staging directory (driver threads):')
+        self.sparkButton = gui.button(self.sparkBox, self, 'execute to Spark!', callback = self.executeQueryToSpark, disabled = 0)
         self.domainBox = gui.widgetBox(self.controlArea, "Domain")
         self.domainLabel = gui.label(self.domainBox, self, '')
         # info
@@ -98,6 +147,25 @@ class OWodbcTable(OWWidget):
         self.resize(300, 300)
 
         self.cnxn = None
+        self.task = None
+        self.task_cache = None
+        self.task_timer = QtCore.QTimer(self)
+        self.task_timer.setInterval(200)
+        self.task_timer.timeout.connect(self.checkQueryTask)
+        self.spark_job = None
+        self.spark_query = None
+        self.spark_cancelled = None
+        self.spark_timer = QtCore.QTimer(self)
+        self.spark_timer.setInterval(200)
+        self.spark_timer.timeout.connect(self.checkSparkJob)
+
+    def onDeleteWidget(self):
+        if self.task is not None:
+            self.task.cancel()
+        if self.spark_job is not None:
+            self.spark_cancelled.set()
+            self.spark_job.cancel()
+        self.connection_pool.close_all()
 
     def destroy(self, destroyWindow, destroySubWindows):
         self.allSQLSelectWidgets.remove(self)
@@ -138,41 +206,172 @@ class OWodbcTable(OWWidget):
         return False
 
     # Execute a query, create data from it and send it over the data channel
-    def executeQuery(self, query = None, throughReload = 0, DK = None, DC = None):
+    def executeQuery(self, query = None, throughReload = 0, DK = None, DC = None, refresh = False):
 
-        self.connectDB()
+        self.update_recent_connections()
         query = self.queryTextEdit.toPlainText()
 
         if query is None:
             query = str(self.queryTextEdit.toPlainText())
-        # try:
-        self.pandas = psql.read_sql_query(query, self.cnxn)
-        # except Exception:
-        #    self.setInfo(('Query failed:', str('')))
-        #    df = pd.DataFrame()
 
-        self.data = convert_dataframe_to_orange(self.pandas)
+        if self.task is not None or self.spark_job is not None:
+            return
+        cache = self.result_cache() if self.use_disk_cache else None
+        cached = None
+        if cache is not None and not refresh:
+            cached = cache.get(self.connectString, query, self.max_rows or None)
+
+        if cached is not None:
+            result, age = cached
+            self.setQueryResult(query, result, 'Read from cache ({0:.0f} min old)'.format(age / 60))
+            return
+
+        # The query runs on a worker thread, checkQueryTask picks up the result.
+        self.connection_pool.health_query = self.health_query
+        self.task = QueryTask(self.connection_pool, self.connectString, query, self.batch_size, self.max_rows or None, self.query_timeout)
+        self.task_cache = cache
+        self.task.start()
+        self.setRunning(True)
+        self.task_timer.start()
+
+    def setRunning(self, running):
+        self.executeButton.setDisabled(running)
+        self.refreshButton.setDisabled(running)
+        self.sparkButton.setDisabled(running)
+        self.cancelButton.setEnabled(running)
+        if running:
+            self.progressBarInit()
+        else:
+            self.progressBarFinished()
+
+    def cancelQuery(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.setInfo(('Cancelling...', ''))
+        if self.spark_job is not None:
+            self.spark_cancelled.set()
+            self.spark_job.cancel()
+            self.setInfo(('Cancelling...', ''))
+
+    def checkQueryTask(self):
+        task = self.task
+        if task is None:
+            self.task_timer.stop()
+            return
+        task.check_timeout()
+        if not task.done():
+            self.setInfo(('Running for {0:.1f} s'.format(task.elapsed), 'Fetched ' + str(task.rows_fetched) + ' rows'))
+            if self.max_rows:
+                self.progressBarSet(100.0 * task.rows_fetched / self.max_rows)
+            return
+
+        self.task_timer.stop()
+        self.task = None
+        self.setRunning(False)
+        if isinstance(task.error, QueryCancelled):
+            self.setInfo(('Query timed out' if task.timed_out else 'Query cancelled', 'after {0:.1f} s, {1} rows fetched'.format(task.elapsed, task.rows_fetched)))
+            return
+        if task.error is not None:
+            self.setInfo(('Query failed:', str(task.error)))
+            return
+        if self.task_cache is not None:
+            self.task_cache.put(task.connect_string, task.query, task.result, task.max_rows)
+        self.setQueryResult(task.query, task.result, 'Query returned in {0:.1f} s'.format(task.elapsed))
+
+    def setQueryResult(self, query, result, source):
+        numeric_names, X, object_names, M, integer_columns, truncated = result
+
+        # The pandas copy is only built on request, the Orange table reuses the fetch buffers
+        # (discrete columns are recoded in place, hence the copy).
+        self.pandas = None
+        if self.send_pandas:
+            self.pandas = pd.concat([pd.DataFrame(X, columns = numeric_names, copy = True), pd.DataFrame(M, columns = object_names, copy = True)], axis = 1)
+        self.data = arrays_to_orange(numeric_names, X, object_names, M, integer_columns)
 
         self.send("Data", self.data)
         self.send("Pandas", self.pandas)
-        self.setInfo(('Query returned', 'Read ' + str(len(self.data)) + ' examples!'))
+        self.setInfo((source, 'Read ' + str(len(self.data)) + ' examples!' + (' (row limit reached)' if truncated else '')))
         self.send("Feature Definitions", self.data.domain)
         self.setMeta()
         self.lastQuery = query
 
+    def result_cache(self):
+        return ODBCResultCache(self.cache_directory, self.cache_max_mb * 1024 * 1024, self.cache_ttl_hours * 3600)
+
+    def clear_cache(self):
+        self.result_cache().clear()
+        self.setInfo(('Cache cleared', self.cache_directory))
+
+    def executeQueryToSpark(self):
+        """
+        Read the query into a Spark DataFrame, split into ranges of the partition column
+        that are fetched concurrently. The extraction runs in a SparkJob, checkSparkJob picks up the DataFrame.
+        """
+        if self.task is not None or self.spark_job is not None:
+            return
+        if not self.sc or not self.hc:
+            self.setInfo(('No Spark context', 'Create one with the Context widget first.'))
+            return
+        if not self.partition_column.strip():
+            self.setInfo(('No partition column', 'Enter a numeric or date column of the query result.'))
+            return
+        self.update_recent_connections()
+        query = str(self.queryTextEdit.toPlainText())
+        sc, hc, pool, connect_string = self.sc, self.hc, self.connection_pool, self.connectString
+        column, n_partitions = self.partition_column.strip(), self.n_partitions
+        kwargs = dict(batch_size = self.batch_size, on_executors = self.fetch_on_executors == 0, max_workers = pool.max_idle,
+                      staging_directory = self.staging_directory, cancelled = threading.Event())
+
+        def run():
+            with pool.connection(connect_string) as cnxn:
+                df = odbc_to_spark(sc, hc, cnxn, connect_string, query, column, n_partitions, **kwargs)
+            return df, df.rdd.getNumPartitions()
+
+        self.spark_cancelled = kwargs['cancelled']
+        self.spark_job = SparkJob(sc, run, 'ODBC to Spark')
+        self.spark_query = query
+        self.spark_job.start()
+        self.setRunning(True)
+        self.spark_timer.start()
+
+    def checkSparkJob(self):
+        job = self.spark_job
+        if not job.done():
+            self.setInfo(('Running for {0:.1f} s'.format(job.elapsed), 'Fetching into Spark'))
+            return
+
+        self.spark_timer.stop()
+        self.spark_job = None
+        self.setRunning(False)
+        if job.cancelled or isinstance(job.error, QueryCancelled):
+            self.setInfo(('Query cancelled', 'after {0:.1f} s'.format(job.elapsed)))
+            return
+        if job.error is not None:
+            self.setInfo(('Query failed:', str(job.error)))
+            return
+        self.out_df, n_partitions = job.result
+        self.send("DataFrame", self.out_df)
+        self.setInfo(('Spark DataFrame created', '{0} partitions on {1}'.format(n_partitions, self.partition_column)))
+        self.lastQuery = self.spark_query
+
     def format_sql(self):
         query = str(self.queryTextEdit.toPlainText())
         str_sql = str(format_sql(query))
         self.queryTextEdit.clear()
         self.queryTextEdit.insertPlainText(str_sql)
 
-    def connectDB(self):
+    def update_recent_connections(self):
         if self.connectString is None:
             self.connectString = str(self.connectString)
         if self.connectString in self.recentConnections: self.recentConnections.remove(self.connectString)
         self.recentConnections.insert(0, self.connectString)
-        print(self.connectString)
-        self.cnxn = pyodbc.connect(self.connectString, autocommit = True)
+
+    def connectDB(self):
+        self.update_recent_connections()
+        # Opens (or health checks) a pooled connection, it is kept open for the next queries.
+        with self.connection_pool.connection(self.connectString):
+            pass
+        self.setInfo(('Connected to', self.connectString))
 
     # set the query combo box
     def setConnectionList(self):
@@ -44,6 +44,7 @@ class OWSparkContext(SharedSparkContext, widget.OWWidget):
         main_parameters["spark.driver.cores"] = "4"
         main_parameters["spark.driver.memory"] = "2g"
         main_parameters["spark.logConf"] = "false"
+        main_parameters["spark.scheduler.mode"] = "FAIR"
         main_parameters["spark.app.id"] = "dummy"
 
         for k, v in self.saved_gui_params.items():
@@ -0,0 +1,169 @@
+__author__ = 'jamh'
+from collections import OrderedDict
+
+import pyspark
+from Orange.widgets import widget, gui
+from Orange.widgets.settings import Setting
+from Orange.widgets.utils import itemmodels
+from PyQt4 import QtGui
+
+from orangecontrib.spark.base.shared_spark_context import SharedSparkContext
+from orangecontrib.spark.utils.file_utils import SOURCE_FORMATS, FOOTER_FORMATS, read_files
+from orangecontrib.spark.utils.gui_utils import GuiParam, create_filtered_list_view, selected_rows, select_rows
+from orangecontrib.spark.utils.spark_api_utils import estimate_size_in_bytes, format_bytes, quote_column
+
+
+class OWSparkFile(SharedSparkContext, widget.OWWidget):
+    priority = 3
+    name = "File"
+    description = "Create a Spark DataFrame from Parquet, ORC, JSON or CSV files"
+    icon = "../icons/File.svg"
+    outputs = [("DataFrame", pyspark.sql.DataFrame, widget.Dynamic)]
+
+    want_main_area = False
+    resizing_enabled = True
+    out_df = None
+    files_df = None
+    partition_columns = list()
+    saved_gui_params = Setting(OrderedDict())
+    saved_columns = Setting([])
+    schema_cache = Setting({ })
+    sample_rows = Setting(10000)
+
+    def __init__(self):
+        super().__init__()
+
+        box = gui.widgetBox(self.controlArea, "Files", addSpace = True)
+        self.gui_parameters = OrderedDict()
+        default_value = self.saved_gui_params.get('format', 'parquet')
+        self.gui_parameters['format'] = GuiParam(parent_widget = box, label = 'Format', list_values = SOURCE_FORMATS, default_value = default_value)
+        default_value = self.saved_gui_params.get('path', '')
+        self.gui_parameters['path'] = GuiParam(parent_widget = box, label = 'Path', default_value = default_value,
+                                               place_holder_text = 'file, directory or glob, local or hdfs://')
+        self.browse_btn = gui.button(self.gui_parameters['path'].hbox, self, label = '...', callback = self.browse)
+        default_value = self.saved_gui_params.get('header', 'True')
+        self.gui_parameters['header'] = GuiParam(parent_widget = box, label = 'CSV header', default_value = default_value)
+        default_value = self.saved_gui_params.get('delimiter', ',')
+        self.gui_parameters['delimiter'] = GuiParam(parent_widget = box, label = 'CSV delimiter', default_value = default_value)
+        gui.spin(box, self, 'sample_rows', 100, 10000000, step = 1000, label = 'Schema inference sample (rows):')
+        self.open_btn = gui.button(box, self, label = 'Open', callback = self.open_files)
+
+        # Columns to project, nothing selected means all columns.
+        self.columns_box = gui.widgetBox(self.controlArea, 'Columns (none selected = all)', addSpace = True)
+        self.columns_model = itemmodels.PyListModel()
+        self.columns_view = create_filtered_list_view(self.columns_box, self.columns_model)
+        self.columns_view.selectionModel().selectionChanged.connect(self.update_info)
+
+        # Predicates on partition columns prune whole directories, on other columns they are pushed to the reader.
+        self.predicate_box = gui.widgetBox(self.controlArea, 'Filter', addSpace = True)
+        default_value = self.saved_gui_params.get('predicate', '')
+        self.gui_parameters['predicate'] = GuiParam(parent_widget = self.predicate_box, default_value = default_value,
+                                                    place_holder_text = "SQL predicate, e.g. year = 2015 AND country = 'ES'")
+
+        self.info_box = gui.widgetBox(self.controlArea, 'Info')
+        self.info_label = gui.label(self.info_box, self, 'No files opened.')
+
+        action_box = gui.widgetBox(self.controlArea)
+        self.create_sc_btn = gui.button(action_box, self, label = 'Submit', callback = self.submit)
+
+        if self.gui_parameters['path'].get_value():
+            self.open_files()
+
+    def browse(self):
+        path = QtGui.QFileDialog.getExistingDirectory(self, 'Open directory', self.gui_parameters['path'].get_value())
+        if path:
+            self.gui_parameters['path'].update(path)
+
+    def reader_options(self):
+        fmt = self.gui_parameters['format'].get_value()
+        if fmt != 'csv':
+            return { }
+        return { 'header': str(self.gui_parameters['header'].get_usable_value()).lower(),
+                 'sep': self.gui_parameters['delimiter'].get_value() or ',' }
+
+    def open_files(self):
+        """
+        Read the schema of the files, no Spark job is run for parquet, orc or a cached schema.
+        """
+        self.files_df = None
+        self.columns_model.wrap([])
+        path = self.gui_parameters['path'].get_value().strip()
+        fmt = self.gui_parameters['format'].get_value()
+        if self.hc is None or not path:
+            self.update_info()
+            return
+        try:
+            self.files_df, cached = read_files(self.sc, self.hc, path, fmt, self.reader_options(), self.schema_cache, self.sample_rows)
+        except Exception as e:
+            self.info_label.setText('Cannot read {0}:\n{1}'.format(path, e))
+            return
+        self.partition_columns = self.discovered_partition_columns()
+
+        self.columns_model.wrap(['{0} ({1}){2}'.format(name, dtype, ' [partition]' if name in self.partition_columns else '')
+                                 for name, dtype in self.files_df.dtypes])
+        is_saved_path = self.saved_gui_params.get('path') == path
+        saved_columns = set(self.saved_columns) if is_saved_path else set()
+        select_rows(self.columns_view, [i for i, name in enumerate(self.files_df.columns) if name in saved_columns])
+        self.update_info()
+        if fmt not in FOOTER_FORMATS:
+            self.info_label.setText(self.info_label.text() + '\nSchema ' + ('from cache' if cached else 'inferred from {0} rows'.format(self.sample_rows)))
+
+    def discovered_partition_columns(self):
+        # The analyzed plan of a file read is a LogicalRelation over a HadoopFsRelation.
+        try:
+            return list(self.files_df._jdf.queryExecution().analyzed().relation().partitionSchema().fieldNames())
+        except Exception:
+            return []
+
+    def selected_columns(self):
+        if self.files_df is None:
+            return []
+        columns = self.files_df.columns
+        return [columns[i] for i in selected_rows(self.columns_view)]
+
+    def pruned_dataframe(self):
+        """
+        Apply the predicate and the column projection, both are pushed down to the file scan.
+        """
+        df = self.files_df
+        predicate = self.gui_parameters['predicate'].get_value().strip()
+        if predicate:
+            df = df.filter(predicate)
+        columns = self.selected_columns()
+        if columns:
+            df = df.select(*[quote_column(c) for c in columns])
+        return df
+
+    def update_info(self, *_):
+        if self.files_df is None:
+            self.info_label.setText('No files opened.')
+            return
+        n_columns = len(self.selected_columns()) or len(self.files_df.columns)
+        text = '{0} of {1} columns'.format(n_columns, len(self.files_df.columns))
+        if self.partition_columns:
+            text += '\nPartition columns: ' + ', '.join(self.partition_columns)
+        try:
+            n_bytes = estimate_size_in_bytes(self.pruned_dataframe())
+        except Exception:
+            n_bytes = None
+        text += '\nEstimated size: ' + format_bytes(n_bytes)
+        self.info_label.setText(text)
+
+    def submit(self):
+        if self.files_df is None:
+            self.open_files()
+        if self.files_df is None:
+            return
+        try:
+            self.out_df = self.pruned_dataframe()
+        except Exception as e:
+            self.info_label.setText('Invalid filter:\n{0}'.format(e))
+            return
+        self.send("DataFrame", self.out_df)
+        self.update_saved_gui_parameters()
+        self.hide()
+
+    def update_saved_gui_parameters(self):
+        for k in self.gui_parameters:
+            self.saved_gui_params[k] = self.gui_parameters[k].get_value()
+        self.saved_columns = self.selected_columns()
@@ -7,20 +7,24 @@ from Orange.widgets.settings import Setting
 from PyQt4 import QtGui
 
 from orangecontrib.spark.utils.gui_utils import GuiParam
+from orangecontrib.spark.utils.impute_utils import STRATEGIES, FillNaModel, constant_fill_values, compute_fill_values
 from orangecontrib.spark.utils.spark_api_utils import get_dataframe_function_info
 
 
 class OWSparkFillNa(widget.OWWidget):
     priority = 4
     name = "FillNa"
-    description = "Replace null values"
+    description = "Replace null values by a constant or by the mean, median or mode of each column"
     icon = "../icons/Impute.svg"
 
-    inputs = [("DataFrame", pyspark.sql.DataFrame, "get_input", widget.Default)]
-    outputs = [("DataFrame", pyspark.sql.DataFrame, widget.Default)]
+    inputs = [("DataFrame", pyspark.sql.DataFrame, "get_input", widget.Default),
+              ("Fill Model", FillNaModel, "get_model")]
+    outputs = [("DataFrame", pyspark.sql.DataFrame, widget.Default),
+               ("Fill Model", FillNaModel)]
     settingsHandler = settings.DomainContextHandler()
 
     in_df = None
+    in_model = None
     want_main_area = False
     resizing_enabled = True
     saved_gui_params = Setting(OrderedDict())
@@ -44,10 +48,20 @@ class OWSparkFillNa(widget.OWWidget):
 
         # Create parameters Box.
         self.gui_parameters = OrderedDict()
+        default_value = self.saved_gui_params.get('strategy', 'constant')
+        self.gui_parameters['strategy'] = GuiParam(parent_widget = self.box, label = 'strategy', list_values = STRATEGIES, default_value = default_value,
+                                                   callback_func = self.refresh_strategy)
         default_value = self.saved_gui_params.get('value', '0')
         self.gui_parameters['value'] = GuiParam(parent_widget = self.box, label = 'value', default_value = default_value)
         default_value = self.saved_gui_params.get('subset', 'None')
-        self.gui_parameters['subset'] = GuiParam(parent_widget = self.box, label = 'subset', default_value = 'None')
+        self.gui_parameters['subset'] = GuiParam(parent_widget = self.box, label = 'subset', default_value = 'None',
+                                                 place_holder_text = 'comma separated, None fills all columns')
+        default_value = self.saved_gui_params.get('relativeError', '0.001')
+        self.gui_parameters['relativeError'] = GuiParam(parent_widget = self.box, label = 'relativeError', default_value = default_value)
+        self.refresh_strategy(self.gui_parameters['strategy'].get_value())
+
+        self.info_box = gui.widgetBox(self.box, 'Fill values')
+        self.info_label = gui.label(self.info_box, self, '')
 
         self.action_box = gui.widgetBox(self.box)
         # Action Button
@@ -56,11 +70,32 @@ class OWSparkFillNa(widget.OWWidget):
     def get_input(self, obj = None):
         self.in_df = obj
 
+    def get_model(self, obj = None):
+        # A model fitted upstream (e.g. on the training data) is applied as is, nothing is recomputed.
+        self.in_model = obj
+        self.box.setEnabled(self.in_model is None)
+
+    def refresh_strategy(self, text):
+        self.gui_parameters['value'].hbox.setVisible(text == 'constant')
+        self.gui_parameters['relativeError'].hbox.setVisible(text == 'median')
+
+    def fit(self):
+        strategy = self.gui_parameters['strategy'].get_value()
+        subset = self.gui_parameters['subset'].get_usable_value()
+        columns = [c.strip() for c in str(subset).split(',')] if subset is not None else self.in_df.columns
+        if strategy == 'constant':
+            fill_values = constant_fill_values(self.in_df, self.gui_parameters['value'].get_usable_value(), columns)
+        else:
+            relative_error = self.gui_parameters['relativeError'].get_usable_value()
+            fill_values = compute_fill_values(self.in_df, columns, strategy, relative_error)
+        return FillNaModel(fill_values, strategy)
+
     def apply(self):
         if self.in_df:
-            value = self.gui_parameters['value'].get_usable_value()
-            subset = self.gui_parameters['subset'].get_usable_value()
-            self.send("DataFrame", self.in_df.fillna(value, subset))
+            model = self.in_model if self.in_model is not None else self.fit()
+            self.info_label.setText('\n'.join('{0}: {1}'.format(c, v) for c, v in model.fill_values.items()) or 'No column to fill.')
+            self.send("DataFrame", model.transform(self.in_df))
+            self.send("Fill Model", model)
             self.update_saved_gui_parameters()
             self.hide()
 
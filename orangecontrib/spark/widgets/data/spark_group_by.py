@@ -0,0 +1,199 @@
+__author__ = 'jamh'
+
+import pyspark
+from Orange.data import Table
+from Orange.widgets import widget, gui
+from Orange.widgets.settings import Setting
+from Orange.widgets.utils import itemmodels
+from PyQt4 import QtCore, QtGui
+
+from orangecontrib.spark.base.shared_spark_context import SharedSparkContext
+from orangecontrib.spark.utils.aggregate_utils import AGGREGATIONS, GROUPINGS, aggregate, pivot_values, flatten_for_orange
+from orangecontrib.spark.utils.data_utils import pandas_to_orange
+from orangecontrib.spark.utils.gui_utils import create_filtered_list_view, selected_rows, select_rows
+from orangecontrib.spark.utils.spark_api_utils import SparkJob
+
+
+class OWSparkGroupBy(SharedSparkContext, widget.OWWidget):
+    priority = 16
+    name = "Group By"
+    description = "Aggregate a DataFrame in Spark with groupBy, rollup, cube or pivot"
+    icon = "../icons/Concatenate.svg"
+
+    inputs = [("DataFrame", pyspark.sql.DataFrame, "get_input", widget.Default)]
+    outputs = [("DataFrame", pyspark.sql.DataFrame, widget.Dynamic),
+               ("Table", Table)]
+
+    in_df = None
+    job = None
+    want_main_area = False
+    resizing_enabled = True
+
+    saved_keys = Setting([])
+    saved_values = Setting([])
+    saved_aggregations = Setting(['sum', 'mean'])
+    grouping_index = Setting(0)
+    pivot_column = Setting('')
+    pivot_values_text = Setting('')
+    max_pivot_values = Setting(100)
+    quantiles = Setting('0.25, 0.5, 0.75')
+    relative_error = Setting('0.01')
+    max_set_size = Setting(100)
+    send_table = Setting(False)
+    table_limit = Setting(10000)
+
+    def __init__(self):
+        super().__init__()
+
+        self.keys_box = gui.widgetBox(self.controlArea, 'Keys', addSpace = True)
+        self.keys_model = itemmodels.PyListModel()
+        self.keys_view = create_filtered_list_view(self.keys_box, self.keys_model)
+
+        self.values_box = gui.widgetBox(self.controlArea, 'Aggregated columns', addSpace = True)
+        self.values_model = itemmodels.PyListModel()
+        self.values_view = create_filtered_list_view(self.values_box, self.values_model)
+
+        self.aggregations_box = gui.widgetBox(self.controlArea, 'Aggregations', addSpace = True)
+        self.aggregations_view = QtGui.QListView(self.aggregations_box)
+        self.aggregations_view.setSelectionMode(QtGui.QListView.ExtendedSelection)
+        self.aggregations_view.setModel(itemmodels.PyListModel(AGGREGATIONS))
+        self.aggregations_box.layout().addWidget(self.aggregations_view)
+        select_rows(self.aggregations_view, [AGGREGATIONS.index(a) for a in self.saved_aggregations if a in AGGREGATIONS])
+
+        self.box = gui.widgetBox(self.controlArea, 'Parameters:', addSpace = True)
+        gui.comboBox(self.box, self, 'grouping_index', label = 'Grouping:', items = GROUPINGS, orientation = 'horizontal')
+        gui.lineEdit(self.box, self, 'pivot_column', label = 'Pivot column:', orientation = 'horizontal')
+        gui.lineEdit(self.box, self, 'pivot_values_text', label = 'Pivot values:', orientation = 'horizontal',
+                     tooltip = 'comma separated, computed by Spark when empty')
+        self.pivot_box = gui.widgetBox(self.box, orientation = 'horizontal')
+        gui.spin(self.pivot_box, self, 'max_pivot_values', 1, 10000, label = 'Max. pivot values:')
+        gui.button(self.pivot_box, self, 'Compute', callback = self.compute_pivot_values)
+        gui.lineEdit(self.box, self, 'quantiles', label = 'Quantiles:', orientation = 'horizontal')
+        gui.lineEdit(self.box, self, 'relative_error', label = 'Relative error:', orientation = 'horizontal')
+        gui.spin(self.box, self, 'max_set_size', 1, 100000, label = 'Max. set size:')
+        gui.checkBox(self.box, self, 'send_table', 'Send an Orange Table')
+        gui.spin(self.box, self, 'table_limit', 1, 10000000, label = 'Max. rows in the Table:')
+
+        self.action_box = gui.widgetBox(self.box, orientation = 'horizontal')
+        self.apply_button = gui.button(self.action_box, self, 'Apply', callback = self.apply)
+        self.stop_button = gui.button(self.action_box, self, 'Stop', callback = self.stop)
+        self.stop_button.setEnabled(False)
+
+        self.info_box = gui.widgetBox(self.controlArea, 'Info')
+        self.info_label = gui.label(self.info_box, self, 'No DataFrame on input.')
+
+        self.job_timer = QtCore.QTimer(self)
+        self.job_timer.setInterval(200)
+        self.job_timer.timeout.connect(self.check_job)
+
+    def get_input(self, obj = None):
+        self.stop()
+        self.in_df = obj
+        if obj is None:
+            self.keys_model.wrap([])
+            self.values_model.wrap([])
+            self.info_label.setText('No DataFrame on input.')
+            self.send("DataFrame", None)
+            self.send("Table", None)
+            return
+        labels = ['{0} ({1})'.format(name, dtype) for name, dtype in obj.dtypes]
+        self.keys_model.wrap(labels)
+        self.values_model.wrap(list(labels))
+        for view, saved in ((self.keys_view, self.saved_keys), (self.values_view, self.saved_values)):
+            saved = set(saved)
+            select_rows(view, [i for i, name in enumerate(obj.columns) if name in saved])
+        self.info_label.setText('{0} columns on input.'.format(len(obj.columns)))
+
+    def onDeleteWidget(self):
+        self.stop()
+
+    def parsed_pivot_values(self):
+        """
+        The pivot values typed as text, None when empty. Spark casts them to the type of the pivot column.
+        """
+        texts = [v.strip() for v in self.pivot_values_text.split(',') if v.strip()]
+        return [None if v == 'None' else v for v in texts] or None
+
+    def compute_pivot_values(self):
+        column = self.pivot_column.strip()
+        if self.in_df is None or not column:
+            return
+        try:
+            values = pivot_values(self.in_df, column, self.max_pivot_values)
+        except ValueError as e:
+            self.info_label.setText(str(e))
+            return
+        self.pivot_values_text = ', '.join(str(v) for v in values)
+        self.info_label.setText('{0} pivot values.'.format(len(values)))
+
+    def apply(self):
+        if self.in_df is None or self.job is not None:
+            return
+        columns = self.in_df.columns
+        keys = [columns[i] for i in selected_rows(self.keys_view)]
+        values = [columns[i] for i in selected_rows(self.values_view)]
+        aggregations = [AGGREGATIONS[i] for i in selected_rows(self.aggregations_view)]
+        self.saved_keys, self.saved_values, self.saved_aggregations = keys, values, aggregations
+
+        pivot_column = self.pivot_column.strip() or None
+        try:
+            quantiles = tuple(float(q) for q in self.quantiles.split(',') if q.strip())
+            relative_error = float(self.relative_error)
+        except ValueError as e:
+            self.info_label.setText(str(e))
+            return
+        df, grouping, pivot = self.in_df, GROUPINGS[self.grouping_index], self.parsed_pivot_values() if pivot_column else None
+        max_set_size, table_limit = self.max_set_size, self.table_limit if self.send_table else None
+
+        def run():
+            # Pivoting without values and the Table both run Spark jobs.
+            out_df = aggregate(df, keys, values, aggregations, grouping, pivot_column, pivot, quantiles, relative_error, max_set_size)
+            return out_df, flatten_for_orange(out_df).limit(table_limit).toPandas() if table_limit else None
+
+        self.job = SparkJob(self.sc, run, 'Group by')
+        self.apply_button.setEnabled(False)
+        self.stop_button.setEnabled(True)
+        self.job.start()
+        self.job_timer.start()
+
+    def stop(self):
+        """
+        Cancel the running aggregation, the outputs are cleared.
+        """
+        job = self.job
+        if job is None:
+            return
+        job.cancel()
+        self.job = None
+        self.job_timer.stop()
+        self.apply_button.setEnabled(True)
+        self.stop_button.setEnabled(False)
+        self.info_label.setText('Stopped.')
+        self.send("DataFrame", None)
+        self.send("Table", None)
+
+    def check_job(self):
+        job = self.job
+        if not job.done():
+            self.info_label.setText('Aggregating for {0:.1f} s'.format(job.elapsed))
+            return
+        self.job_timer.stop()
+        self.job = None
+        self.apply_button.setEnabled(True)
+        self.stop_button.setEnabled(False)
+        if job.error is not None:
+            # Unknown aggregations and AnalysisException (e.g. 'collect set' before Spark 2.4) end up here.
+            self.info_label.setText('Stopped.' if job.cancelled else 'Failed: ' + str(job.error))
+            self.send("DataFrame", None)
+            self.send("Table", None)
+            return
+
+        out_df, pandas_df = job.result
+        self.send("DataFrame", out_df)
+        text = '{0} output columns.'.format(len(out_df.columns))
+        if pandas_df is not None:
+            self.send("Table", pandas_to_orange(pandas_df))
+            text += '\n{0} rows sent to Orange.'.format(len(pandas_df))
+        else:
+            self.send("Table", None)
+        self.info_label.setText(text)
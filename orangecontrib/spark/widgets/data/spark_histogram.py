@@ -0,0 +1,94 @@
+__author__ = 'jamh'
+
+from itertools import combinations
+
+import pyspark
+from Orange.data import Table
+from Orange.widgets import widget, gui
+from Orange.widgets.settings import Setting
+from Orange.widgets.utils import itemmodels
+from pyspark.sql.types import NumericType
+
+from orangecontrib.spark.utils.gui_utils import create_filtered_list_view, selected_rows, select_rows
+from orangecontrib.spark.utils.stats_utils import HISTOGRAM_METHODS, histograms, histograms_2d, histograms_to_orange, \
+    histograms_2d_to_orange
+
+
+class OWSparkHistogram(widget.OWWidget):
+    priority = 14
+    name = "Histogram"
+    description = "Compute histogram bin counts in Spark and output them as a small Orange Table"
+    icon = "../icons/Discretize.svg"
+
+    inputs = [("DataFrame", pyspark.sql.DataFrame, "get_input", widget.Default)]
+    outputs = [("Histograms", Table, widget.Default),
+               ("2-D Histograms", Table)]
+
+    in_df = None
+    want_main_area = False
+    resizing_enabled = True
+
+    saved_columns = Setting([])
+    method_index = Setting(0)
+    n_bins = Setting(20)
+    max_categories = Setting(50)
+    compute_2d = Setting(False)
+    n_bins_2d = Setting(20)
+
+    def __init__(self):
+        super().__init__()
+
+        self.columns_box = gui.widgetBox(self.controlArea, 'Columns', addSpace = True)
+        self.columns_model = itemmodels.PyListModel()
+        self.columns_view = create_filtered_list_view(self.columns_box, self.columns_model)
+
+        self.box = gui.widgetBox(self.controlArea, 'Parameters:', addSpace = True)
+        gui.comboBox(self.box, self, 'method_index', label = 'Numeric binning:', items = HISTOGRAM_METHODS, orientation = 'horizontal')
+        gui.spin(self.box, self, 'n_bins', 1, 10000, label = 'Bins:')
+        gui.spin(self.box, self, 'max_categories', 1, 10000, label = 'Max. categories:')
+        gui.checkBox(self.box, self, 'compute_2d', '2-D counts for every pair of selected numeric columns')
+        gui.spin(self.box, self, 'n_bins_2d', 1, 1000, label = '2-D bins per axis:')
+
+        self.action_box = gui.widgetBox(self.box)
+        self.create_sc_btn = gui.button(self.action_box, self, label = 'Apply', callback = self.apply)
+
+        self.info_box = gui.widgetBox(self.controlArea, 'Info')
+        self.info_label = gui.label(self.info_box, self, 'No DataFrame on input.')
+
+    def get_input(self, obj = None):
+        self.in_df = obj
+        if obj is None:
+            self.columns_model.wrap([])
+            self.info_label.setText('No DataFrame on input.')
+            return
+        self.columns_model.wrap(['{0} ({1})'.format(name, dtype) for name, dtype in obj.dtypes])
+        saved = set(self.saved_columns)
+        select_rows(self.columns_view, [i for i, name in enumerate(obj.columns) if name in saved])
+        self.info_label.setText('{0} columns on input.'.format(len(obj.columns)))
+
+    def selected_columns(self):
+        columns = self.in_df.columns
+        return [columns[i] for i in selected_rows(self.columns_view)]
+
+    def apply(self):
+        if self.in_df is None:
+            return
+        columns = self.selected_columns()
+        if not columns:
+            self.info_label.setText('Select at least one column.')
+            return
+        self.saved_columns = columns
+
+        column_histograms = histograms(self.in_df, columns, HISTOGRAM_METHODS[self.method_index], self.n_bins, max_categories = self.max_categories)
+        self.send("Histograms", histograms_to_orange(columns, column_histograms))
+        text = '{0} bins for {1} column(s).'.format(sum(len(h) for h in column_histograms), len(columns))
+
+        if self.compute_2d:
+            types = dict((f.name, f.dataType) for f in self.in_df.schema.fields)
+            pairs = list(combinations([c for c in columns if isinstance(types[c], NumericType)], 2))
+            pair_histograms = histograms_2d(self.in_df, pairs, self.n_bins_2d)
+            self.send("2-D Histograms", histograms_2d_to_orange(pairs, pair_histograms) if pairs else None)
+            text += '\n{0} non empty 2-D bins for {1} pair(s).'.format(sum(len(h) for h in pair_histograms), len(pairs))
+        else:
+            self.send("2-D Histograms", None)
+        self.info_label.setText(text)
@@ -0,0 +1,182 @@
+__author__ = 'jamh'
+
+import pyspark
+from Orange.widgets import widget, gui
+from Orange.widgets.settings import Setting
+from PyQt4 import QtCore
+
+from orangecontrib.spark.base.shared_spark_context import SharedSparkContext
+from orangecontrib.spark.utils.join_utils import JOIN_TYPES, SALTED_SIDE, choose_broadcast_side, skewed_keys, join
+from orangecontrib.spark.utils.spark_api_utils import SparkJob, format_bytes
+
+
+class OWSparkJoin(SharedSparkContext, widget.OWWidget):
+    priority = 17
+    name = "Join"
+    description = "Join two DataFrames, broadcasting a small side and salting skewed keys"
+    icon = "../icons/MergeData.svg"
+
+    inputs = [("Left", pyspark.sql.DataFrame, "get_left", widget.Default),
+              ("Right", pyspark.sql.DataFrame, "get_right")]
+    outputs = [("DataFrame", pyspark.sql.DataFrame, widget.Dynamic)]
+
+    left_df = None
+    right_df = None
+    job = None
+    job_join = None
+    want_main_area = False
+    resizing_enabled = True
+
+    how_index = Setting(0)
+    left_keys = Setting('')
+    right_keys = Setting('')
+    auto_broadcast = Setting(True)
+    broadcast_threshold_mb = Setting(10)
+    detect_skew = Setting(False)
+    sample_percentage = Setting(1)
+    skew_factor = Setting('10')
+    n_salts = Setting(8)
+
+    def __init__(self):
+        super().__init__()
+
+        self.box = gui.widgetBox(self.controlArea, 'Parameters:', addSpace = True)
+        gui.comboBox(self.box, self, 'how_index', label = 'Join type:', items = JOIN_TYPES, orientation = 'horizontal')
+        gui.lineEdit(self.box, self, 'left_keys', label = 'Left keys:', orientation = 'horizontal', tooltip = 'comma separated')
+        gui.lineEdit(self.box, self, 'right_keys', label = 'Right keys:', orientation = 'horizontal',
+                     tooltip = 'comma separated, the left keys when empty')
+
+        self.broadcast_box = gui.widgetBox(self.controlArea, 'Broadcast', addSpace = True)
+        gui.checkBox(self.broadcast_box, self, 'auto_broadcast', 'Broadcast a side smaller than the threshold')
+        gui.spin(self.broadcast_box, self, 'broadcast_threshold_mb', 1, 100000, label = 'Threshold (MB):')
+
+        self.skew_box = gui.widgetBox(self.controlArea, 'Skew', addSpace = True)
+        gui.checkBox(self.skew_box, self, 'detect_skew', 'Detect skewed keys and salt them')
+        gui.spin(self.skew_box, self, 'sample_percentage', 1, 100, label = 'Sample (%):')
+        gui.lineEdit(self.skew_box, self, 'skew_factor', label = 'Skewed above x mean key frequency:', orientation = 'horizontal')
+        gui.spin(self.skew_box, self, 'n_salts', 2, 10000, label = 'Salt buckets:')
+
+        self.action_box = gui.widgetBox(self.controlArea, orientation = 'horizontal')
+        self.apply_button = gui.button(self.action_box, self, 'Apply', callback = self.apply)
+        self.stop_button = gui.button(self.action_box, self, 'Stop', callback = self.stop)
+        self.stop_button.setEnabled(False)
+
+        self.info_box = gui.widgetBox(self.controlArea, 'Info')
+        self.info_label = gui.label(self.info_box, self, 'No DataFrames on input.')
+
+        self.job_timer = QtCore.QTimer(self)
+        self.job_timer.setInterval(200)
+        self.job_timer.timeout.connect(self.check_job)
+
+    def get_left(self, obj = None):
+        self.stop()
+        self.left_df = obj
+
+    def get_right(self, obj = None):
+        self.stop()
+        self.right_df = obj
+
+    def handleNewSignals(self):
+        self.apply()
+
+    def onDeleteWidget(self):
+        self.stop()
+
+    def stop(self):
+        """
+        Cancel the skew detection, the output is cleared as it would come from earlier inputs or settings.
+        """
+        job = self.job
+        if job is None:
+            return
+        job.cancel()
+        self.job = None
+        self.job_join = None
+        self.job_timer.stop()
+        self.apply_button.setEnabled(True)
+        self.stop_button.setEnabled(False)
+        self.info_label.setText('Stopped.')
+        self.send("DataFrame", None)
+
+    def apply(self):
+        if self.job is not None:
+            return
+        if self.left_df is None or self.right_df is None:
+            self.info_label.setText('Both Left and Right DataFrames are needed.')
+            self.send("DataFrame", None)
+            return
+        how = JOIN_TYPES[self.how_index]
+        split = lambda text: [c.strip() for c in text.split(',') if c.strip()]
+        left_keys = split(self.left_keys)
+        right_keys = split(self.right_keys) or left_keys
+        if how != 'cross' and (not left_keys or len(left_keys) != len(right_keys)):
+            self.info_label.setText('Set the same number of left and right keys.')
+            self.send("DataFrame", None)
+            return
+        missing = [k for k in left_keys if k not in self.left_df.columns] + [k for k in right_keys if k not in self.right_df.columns]
+        if how != 'cross' and missing:
+            self.info_label.setText('Unknown key columns: ' + ', '.join(missing))
+            self.send("DataFrame", None)
+            return
+
+        broadcast, left_bytes, right_bytes = choose_broadcast_side(self.left_df, self.right_df, how, self.broadcast_threshold_mb * 1024 * 1024) \
+            if self.auto_broadcast else (None, None, None)
+        lines = []
+        if self.auto_broadcast:
+            lines.append('Estimated sizes: left {0}, right {1}.'.format(format_bytes(left_bytes), format_bytes(right_bytes)))
+
+        salted_side = SALTED_SIDE.get(how)
+        if broadcast:
+            lines.append('Broadcast {0} join of the {1} side.'.format(how, broadcast))
+        elif self.detect_skew and salted_side:
+            try:
+                skew_factor = float(self.skew_factor)
+            except ValueError:
+                self.info_label.setText('The skew factor must be a number.')
+                self.send("DataFrame", None)
+                return
+            df, keys = (self.left_df, left_keys) if salted_side == 'left' else (self.right_df, right_keys)
+            fraction = self.sample_percentage / 100.0
+            self.job_join = (self.left_df, self.right_df, left_keys, right_keys, how, lines)
+            self.job = SparkJob(self.sc, lambda: skewed_keys(df, keys, fraction, skew_factor), 'Skewed join keys')
+            self.apply_button.setEnabled(False)
+            self.stop_button.setEnabled(True)
+            self.job.start()
+            self.job_timer.start()
+            return
+        else:
+            lines.append('Shuffle {0} join{1}.'.format(how, ', skew cannot be salted for this join type' if self.detect_skew else ''))
+        self.send_join(self.left_df, self.right_df, left_keys, right_keys, how, broadcast, [], lines)
+
+    def check_job(self):
+        job = self.job
+        if not job.done():
+            self.info_label.setText('Sampling the key frequencies for {0:.1f} s'.format(job.elapsed))
+            return
+        self.job_timer.stop()
+        self.job = None
+        self.apply_button.setEnabled(True)
+        self.stop_button.setEnabled(False)
+        left_df, right_df, left_keys, right_keys, how, lines = self.job_join
+        self.job_join = None
+        if job.error is not None:
+            self.info_label.setText('Stopped.' if job.cancelled else 'Failed: ' + str(job.error))
+            self.send("DataFrame", None)
+            return
+
+        skewed = job.result
+        salted_side = SALTED_SIDE[how]
+        if skewed:
+            lines.append('Shuffle {0} join, {1} skewed key(s) of the {2} side salted into {3} buckets:'.format(how, len(skewed), salted_side, self.n_salts))
+            lines += ['  {0}: ~{1} rows'.format(', '.join(str(v) for v in key), int(n)) for key, n in skewed[:5]]
+            if len(skewed) > 5:
+                lines.append('  ...')
+        else:
+            lines.append('Shuffle {0} join, no skewed keys found.'.format(how))
+        self.send_join(left_df, right_df, left_keys, right_keys, how, None, [key for key, _ in skewed], lines)
+
+    def send_join(self, left_df, right_df, left_keys, right_keys, how, broadcast, skewed, lines):
+        out_df = join(left_df, right_df, left_keys, None if right_keys == left_keys else right_keys, how, broadcast,
+                      skewed, self.n_salts)
+        self.info_label.setText('\n'.join(lines))
+        self.send("DataFrame", out_df)
@@ -0,0 +1,80 @@
+__author__ = 'jamh'
+
+import pyspark
+from Orange.widgets import widget, gui
+from Orange.widgets.settings import Setting
+from PyQt4 import QtCore, QtGui
+
+from orangecontrib.spark.utils.plan_utils import get_plan_strings, lint_dataframe
+from orangecontrib.spark.utils.spark_api_utils import estimate_size_in_bytes, format_bytes
+
+
+class OWSparkPlanInspector(widget.OWWidget):
+    priority = 11
+    name = "Plan Inspector"
+    description = "Show the query plans of a DataFrame and flag performance anti-patterns"
+    icon = "../icons/DataInfo.svg"
+
+    inputs = [("DataFrame", pyspark.sql.DataFrame, "get_input", widget.Default)]
+    outputs = [("DataFrame", pyspark.sql.DataFrame, widget.Dynamic)]
+
+    in_df = None
+    resizing_enabled = True
+    broadcast_threshold_mb = Setting(100)
+
+    def __init__(self):
+        super().__init__()
+
+        self.box = gui.widgetBox(self.controlArea, 'Parameters:', addSpace = True)
+        gui.spin(self.box, self, 'broadcast_threshold_mb', 1, 100000, label = 'Broadcast threshold (MB):', callback = self.inspect)
+        gui.button(self.box, self, 'Inspect', callback = self.inspect)
+
+        self.info_box = gui.widgetBox(self.controlArea, 'Info')
+        self.info_label = gui.label(self.info_box, self, 'No DataFrame on input.')
+
+        self.tabs = QtGui.QTabWidget(self.mainArea)
+        self.mainArea.layout().addWidget(self.tabs)
+
+        self.lint_table = QtGui.QTableWidget(0, 3, self.tabs)
+        self.lint_table.setHorizontalHeaderLabels(['Rule', 'Plan node', 'Details'])
+        self.lint_table.horizontalHeader().setStretchLastSection(True)
+        self.tabs.addTab(self.lint_table, 'Lint')
+
+        self.plan_edits = { }
+        for plan_name in ('Parsed', 'Analyzed', 'Optimized', 'Physical'):
+            edit = QtGui.QPlainTextEdit(self.tabs)
+            edit.setReadOnly(True)
+            edit.setLineWrapMode(QtGui.QPlainTextEdit.NoWrap)
+            edit.setFont(QtGui.QFont('Courier'))
+            self.tabs.addTab(edit, plan_name)
+            self.plan_edits[plan_name] = edit
+
+        self.resize(900, 500)
+
+    def get_input(self, obj = None):
+        self.in_df = obj
+        self.inspect()
+        self.send("DataFrame", self.in_df)
+
+    def inspect(self):
+        self.lint_table.setRowCount(0)
+        for edit in self.plan_edits.values():
+            edit.clear()
+        if self.in_df is None:
+            self.info_label.setText('No DataFrame on input.')
+            return
+
+        for plan_name, plan_string in get_plan_strings(self.in_df).items():
+            self.plan_edits[plan_name].setPlainText(plan_string)
+
+        issues = lint_dataframe(self.in_df, self.broadcast_threshold_mb * 1024 * 1024)
+        self.lint_table.setRowCount(len(issues))
+        for i, issue in enumerate(issues):
+            for j, text in enumerate(issue):
+                item = QtGui.QTableWidgetItem(text)
+                item.setFlags(QtCore.Qt.ItemIsEnabled)
+                item.setToolTip(text)
+                self.lint_table.setItem(i, j, item)
+        self.lint_table.resizeColumnsToContents()
+
+        self.info_label.setText('Estimated size: {0}\n{1} issue(s) found.'.format(format_bytes(estimate_size_in_bytes(self.in_df)), len(issues)))
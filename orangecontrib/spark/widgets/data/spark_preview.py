@@ -0,0 +1,199 @@
+__author__ = 'jamh'
+
+import pyspark
+from Orange.widgets import widget, gui
+from Orange.widgets.settings import Setting
+from PyQt4 import QtCore, QtGui
+
+from orangecontrib.spark.base.shared_spark_context import SharedSparkContext
+from orangecontrib.spark.utils.preview_utils import RowPager, approx_count, schema_tree_string
+from orangecontrib.spark.utils.spark_api_utils import SparkJob
+
+
+class RowPagerModel(QtCore.QAbstractTableModel):
+    """
+    A table model over the rows fetched so far by a RowPager.
+    Cells are formatted on demand, so only the visible ones cost anything; scrolling to the bottom asks
+    the pager for the next page through Qt's canFetchMore/fetchMore protocol.
+    """
+    fetch_requested = QtCore.pyqtSignal()
+
+    def __init__(self, parent = None):
+        super().__init__(parent)
+        self.pager = None
+        self.columns = []
+        self.n_rows = 0
+
+    def set_pager(self, pager, columns):
+        self.beginResetModel()
+        self.pager = pager
+        self.columns = columns
+        self.n_rows = 0
+        self.endResetModel()
+        self.sync()
+
+    def sync(self):
+        """
+        Publish the rows that arrived since the last call.
+        """
+        n_rows = 0 if self.pager is None else len(self.pager.rows)
+        if n_rows > self.n_rows:
+            self.beginInsertRows(QtCore.QModelIndex(), self.n_rows, n_rows - 1)
+            self.n_rows = n_rows
+            self.endInsertRows()
+
+    def rowCount(self, parent = QtCore.QModelIndex()):
+        return 0 if parent.isValid() else self.n_rows
+
+    def columnCount(self, parent = QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def data(self, index, role = QtCore.Qt.DisplayRole):
+        if role not in (QtCore.Qt.DisplayRole, QtCore.Qt.ToolTipRole) or not index.isValid():
+            return None
+        value = self.pager.rows[index.row()][index.column()]
+        return '' if value is None else str(value)
+
+    def headerData(self, section, orientation, role = QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole:
+            return None
+        if orientation == QtCore.Qt.Horizontal:
+            return self.columns[section]
+        return str(section + 1)
+
+    def canFetchMore(self, parent = QtCore.QModelIndex()):
+        return self.pager is not None and not parent.isValid() and not self.pager.exhausted
+
+    def fetchMore(self, parent = QtCore.QModelIndex()):
+        self.fetch_requested.emit()
+
+
+class OWSparkPreview(SharedSparkContext, widget.OWWidget):
+    priority = 15
+    name = "Preview"
+    description = "Page through the first rows of a DataFrame without collecting it"
+    icon = "../icons/Table.svg"
+
+    inputs = [("DataFrame", pyspark.sql.DataFrame, "get_input", widget.Default)]
+    outputs = []
+
+    in_df = None
+    pager = None
+    take_job = None
+    count_job = None
+    resizing_enabled = True
+
+    page_size = Setting(100)
+    prefetch_pages = Setting(2)
+    count_timeout = Setting(2)
+    count_confidence = Setting(95)
+
+    def __init__(self):
+        super().__init__()
+
+        self.box = gui.widgetBox(self.controlArea, 'Parameters:', addSpace = True)
+        gui.spin(self.box, self, 'page_size', 1, 100000, label = 'Page size:')
+        gui.spin(self.box, self, 'prefetch_pages', 0, 100, label = 'Prefetched pages:')
+        gui.spin(self.box, self, 'count_timeout', 1, 3600, label = 'Count timeout (s):')
+        gui.spin(self.box, self, 'count_confidence', 1, 99, label = 'Count confidence (%):')
+
+        self.action_box = gui.widgetBox(self.box, orientation = 'horizontal')
+        self.refresh_button = gui.button(self.action_box, self, 'Refresh', callback = self.refresh)
+        self.more_button = gui.button(self.action_box, self, 'Next page', callback = self.next_page)
+
+        self.info_box = gui.widgetBox(self.controlArea, 'Info')
+        self.info_label = gui.label(self.info_box, self, 'No DataFrame on input.')
+        self.count_label = gui.label(self.info_box, self, '')
+
+        self.schema_box = gui.widgetBox(self.controlArea, 'Schema')
+        self.schema_text = QtGui.QPlainTextEdit(self.schema_box)
+        self.schema_text.setReadOnly(True)
+        self.schema_box.layout().addWidget(self.schema_text)
+
+        self.model = RowPagerModel(self)
+        self.model.fetch_requested.connect(self.next_page)
+        self.view = QtGui.QTableView(self.mainArea)
+        self.view.setModel(self.model)
+        self.view.verticalHeader().setDefaultSectionSize(22)
+        self.view.verticalHeader().setResizeMode(QtGui.QHeaderView.Fixed)
+        self.mainArea.layout().addWidget(self.view)
+
+        self.job_timer = QtCore.QTimer(self)
+        self.job_timer.setInterval(200)
+        self.job_timer.timeout.connect(self.check_jobs)
+        self.resize(900, 500)
+
+    def get_input(self, obj = None):
+        self.in_df = obj
+        self.refresh()
+
+    def onDeleteWidget(self):
+        self.stop()
+
+    def stop(self):
+        for job in (self.take_job, self.count_job):
+            if job is not None:
+                job.cancel()
+        self.take_job = self.count_job = None
+        if self.pager is not None:
+            self.pager.close()
+            self.pager = None
+        self.job_timer.stop()
+
+    def refresh(self):
+        self.stop()
+        self.model.set_pager(None, [])
+        self.count_label.setText('')
+        if self.in_df is None:
+            self.schema_text.setPlainText('')
+            self.info_label.setText('No DataFrame on input.')
+            return
+
+        df = self.in_df
+        self.schema_text.setPlainText(schema_tree_string(df))
+        self.pager = RowPager(self.sc, df, self.page_size, self.page_size * self.prefetch_pages)
+        self.take_job = SparkJob(self.sc, self.pager.first_page, 'Preview first page')
+        timeout, confidence = self.count_timeout, self.count_confidence / 100.0
+        self.count_job = SparkJob(self.sc, lambda: approx_count(self.sc, df, timeout, confidence), 'Preview approximate count')
+        self.take_job.start()
+        self.count_job.start()
+        self.job_timer.start()
+
+    def next_page(self):
+        if self.pager is not None and self.take_job is None:
+            self.pager.request_page()
+            self.job_timer.start()
+
+    def check_jobs(self):
+        take_job, count_job = self.take_job, self.count_job
+        if take_job is not None and take_job.done():
+            self.take_job = None
+            if take_job.error is not None:
+                self.info_label.setText('Failed: ' + str(take_job.error))
+            else:
+                self.model.set_pager(self.pager, self.in_df.columns)
+                self.view.resizeColumnsToContents()
+        if count_job is not None and count_job.done():
+            self.count_job = None
+            if count_job.error is not None:
+                self.count_label.setText('Row count failed: ' + str(count_job.error))
+            else:
+                estimate, low, high = count_job.result
+                text = '{0} rows'.format(estimate) if low == high else \
+                    '~{0} rows ({1} - {2}, {3}% confidence)'.format(estimate, low, high, self.count_confidence)
+                self.count_label.setText(text)
+
+        pager = self.pager
+        if pager is None or self.take_job is not None:
+            if self.take_job is not None:
+                self.info_label.setText('Taking the first {0} rows for {1:.1f} s'.format(self.page_size, take_job.elapsed))
+            return
+        self.model.sync()
+        if pager.error is not None:
+            self.info_label.setText('Failed: ' + str(pager.error))
+        elif take_job is None or take_job.error is None:
+            self.info_label.setText('{0} rows fetched{1}.'.format(len(pager.rows), '' if pager.exhausted else
+                                                                  ', fetching more' if pager.fetching() else ''))
+        self.more_button.setEnabled(not pager.exhausted)
+        if self.count_job is None and not pager.fetching():
+            self.job_timer.stop()
@@ -0,0 +1,183 @@
+__author__ = 'jamh'
+
+import pyspark
+from Orange.data import Table
+from Orange.widgets import widget, gui
+from Orange.widgets.settings import Setting
+from PyQt4 import QtCore, QtGui
+
+from orangecontrib.spark.base.shared_spark_context import SharedSparkContext
+from orangecontrib.spark.utils.spark_api_utils import SparkJob
+from orangecontrib.spark.utils.stats_utils import profile_dataframe, top_values, profile_to_orange
+
+
+class OWSparkProfile(SharedSparkContext, widget.OWWidget):
+    priority = 13
+    name = "Profile"
+    description = "Per column nulls, min/max, mean/stddev, approximate distinct counts, quantiles and top values"
+    icon = "../icons/Rank.svg"
+
+    inputs = [("DataFrame", pyspark.sql.DataFrame, "get_input", widget.Default)]
+    outputs = [("Profile", Table, widget.Default)]
+
+    in_df = None
+    job = None
+    job_df = None
+    job_quantiles = ()
+    job_sampled = False
+    profile = None
+    resizing_enabled = True
+
+    sample_percentage = Setting(100)
+    top_k = Setting(5)
+    quantiles = Setting('0.25, 0.5, 0.75')
+    relative_error = Setting('0.01')
+    auto_run = Setting(False)
+
+    def __init__(self):
+        super().__init__()
+
+        self.box = gui.widgetBox(self.controlArea, 'Parameters:', addSpace = True)
+        gui.spin(self.box, self, 'sample_percentage', 1, 100, label = 'Sample (%):')
+        gui.spin(self.box, self, 'top_k', 0, 100, label = 'Top values:')
+        gui.lineEdit(self.box, self, 'quantiles', label = 'Quantiles:', orientation = 'horizontal')
+        gui.lineEdit(self.box, self, 'relative_error', label = 'Quantile relative error:', orientation = 'horizontal')
+        gui.checkBox(self.box, self, 'auto_run', 'Run on new input')
+
+        self.action_box = gui.widgetBox(self.box, orientation = 'horizontal')
+        self.run_button = gui.button(self.action_box, self, 'Run', callback = self.run)
+        self.stop_button = gui.button(self.action_box, self, 'Stop', callback = self.stop)
+        self.stop_button.setEnabled(False)
+
+        self.info_box = gui.widgetBox(self.controlArea, 'Info')
+        self.info_label = gui.label(self.info_box, self, 'No DataFrame on input.')
+
+        self.table = QtGui.QTableWidget(0, 0, self.mainArea)
+        self.mainArea.layout().addWidget(self.table)
+
+        self.job_timer = QtCore.QTimer(self)
+        self.job_timer.setInterval(200)
+        self.job_timer.timeout.connect(self.check_job)
+        self.resize(900, 500)
+
+    def get_input(self, obj = None):
+        self.stop()
+        self.in_df = obj
+        self.info_label.setText('No DataFrame on input.' if obj is None else '{0} columns on input.'.format(len(obj.columns)))
+        if obj is not None and self.auto_run:
+            self.run()
+
+    def onDeleteWidget(self):
+        self.stop()
+
+    def parsed_quantiles(self):
+        return tuple(float(q) for q in self.quantiles.split(',') if q.strip())
+
+    def run(self):
+        """
+        Two background passes: the aggregated statistics are shown as soon as the first one ends,
+        stopping during the top values pass keeps them.
+        """
+        if self.in_df is None or self.job is not None:
+            return
+        df = self.in_df
+        if self.sample_percentage < 100:
+            df = df.sample(False, self.sample_percentage / 100.0)
+        try:
+            quantiles = self.parsed_quantiles()
+            relative_error = float(self.relative_error)
+        except ValueError as e:
+            self.info_label.setText('Invalid parameter: ' + str(e))
+            return
+        self.profile = None
+        # The output is labelled with the quantiles the profile is computed with, not the setting at send time.
+        self.job_quantiles = quantiles
+        self.job_sampled = self.sample_percentage < 100
+        self.start_job(SparkJob(self.sc, lambda: profile_dataframe(df, quantiles, 0, relative_error), 'Profile statistics'), df)
+
+    def start_job(self, job, df):
+        self.job = job
+        self.job_df = df
+        self.run_button.setEnabled(False)
+        self.stop_button.setEnabled(True)
+        self.job.start()
+        self.job_timer.start()
+
+    def stop(self):
+        """
+        Cancel the running job and forget it, so that a new run can start right away.
+        """
+        job = self.job
+        if job is None:
+            return
+        job.cancel()
+        self.job = None
+        self.job_timer.stop()
+        self.run_button.setEnabled(True)
+        self.stop_button.setEnabled(False)
+        text = 'Stopped.'
+        if self.profile is not None:
+            text += ' Top values were not computed.'
+        self.info_label.setText(text)
+
+    def check_job(self):
+        job = self.job
+        if not job.done():
+            stage = 'statistics' if self.profile is None else 'top values'
+            self.info_label.setText('Computing {0} for {1:.1f} s'.format(stage, job.elapsed))
+            return
+        self.job_timer.stop()
+        self.job = None
+        self.run_button.setEnabled(True)
+        self.stop_button.setEnabled(False)
+
+        if job.error is not None:
+            text = 'Stopped.' if job.cancelled else 'Failed: ' + str(job.error)
+            if self.profile is not None:
+                text += ' Top values were not computed.'
+            self.info_label.setText(text)
+            return
+
+        if self.profile is None:
+            self.profile = job.result
+            self.send_profile()
+            if self.top_k:
+                columns = [stats['column'] for stats in self.profile]
+                df, k = self.job_df, self.top_k
+                self.start_job(SparkJob(self.sc, lambda: top_values(df, columns, k), 'Profile top values'), df)
+                return
+        else:
+            for stats, values in zip(self.profile, job.result):
+                stats['top values'] = values
+            self.send_profile()
+        # The rows the statistics were computed on, a sample only has about the requested fraction of the rows.
+        n_rows = self.profile[0]['count'] + self.profile[0]['nulls'] if self.profile else 0
+        self.info_label.setText('{0} columns profiled on {1} {2}rows.'.format(len(self.profile), n_rows, 'sampled ' if self.job_sampled else ''))
+
+    def send_profile(self):
+        table = profile_to_orange(self.profile, self.job_quantiles)
+        self.show_profile()
+        self.send("Profile", table)
+
+    def show_profile(self):
+        headers = []
+        for stats in self.profile:
+            headers += [k for k in stats if k not in headers]
+        self.table.clear()
+        self.table.setColumnCount(len(headers))
+        self.table.setRowCount(len(self.profile))
+        self.table.setHorizontalHeaderLabels(headers)
+        for i, stats in enumerate(self.profile):
+            for j, name in enumerate(headers):
+                value = stats.get(name)
+                if name == 'top values' and value is not None:
+                    text = ', '.join('{0} ({1})'.format(v, n) for v, n in value)
+                elif isinstance(value, float):
+                    text = '{0:.4g}'.format(value)
+                else:
+                    text = '' if value is None else str(value)
+                item = QtGui.QTableWidgetItem(text)
+                item.setFlags(QtCore.Qt.ItemIsEnabled)
+                item.setToolTip(text)
+                self.table.setItem(i, j, item)
+        self.table.resizeColumnsToContents()
@@ -0,0 +1,174 @@
+__author__ = 'jamh'
+
+import pyspark
+from Orange.widgets import widget, gui
+from Orange.widgets.settings import Setting
+from PyQt4 import QtCore, QtGui
+
+from orangecontrib.spark.base.shared_spark_context import SharedSparkContext
+from orangecontrib.spark.utils.partition_utils import METHODS, partition_sizes, size_summary, recommend_layout, apply_layout
+from orangecontrib.spark.utils.spark_api_utils import SparkJob, format_bytes
+
+
+class OWSparkRepartition(SharedSparkContext, widget.OWWidget):
+    priority = 18
+    name = "Repartition"
+    description = "Measure the partitions of a DataFrame and repartition or coalesce it to a target partition size"
+    icon = "../icons/Random.svg"
+
+    inputs = [("DataFrame", pyspark.sql.DataFrame, "get_input", widget.Default)]
+    outputs = [("DataFrame", pyspark.sql.DataFrame, widget.Dynamic)]
+
+    in_df = None
+    job = None
+    job_df = None
+    summary = None
+    recommendation = None
+    resizing_enabled = True
+
+    target_partition_mb = Setting(128)
+    measure_bytes = Setting(False)
+    skew_factor = Setting('4')
+    range_columns = Setting('')
+    method_index = Setting(0)
+    n_partitions = Setting(0)
+
+    def __init__(self):
+        super().__init__()
+
+        self.box = gui.widgetBox(self.controlArea, 'Parameters:', addSpace = True)
+        gui.spin(self.box, self, 'target_partition_mb', 1, 100000, label = 'Target partition size (MB):')
+        gui.checkBox(self.box, self, 'measure_bytes', 'Measure bytes (reads every column)')
+        gui.lineEdit(self.box, self, 'skew_factor', label = 'Skewed above x median size:', orientation = 'horizontal')
+        gui.lineEdit(self.box, self, 'range_columns', label = 'Partition columns:', orientation = 'horizontal',
+                     tooltip = 'comma separated, used by repartition and repartitionByRange')
+
+        self.action_box = gui.widgetBox(self.box, orientation = 'horizontal')
+        self.analyze_button = gui.button(self.action_box, self, 'Analyze', callback = self.analyze)
+        self.stop_button = gui.button(self.action_box, self, 'Stop', callback = self.stop)
+        self.stop_button.setEnabled(False)
+
+        self.apply_box = gui.widgetBox(self.controlArea, 'Layout', addSpace = True)
+        gui.comboBox(self.apply_box, self, 'method_index', label = 'Method:', items = ['recommended'] + METHODS, orientation = 'horizontal')
+        gui.spin(self.apply_box, self, 'n_partitions', 0, 1000000, label = 'Partitions (0 for the recommended):')
+        self.apply_button = gui.button(self.apply_box, self, 'Apply', callback = self.apply)
+
+        self.info_box = gui.widgetBox(self.controlArea, 'Info')
+        self.info_label = gui.label(self.info_box, self, 'No DataFrame on input.')
+
+        self.table = QtGui.QTableWidget(0, 3, self.mainArea)
+        self.table.setHorizontalHeaderLabels(['partition', 'rows', 'bytes'])
+        self.table.verticalHeader().setVisible(False)
+        self.mainArea.layout().addWidget(self.table)
+
+        self.job_timer = QtCore.QTimer(self)
+        self.job_timer.setInterval(200)
+        self.job_timer.timeout.connect(self.check_job)
+
+    def get_input(self, obj = None):
+        self.stop()
+        self.in_df = obj
+        self.summary = None
+        self.table.setRowCount(0)
+        self.info_label.setText('No DataFrame on input.' if obj is None else 'Analyze to measure the partitions.')
+        self.send("DataFrame", obj)
+
+    def onDeleteWidget(self):
+        self.stop()
+
+    def split_columns(self):
+        return [c.strip() for c in self.range_columns.split(',') if c.strip()]
+
+    def analyze(self):
+        if self.in_df is None or self.job is not None:
+            return
+        df, measure_bytes = self.in_df, self.measure_bytes
+        self.job_df = df
+        self.job = SparkJob(self.sc, lambda: partition_sizes(df, measure_bytes), 'Partition sizes')
+        self.analyze_button.setEnabled(False)
+        self.stop_button.setEnabled(True)
+        self.job.start()
+        self.job_timer.start()
+
+    def stop(self):
+        """
+        Cancel the running job and forget it, so that a new analysis can start right away.
+        """
+        job = self.job
+        if job is None:
+            return
+        job.cancel()
+        self.job = None
+        self.job_df = None
+        self.job_timer.stop()
+        self.analyze_button.setEnabled(True)
+        self.stop_button.setEnabled(False)
+        self.info_label.setText('Stopped.')
+
+    def check_job(self):
+        job = self.job
+        if not job.done():
+            self.info_label.setText('Counting the partitions for {0:.1f} s'.format(job.elapsed))
+            return
+        self.job_timer.stop()
+        job_df, self.job, self.job_df = self.job_df, None, None
+        self.analyze_button.setEnabled(True)
+        self.stop_button.setEnabled(False)
+        if job_df is not self.in_df:
+            # The input changed while the job was running, its sizes describe another DataFrame.
+            return
+        if job.error is not None:
+            self.info_label.setText('Stopped.' if job.cancelled else 'Failed: ' + str(job.error))
+            return
+        try:
+            skew_factor = float(self.skew_factor)
+        except ValueError:
+            self.info_label.setText('The skew factor must be a number.')
+            return
+
+        sizes = job.result
+        self.summary = summary = size_summary(sizes)
+        self.recommendation = recommend_layout(summary, self.target_partition_mb * 1024 * 1024, skew_factor, self.split_columns())
+        method, n_partitions, reason = self.recommendation
+        self.info_label.setText('\n'.join([
+            '{0} partitions, {1} empty, {2} rows, {3}{4}.'.format(summary['partitions'], summary['empty'], summary['rows'],
+                                                                 format_bytes(summary['bytes']), '' if self.measure_bytes else ' estimated'),
+            'Bytes per partition: min {0}, median {1}, max {2}.'.format(format_bytes(summary['min bytes']), format_bytes(summary['median bytes']),
+                                                                        format_bytes(summary['max bytes'])),
+            'Recommended: {0}({1}). {2}'.format(method, n_partitions, reason)]))
+        self.show_sizes(sizes)
+
+    def show_sizes(self, sizes):
+        """
+        Largest partitions first.
+        """
+        order = sorted(range(len(sizes)), key = lambda i: -sizes[i][1])
+        self.table.setRowCount(len(sizes))
+        for row, i in enumerate(order):
+            for column, value in enumerate((i, sizes[i][0], sizes[i][1])):
+                item = QtGui.QTableWidgetItem()
+                item.setData(QtCore.Qt.DisplayRole, value)
+                item.setFlags(QtCore.Qt.ItemIsEnabled)
+                self.table.setItem(row, column, item)
+
+    def apply(self):
+        if self.in_df is None:
+            return
+        if self.method_index == 0:
+            if self.summary is None:
+                self.info_label.setText('Analyze before applying the recommended layout.')
+                return
+            method, n_partitions, _ = self.recommendation
+        else:
+            method = METHODS[self.method_index - 1]
+            n_partitions = self.recommendation[1] if self.summary is not None else None
+        n_partitions = self.n_partitions or n_partitions
+        if not n_partitions and method != 'keep':
+            self.info_label.setText('Set the number of partitions or analyze first.')
+            return
+        try:
+            out_df = apply_layout(self.in_df, method, n_partitions, self.split_columns())
+        except ValueError as e:
+            self.info_label.setText(str(e))
+            return
+        self.send("DataFrame", out_df)
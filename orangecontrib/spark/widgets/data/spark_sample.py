@@ -7,13 +7,13 @@ from Orange.widgets.settings import Setting
 from PyQt4 import QtGui
 
 from orangecontrib.spark.utils.gui_utils import GuiParam
-from orangecontrib.spark.utils.spark_api_utils import get_dataframe_function_info
+from orangecontrib.spark.utils.spark_api_utils import get_dataframe_function_info, stratified_fractions, sample_exact, sample_hash
 
 
 class OWSparkDFSample(widget.OWWidget):
     priority = 5
     name = "Sample"
-    description = "Take a fraction sample of the DataFrame"
+    description = "Take a fraction, stratified, exact size or deterministic sample of the DataFrame"
     icon = "../icons/DataSampler.svg"
 
     inputs = [("DataFrame", pyspark.sql.DataFrame, "get_input", widget.Default)]
@@ -21,6 +21,7 @@ class OWSparkDFSample(widget.OWWidget):
     settingsHandler = settings.DomainContextHandler()
 
     in_df = None
+    methods = ['fraction', 'stratified', 'exact size', 'deterministic hash']
     want_main_area = False
     resizing_enabled = True
     saved_gui_params = Setting(OrderedDict())
@@ -44,6 +45,9 @@ class OWSparkDFSample(widget.OWWidget):
 
         # Create parameters Box.
         self.gui_parameters = OrderedDict()
+        default_value = self.saved_gui_params.get('method', 'fraction')
+        self.gui_parameters['method'] = GuiParam(parent_widget = self.box, label = 'method', list_values = self.methods, default_value = default_value,
+                                                 callback_func = self.refresh_method)
         default_value = self.saved_gui_params.get('withReplacement', 'False')
         self.gui_parameters['withReplacement'] = GuiParam(parent_widget = self.box, label = 'withReplacement', default_value = 'False')
         default_value = self.saved_gui_params.get('fraction', '0.5 ')
@@ -51,12 +55,46 @@ class OWSparkDFSample(widget.OWWidget):
         default_value = self.saved_gui_params.get('seed', '1')
         self.gui_parameters['seed'] = GuiParam(parent_widget = self.box, label = 'seed', default_value = '1')
 
+        # stratified: per stratum fractions from a single groupBy count.
+        default_value = self.saved_gui_params.get('label column', '')
+        self.gui_parameters['label column'] = GuiParam(parent_widget = self.box, label = 'label column', list_values = [default_value],
+                                                       default_value = default_value)
+        default_value = self.saved_gui_params.get('rows per class', 'None')
+        self.gui_parameters['rows per class'] = GuiParam(parent_widget = self.box, label = 'rows per class', default_value = default_value,
+                                                         place_holder_text = 'None keeps the class distribution, a number balances the classes')
+        # exact size: oversample then limit.
+        default_value = self.saved_gui_params.get('rows', '1000')
+        self.gui_parameters['rows'] = GuiParam(parent_widget = self.box, label = 'rows', default_value = default_value)
+        # deterministic hash: stable across runs and partitionings.
+        default_value = self.saved_gui_params.get('hash columns', 'None')
+        self.gui_parameters['hash columns'] = GuiParam(parent_widget = self.box, label = 'hash columns', default_value = default_value,
+                                                       place_holder_text = 'comma separated, None hashes all columns')
+
+        self.method_parameters = { 'fraction': ['withReplacement', 'fraction', 'seed'],
+                                   'stratified': ['fraction', 'seed', 'label column', 'rows per class'],
+                                   'exact size': ['rows', 'seed'],
+                                   'deterministic hash': ['fraction', 'hash columns'] }
+        self.refresh_method(self.gui_parameters['method'].get_value())
+
         self.action_box = gui.widgetBox(self.box)
         # Action Button
         self.create_sc_btn = gui.button(self.action_box, self, label = 'Apply', callback = self.apply)
 
     def get_input(self, obj = None):
         self.in_df = obj
+        if self.in_df is not None:
+            label_column = self.gui_parameters['label column']
+            current = label_column.get_value()
+            label_column.update(values = self.in_df.columns)
+            index = label_column.widget.findText(current)
+            if index >= 0:
+                label_column.widget.setCurrentIndex(index)
+
+    def refresh_method(self, text):
+        visible = self.method_parameters[text]
+        for k, parameter in self.gui_parameters.items():
+            parameter.hbox.setVisible(k == 'method' or k in visible)
+        self.method_info_label.setText(get_dataframe_function_info('sampleBy' if text == 'stratified' else 'sample'))
 
     def update_saved_gui_parameters(self):
         for k in self.gui_parameters:
@@ -64,9 +102,23 @@ class OWSparkDFSample(widget.OWWidget):
 
     def apply(self):
         if self.in_df:
+            method = self.gui_parameters['method'].get_value()
             withReplacement = self.gui_parameters['withReplacement'].get_usable_value()
             fraction = self.gui_parameters['fraction'].get_usable_value()
             seed = self.gui_parameters['seed'].get_usable_value()
-            self.send("DataFrame", self.in_df.sample(withReplacement, fraction, seed))
+            if method == 'stratified':
+                column = self.gui_parameters['label column'].get_value()
+                rows_per_class = self.gui_parameters['rows per class'].get_usable_value()
+                fractions = stratified_fractions(self.in_df, column, fraction, rows_per_class)
+                out_df = self.in_df.sampleBy(column, fractions, seed)
+            elif method == 'exact size':
+                out_df = sample_exact(self.in_df, self.gui_parameters['rows'].get_usable_value(), seed)
+            elif method == 'deterministic hash':
+                columns = self.gui_parameters['hash columns'].get_usable_value()
+                columns = [c.strip() for c in str(columns).split(',')] if columns is not None else None
+                out_df = sample_hash(self.in_df, fraction, columns)
+            else:
+                out_df = self.in_df.sample(withReplacement, fraction, seed)
+            self.send("DataFrame", out_df)
             self.update_saved_gui_parameters()
             self.hide()
@@ -4,11 +4,13 @@ from Orange.widgets.settings import Setting
 from Orange.widgets.widget import OWWidget
 from PyQt4 import QtCore
 from PyQt4.QtGui import (
-    QSizePolicy, QSplitter, QPlainTextEdit
+    QSizePolicy, QSplitter, QPlainTextEdit, QTableWidget, QTableWidgetItem
 )
 
 from orangecontrib.spark.base.shared_spark_context import SharedSparkContext
-from orangecontrib.spark.utils.data_utils import pandas_to_orange, format_sql
+from orangecontrib.spark.utils.data_utils import pandas_to_orange, format_sql, split_sql_script, sql_script_dependencies, SELECT
+from orangecontrib.spark.utils.query_cache import QueryResultCache, MEMORY, PARQUET
+from orangecontrib.spark.utils.spark_api_utils import format_bytes, run_concurrently
 
 
 def convert_dataframe_to_orange(df):
@@ -26,6 +28,15 @@ class OWSparkDataFrame(SharedSparkContext, OWWidget):
     outputs = [("DataFrame", pyspark.sql.DataFrame, widget.Dynamic)]
     out_df = None
 
+    # Shared by all the SparkSQL widgets of the session.
+    query_cache = QueryResultCache()
+    cache_modes = [MEMORY, PARQUET]
+    use_cache = Setting(False)
+    cache_mode = Setting(0)
+    cache_max_mb = Setting(1024)
+    cache_directory = Setting('/tmp/orange_spark_query_cache')
+    max_concurrent_statements = Setting(4)
+
     def __init__(self):
         super().__init__()
         gui.label(self.controlArea, self, "Spark DataFrame")
@@ -47,10 +58,27 @@ class OWSparkDataFrame(SharedSparkContext, OWWidget):
         self.queryTextEdit = QPlainTextEdit(self.query, self)
         self.textBox.layout().addWidget(self.queryTextEdit)
 
+        # per statement timings of the last script run
+        self.timingsBox = gui.widgetBox(self, 'Statements')
+        self.splitCanvas.addWidget(self.timingsBox)
+        self.timingsTable = QTableWidget(0, 3, self.timingsBox)
+        self.timingsTable.setHorizontalHeaderLabels(['Statement', 'Depends on', 'Seconds'])
+        self.timingsTable.horizontalHeader().setStretchLastSection(True)
+        self.timingsBox.layout().addWidget(self.timingsTable)
+
         self.selectBox = gui.widgetBox(self.controlArea, "Select statement")
         self.selectBox.setSizePolicy(QSizePolicy(QSizePolicy.MinimumExpanding, QSizePolicy.MinimumExpanding))
         gui.button(self.selectBox, self, 'format SQL!', callback = self.format_sql, disabled = 0)
         gui.button(self.selectBox, self, 'execute!', callback = self.executeQuery, disabled = 0)
+        gui.spin(self.selectBox, self, 'max_concurrent_statements', 1, 64, label = 'Concurrent statements:')
+
+        # query result cache
+        self.cacheBox = gui.widgetBox(self.controlArea, "Result cache")
+        gui.checkBox(self.cacheBox, self, 'use_cache', 'Cache query results')
+        gui.comboBox(self.cacheBox, self, 'cache_mode', label = 'Store as:', items = ['cached DataFrame', 'Parquet files'], orientation = 'horizontal')
+        gui.lineEdit(self.cacheBox, self, 'cache_directory', label = 'Parquet directory:')
+        gui.spin(self.cacheBox, self, 'cache_max_mb', 1, 1024 * 1024, label = 'Max size (MB):')
+        gui.button(self.cacheBox, self, 'Clear cache', callback = self.clear_cache)
 
         # info
         self.infoBox = gui.widgetBox(self.controlArea, "Info")
@@ -60,16 +88,23 @@ class OWSparkDataFrame(SharedSparkContext, OWWidget):
         self.resize(300, 300)
 
     def destroy(self, destroyWindow, destroySubWindows):
-        self.allSQLSelectWidgets.remove(self)
+        if self in self.allSQLSelectWidgets:
+            self.allSQLSelectWidgets.remove(self)
         self.destroy(self, destroyWindow, destroySubWindows)
 
+    def onDeleteWidget(self):
+        if self in self.allSQLSelectWidgets:
+            self.allSQLSelectWidgets.remove(self)
+        if not self.allSQLSelectWidgets:
+            # The last widget sharing the cache is gone, so are the DataFrames read from its Parquet files.
+            self.query_cache.shutdown()
+
     def activateLoadedSettings(self):
         self.query = self.lastQuery
 
     def setInfo(self, info):
-        pass
-        # for (i, s) in enumerate(info):
-        #    self.info[i].setText(s)
+        for (i, s) in enumerate(info):
+            self.info[i].setText(s)
 
     def setMeta(self):
         pass
@@ -89,10 +124,73 @@ class OWSparkDataFrame(SharedSparkContext, OWWidget):
         if query is None:
             return None
 
-        self.out_df = self.hc.sql(query)
+        statements = split_sql_script(query)
+        if len(statements) > 1:
+            self.out_df, info = self.execute_script(statements)
+        else:
+            is_select = len(statements) == 1 and statements[0][1] == SELECT
+            self.out_df, info = self.execute_statement(query, is_select)
+        self.setInfo(info)
         self.lastQuery = query
         self.send("DataFrame", self.out_df)
 
+    def execute_statement(self, query, is_select):
+        """
+        Run a single statement, through the result cache if enabled.
+        :return: the DataFrame and the info lines to show.
+        """
+        if self.use_cache and is_select:
+            cache = self.query_cache
+            cache.mode = self.cache_modes[self.cache_mode]
+            cache.directory = self.cache_directory
+            cache.max_bytes = self.cache_max_mb * 1024 * 1024
+            df, hit = cache.get(self.sc, self.hc, query)
+            return df, ('Cache ' + ('hit' if hit else 'miss'),
+                        '{0} hits, {1} misses, {2} entries, {3}'.format(cache.hits, cache.misses, len(cache.entries),
+                                                                       format_bytes(cache.size_in_bytes)))
+        return self.hc.sql(query), ('Query executed', 'Result not cached' if self.use_cache else '')
+
+    def execute_script(self, statements):
+        """
+        Run a multi statement script, independent statements run concurrently.
+        :return: the DataFrame of the last SELECT statement (or of the last statement if there is none)
+                 and the info lines to show.
+        """
+        dependencies = sql_script_dependencies(statements)
+        codes = [code for code, _, _, _ in statements]
+        last_select = max([i for i, statement in enumerate(statements) if statement[1] == SELECT] or [len(statements) - 1])
+
+        def execute(i):
+            if i == last_select:
+                return self.execute_statement(codes[i], statements[i][1] == SELECT)
+            return self.hc.sql(codes[i]), None
+
+        try:
+            results = run_concurrently(self.sc, list(range(len(codes))), dependencies, execute,
+                                       max_workers = self.max_concurrent_statements)
+        except Exception as e:
+            self.setInfo(('Script failed:', str(e)))
+            raise
+        self.show_timings(codes, dependencies, results)
+        (df, info), _ = results[last_select]
+        total = sum(seconds for _, seconds in results)
+        return df, ('{0} statements run, {1:.2f}s of statement time'.format(len(codes), total), info[1] if info else '')
+
+    def show_timings(self, codes, dependencies, results):
+        self.timingsTable.setRowCount(len(codes))
+        for i, (code, depends, (_, seconds)) in enumerate(zip(codes, dependencies, results)):
+            items = [QTableWidgetItem(' '.join(code.split())[:80]),
+                     QTableWidgetItem(', '.join(str(d + 1) for d in sorted(depends))),
+                     QTableWidgetItem('{0:.2f}'.format(seconds))]
+            for column, item in enumerate(items):
+                item.setFlags(QtCore.Qt.ItemIsEnabled)
+                self.timingsTable.setItem(i, column, item)
+        self.timingsTable.resizeColumnsToContents()
+
+    def clear_cache(self):
+        self.query_cache.clear()
+        self.setInfo(('Cache cleared', ''))
+
     def format_sql(self):
         query = str(self.queryTextEdit.toPlainText())
         str_sql = str(format_sql(query))
@@ -4,10 +4,13 @@ from collections import OrderedDict
 import pyspark
 from Orange.widgets import widget, gui
 from Orange.widgets.settings import Setting
+from Orange.widgets.utils import itemmodels
 from pyspark.sql import HiveContext
 
 from orangecontrib.spark.base.shared_spark_context import SharedSparkContext
-from orangecontrib.spark.utils.gui_utils import GuiParam
+from orangecontrib.spark.utils.gui_utils import GuiParam, create_filtered_list_view, selected_rows, select_rows
+from orangecontrib.spark.utils.spark_api_utils import get_table_partitions, partition_predicates, filter_partitions, \
+    estimate_size_in_bytes, format_bytes, quote_column
 
 
 class OWSparkSQLTableContext(SharedSparkContext, widget.OWWidget):
@@ -22,9 +25,13 @@ class OWSparkSQLTableContext(SharedSparkContext, widget.OWWidget):
     databases = ['default']
     tables = list()
     out_df = None
+    table_df = None
     database = ''
     table = ''
+    partitions = list()
     saved_gui_params = Setting(OrderedDict())
+    saved_columns = Setting([])
+    saved_partition_filters = Setting(OrderedDict())
 
     def __init__(self):
         super().__init__()
@@ -49,7 +56,22 @@ class OWSparkSQLTableContext(SharedSparkContext, widget.OWWidget):
                                                    callback_func = self.refresh_database)
 
         default_value = self.saved_gui_params.get('table', '')
-        self.gui_parameters['table'] = GuiParam(parent_widget = box, label = 'Table', default_value = default_value, list_values = [default_value])
+        self.gui_parameters['table'] = GuiParam(parent_widget = box, label = 'Table', default_value = default_value, list_values = [default_value],
+                                                callback_func = self.refresh_table)
+
+        # Columns to project, nothing selected means all columns.
+        self.columns_box = gui.widgetBox(self.controlArea, 'Columns (none selected = all)', addSpace = True)
+        self.columns_model = itemmodels.PyListModel()
+        self.columns_view = create_filtered_list_view(self.columns_box, self.columns_model)
+        self.columns_view.selectionModel().selectionChanged.connect(self.update_info)
+
+        # One list of values per partition column, nothing selected means all values.
+        self.partitions_box = gui.widgetBox(self.controlArea, 'Partitions (none selected = all)', orientation = 'horizontal', addSpace = True)
+        self.partition_views = OrderedDict()
+
+        self.info_box = gui.widgetBox(self.controlArea, 'Info')
+        self.info_label = gui.label(self.info_box, self, 'No table selected.')
+
         self.refresh_database(self.gui_parameters['database'].get_value())
 
         action_box = gui.widgetBox(box)
@@ -67,17 +89,116 @@ class OWSparkSQLTableContext(SharedSparkContext, widget.OWWidget):
         self.database = text
         if self.databases and self.databases != '':
             self.tables = self.hc.tableNames(self.database)
+            current_table = self.gui_parameters['table'].get_value()
             self.gui_parameters['table'].update(values = self.tables)
+            index = self.gui_parameters['table'].widget.findText(current_table)
+            if index >= 0:
+                self.gui_parameters['table'].widget.setCurrentIndex(index)
+            self.refresh_table(self.gui_parameters['table'].get_value())
 
     def dummy_func(self):
         pass
 
+    def refresh_table(self, text):
+        """
+        Load the schema and the partitions of the selected table, no Spark job is run.
+        """
+        self.table_df = None
+        self.partitions = []
+        self.columns_model.wrap([])
+        for view in self.partition_views.values():
+            view.parent().deleteLater()
+        self.partition_views = OrderedDict()
+
+        if self.hc is None or not text:
+            self.update_info()
+            return
+        self.database = self.gui_parameters['database'].get_value()
+        self.table = text
+        table_name = self.qualified_table_name()
+        try:
+            self.table_df = self.hc.table(table_name)
+        except Exception as e:
+            self.info_label.setText('Cannot read {0}:\n{1}'.format(table_name, e))
+            return
+        self.partitions = get_table_partitions(self.hc, table_name)
+
+        partition_columns = list(self.partitions[0].keys()) if self.partitions else []
+        self.columns_model.wrap(['{0} ({1}){2}'.format(name, dtype, ' [partition]' if name in partition_columns else '')
+                                 for name, dtype in self.table_df.dtypes])
+        # Restore the saved selections only for the table they were saved for.
+        is_saved_table = (self.saved_gui_params.get('database') == self.database and self.saved_gui_params.get('table') == self.table)
+        saved_columns = set(self.saved_columns) if is_saved_table else set()
+        select_rows(self.columns_view, [i for i, name in enumerate(self.table_df.columns) if name in saved_columns])
+
+        for column in partition_columns:
+            values = sorted(set(spec[column] for spec in self.partitions))
+            column_box = gui.widgetBox(self.partitions_box, column)
+            view = create_filtered_list_view(column_box, itemmodels.PyListModel(values, parent = column_box))
+            saved_values = set(self.saved_partition_filters.get(column, [])) if is_saved_table else set()
+            select_rows(view, [i for i, value in enumerate(values) if value in saved_values])
+            view.selectionModel().selectionChanged.connect(self.update_info)
+            self.partition_views[column] = view
+
+        self.update_info()
+
+    def qualified_table_name(self):
+        return self.database + '.' + self.table
+
+    def selected_columns(self):
+        if self.table_df is None:
+            return []
+        columns = self.table_df.columns
+        return [columns[i] for i in selected_rows(self.columns_view)]
+
+    def partition_filters(self):
+        filters = OrderedDict()
+        for column, view in self.partition_views.items():
+            model = view.model().sourceModel()
+            filters[column] = [model[i] for i in selected_rows(view)]
+        return filters
+
+    def pruned_dataframe(self):
+        """
+        Apply the partition predicates and the column projection to the table.
+        Partition filters on the table scan let Spark skip whole directories and the
+        projection lets Parquet/ORC read only the selected columns.
+        """
+        df = self.table_df
+        predicates = partition_predicates(self.partition_filters())
+        if predicates:
+            df = df.filter(' AND '.join(predicates))
+        columns = self.selected_columns()
+        if columns:
+            df = df.select(*[quote_column(c) for c in columns])
+        return df
+
+    def update_info(self, *_):
+        if self.table_df is None:
+            self.info_label.setText('No table selected.')
+            return
+        n_columns = len(self.selected_columns()) or len(self.table_df.columns)
+        text = '{0} of {1} columns'.format(n_columns, len(self.table_df.columns))
+        if self.partitions:
+            n_partitions = len(filter_partitions(self.partitions, self.partition_filters()))
+            text += '\n{0} of {1} partitions'.format(n_partitions, len(self.partitions))
+        try:
+            n_bytes = estimate_size_in_bytes(self.pruned_dataframe())
+        except Exception:
+            n_bytes = None
+        text += '\nEstimated size: ' + format_bytes(n_bytes)
+        self.info_label.setText(text)
+
     def submit(self):
         if self.hc is None:
             return
         self.database = self.gui_parameters['database'].get_value()
         self.table = self.gui_parameters['table'].get_value()
-        self.out_df = self.hc.table(self.database + '.' + self.table)
+        if self.table_df is None:
+            self.refresh_table(self.table)
+        if self.table_df is None:
+            return
+        self.out_df = self.pruned_dataframe()
         self.send("DataFrame", self.out_df)
         self.update_saved_gui_parameters()
         self.hide()
@@ -85,3 +206,5 @@ class OWSparkSQLTableContext(SharedSparkContext, widget.OWWidget):
     def update_saved_gui_parameters(self):
         for k in self.gui_parameters:
             self.saved_gui_params[k] = self.gui_parameters[k].get_value()
+        self.saved_columns = self.selected_columns()
+        self.saved_partition_filters = self.partition_filters()
@@ -3,8 +3,10 @@ from Orange.data import Table
 from PyQt4.QtGui import QSizePolicy
 from Orange.widgets import widget, gui
 from orangecontrib.spark.utils.data_utils import pandas_to_orange
+from orangecontrib.spark.utils.lazy_table import SparkTable
 import pandas
 from Orange.widgets import widget, gui, settings
+from Orange.widgets.settings import Setting
 from pyspark import SparkConf, SparkContext
 import pyspark
 
@@ -20,13 +22,35 @@ class OWSparkToOrange(widget.OWWidget):
     settingsHandler = settings.DomainContextHandler()
 
     NOTHING = "Nothing on input"
+    in_df = None
+    lazy = Setting(False)
+    class_column = Setting('')
+    max_discrete_values = Setting(100)
+    download_limit = Setting(10000)
 
     def __init__(self):
         super().__init__()
 
         gui.label(self.controlArea, self, "Spark->Orange:")
+        # A lazy table computes statistics, distributions and contingencies with Spark and downloads only a sample.
+        box = gui.widgetBox(self.controlArea, "Lazy table")
+        gui.checkBox(box, self, "lazy", "Keep the data in Spark", callback = self.convert)
+        gui.lineEdit(box, self, "class_column", label = "Class column:", orientation = "horizontal")
+        gui.spin(box, self, "max_discrete_values", 2, 10000, label = "Max. discrete values:")
+        gui.spin(box, self, "download_limit", 100, 10000000, step = 1000, label = "Sampled rows:")
+        gui.button(box, self, "Apply", callback = self.convert)
         self.setSizePolicy(QSizePolicy.Maximum, QSizePolicy.Maximum)
 
     def get_input(self, obj):
-        df = obj.toPandas()
-        self.send("Table", pandas_to_orange(df))
+        self.in_df = obj
+        self.convert()
+
+    def convert(self):
+        if self.in_df is None:
+            self.send("Table", None)
+        elif self.lazy:
+            self.send("Table", SparkTable(self.in_df, class_column = self.class_column.strip() or None,
+                                          max_discrete_values = self.max_discrete_values, download_limit = self.download_limit))
+        else:
+            df = self.in_df.toPandas()
+            self.send("Table", pandas_to_orange(df))
@@ -0,0 +1,143 @@
+__author__ = 'jamh'
+
+import pyspark
+from Orange.widgets import widget, gui
+from Orange.widgets.settings import Setting
+from PyQt4 import QtCore
+
+from orangecontrib.spark.base.shared_spark_context import SharedSparkContext
+from orangecontrib.spark.utils.spark_api_utils import SparkJob, format_bytes
+from orangecontrib.spark.utils.write_utils import FORMATS, write_dataframe, read_back, table_location, partition_stats, list_data_files
+
+MODES = ['overwrite', 'append', 'ignore', 'error']
+
+
+class OWSparkWriter(SharedSparkContext, widget.OWWidget):
+    priority = 12
+    name = "Writer"
+    description = "Write a DataFrame to Parquet, ORC, CSV, JSON or a Hive table and output the written copy"
+    icon = "../icons/Save.svg"
+
+    inputs = [("DataFrame", pyspark.sql.DataFrame, "get_input", widget.Default)]
+    outputs = [("DataFrame", pyspark.sql.DataFrame, widget.Dynamic)]
+
+    in_df = None
+    job = None
+    want_main_area = False
+    resizing_enabled = True
+
+    format_index = Setting(0)
+    as_table = Setting(False)
+    target = Setting('')
+    mode_index = Setting(0)
+    partition_columns = Setting('')
+    bucket_columns = Setting('')
+    n_buckets = Setting(0)
+    target_file_mb = Setting(128)
+    csv_header = Setting(True)
+    compute_stats = Setting(True)
+
+    def __init__(self):
+        super().__init__()
+
+        self.box = gui.widgetBox(self.controlArea, 'Parameters:', addSpace = True)
+        gui.comboBox(self.box, self, 'format_index', label = 'Format:', items = FORMATS, orientation = 'horizontal')
+        gui.checkBox(self.box, self, 'as_table', 'Save as a Hive table (saveAsTable)')
+        gui.lineEdit(self.box, self, 'target', label = 'Path or table:', orientation = 'horizontal')
+        gui.comboBox(self.box, self, 'mode_index', label = 'Mode:', items = MODES, orientation = 'horizontal')
+        gui.lineEdit(self.box, self, 'partition_columns', label = 'partitionBy:', orientation = 'horizontal', tooltip = 'comma separated')
+        gui.lineEdit(self.box, self, 'bucket_columns', label = 'bucketBy:', orientation = 'horizontal',
+                     tooltip = 'comma separated, tables only')
+        gui.spin(self.box, self, 'n_buckets', 0, 100000, label = 'Buckets:')
+        gui.spin(self.box, self, 'target_file_mb', 0, 10000, label = 'Target file size (MB, 0 keeps the partitioning):')
+        gui.checkBox(self.box, self, 'csv_header', 'CSV header')
+        gui.checkBox(self.box, self, 'compute_stats', 'Report rows and bytes per partition')
+
+        self.action_box = gui.widgetBox(self.box, orientation = 'horizontal')
+        self.write_button = gui.button(self.action_box, self, 'Write', callback = self.write)
+        self.cancel_button = gui.button(self.action_box, self, 'Cancel', callback = self.cancel)
+        self.cancel_button.setEnabled(False)
+
+        self.info_box = gui.widgetBox(self.controlArea, 'Info')
+        self.info_label = gui.label(self.info_box, self, '')
+
+        self.job_timer = QtCore.QTimer(self)
+        self.job_timer.setInterval(200)
+        self.job_timer.timeout.connect(self.check_job)
+
+    def get_input(self, obj = None):
+        self.in_df = obj
+
+    def onDeleteWidget(self):
+        if self.job is not None:
+            self.job.cancel()
+
+    def write(self):
+        if self.in_df is None or not self.target.strip() or self.job is not None:
+            return
+        split = lambda text: [c.strip() for c in text.split(',') if c.strip()]
+        df = self.in_df
+        fmt = FORMATS[self.format_index]
+        target = self.target.strip()
+        as_table = self.as_table
+        partition_cols = split(self.partition_columns)
+        options = { 'header': str(self.csv_header).lower() } if fmt == 'csv' else { }
+        compute_stats = self.compute_stats
+        kwargs = dict(mode = MODES[self.mode_index], partition_cols = partition_cols, target_file_bytes = self.target_file_mb * 1024 * 1024,
+                      as_table = as_table, bucket_cols = split(self.bucket_columns), n_buckets = self.n_buckets, options = options)
+
+        def run():
+            # Files already there before an append are not part of this write.
+            previous_files = self.existing_files(target, as_table) if compute_stats and kwargs['mode'] == 'append' else { }
+            write_dataframe(df, target, fmt, **kwargs)
+            path = table_location(self.hc, target) if as_table else target
+            stats = partition_stats(self.sc, self.hc, path, fmt, partition_cols, previous_files, options) if compute_stats and path else None
+            return read_back(self.hc, target, fmt, as_table, df.schema, options), stats
+
+        self.job = SparkJob(self.sc, run, 'Write ' + target)
+        self.set_running(True)
+        self.job.start()
+        self.job_timer.start()
+
+    def existing_files(self, target, as_table):
+        if as_table:
+            try:
+                target = table_location(self.hc, target)
+            except Exception:
+                # The table does not exist yet.
+                return { }
+        return list_data_files(self.sc, target) if target else { }
+
+    def cancel(self):
+        if self.job is not None:
+            self.job.cancel()
+            self.info_label.setText('Cancelling...')
+
+    def set_running(self, running):
+        self.write_button.setDisabled(running)
+        self.cancel_button.setEnabled(running)
+        if running:
+            self.progressBarInit()
+        else:
+            self.progressBarFinished()
+
+    def check_job(self):
+        job = self.job
+        if not job.done():
+            self.info_label.setText('Writing for {0:.1f} s'.format(job.elapsed))
+            return
+        self.job_timer.stop()
+        self.job = None
+        self.set_running(False)
+        if job.error is not None:
+            self.info_label.setText('Cancelled.' if job.cancelled else 'Write failed: ' + str(job.error))
+            return
+
+        out_df, stats = job.result
+        text = 'Written in {0:.1f} s.'.format(job.elapsed)
+        if stats:
+            text += '\n{0} rows, {1} in {2} files, {3} partition(s).'.format(sum(s['rows'] for s in stats), format_bytes(sum(s['bytes'] for s in stats)),
+                                                                            sum(s['files'] for s in stats), len(stats))
+        self.info_label.setText(text)
+        # Downstream widgets start from the written copy instead of the original lineage.
+        self.send("DataFrame", out_df)
@@ -1,5 +1,6 @@
+import re
 import sys
-from functools import partial, reduce
+from functools import partial
 
 import Orange
 from Orange.widgets import gui, widget
@@ -138,6 +139,10 @@ class VariablesListItemView(QtGui.QListView):
     def __init__(self, parent = None, acceptedType = str):
         super().__init__(parent)
         self.setSelectionMode(self.ExtendedSelection)
+        # Lay out long lists lazily, in batches.
+        self.setUniformItemSizes(True)
+        self.setLayoutMode(self.Batched)
+        self.setBatchSize(500)
         self.setAcceptDrops(True)
         self.setDragEnabled(True)
         self.setDropIndicatorShown(True)
@@ -233,26 +238,42 @@ class VariableFilterProxyModel(QtGui.QSortFilterProxyModel):
     """ A proxy model for filtering a list of variables based on
     their names and labels.
 
+    The matching names are looked up once per filter change in
+    `column_index` (a ColumnIndex), rows are then only tested for
+    membership.
     """
 
     def __init__(self, parent = None):
         super().__init__(parent)
         self._filter_string = ""
+        self._filters = []
+        self._accepted = None
+        self.column_index = None
+
+    def set_column_index(self, column_index):
+        self.column_index = column_index
+        self.set_filter_string(self._filter_string)
 
     def set_filter_string(self, filter):
         self._filter_string = str(filter).lower()
+        self._filters = self._filter_string.split()
+        if self.column_index is not None:
+            self._accepted = self.column_index.search(self._filter_string)
+        else:
+            self._accepted = None
         self.invalidateFilter()
 
     def filter_accepts_variable(self, var):
-        row_str = var
-        row_str = row_str.lower()
-        filters = self._filter_string.split()
-
-        return all(f in row_str for f in filters)
+        if self.column_index is not None:
+            return self._accepted is None or var in self._accepted
+        row_str = var.lower()
+        return all(f in row_str for f in self._filters)
 
     def filterAcceptsRow(self, source_row, source_parent):
         model = self.sourceModel()
-        if isinstance(model, itemmodels.VariableListModel):
+        if not self._filters:
+            return True
+        if isinstance(model, itemmodels.PyListModel):
             var = model[source_row]
             return self.filter_accepts_variable(var)
         else:
@@ -286,7 +307,11 @@ class CompleterNavigator(QtCore.QObject):
 
 from orangecontrib.spark.base.shared_spark_context import SharedSparkContext
 import pyspark
-from pyspark.ml.feature import VectorAssembler
+from pyspark.ml import PipelineModel
+from pyspark.ml.feature import StringIndexer, VectorAssembler
+from Orange.widgets.settings import Setting
+from orangecontrib.spark.utils.data_utils import ColumnIndex, TYPE_GROUPS
+from orangecontrib.spark.utils.ml_api_utils import assembly_pipeline
 
 
 class OWSparkMLDatasetBuilder(SharedSparkContext, widget.OWWidget):
@@ -297,7 +322,8 @@ class OWSparkMLDatasetBuilder(SharedSparkContext, widget.OWWidget):
     author = "Jose Antonio Martin H."
     author_email = "xjamartinh@gmail.com"
     inputs = [("DataFrame", pyspark.sql.DataFrame, "set_data", widget.Default)]
-    outputs = [("DataFrame", pyspark.sql.DataFrame, widget.Dynamic)]
+    outputs = [("DataFrame", pyspark.sql.DataFrame, widget.Dynamic),
+               ("Pipeline Model", PipelineModel)]
 
     want_main_area = False
     want_control_area = True
@@ -306,6 +332,8 @@ class OWSparkMLDatasetBuilder(SharedSparkContext, widget.OWWidget):
 
     in_df = None
     out_df = None
+    column_index = None
+    encode_categorical = Setting(True)
 
     def __init__(self):
         super().__init__()
@@ -317,7 +345,8 @@ class OWSparkMLDatasetBuilder(SharedSparkContext, widget.OWWidget):
         box = gui.widgetBox(self.controlArea, "Available Variables",
                             addToLayout = False)
         self.filter_edit = QtGui.QLineEdit()
-        self.filter_edit.setToolTip("Filter the list of available variables.")
+        self.filter_edit.setToolTip("Filter the list of available variables, "
+                                    "words starting with ^ match the beginning of the name.")
         box.layout().addWidget(self.filter_edit)
         if hasattr(self.filter_edit, "setPlaceholderText"):
             self.filter_edit.setPlaceholderText("Filter")
@@ -326,8 +355,9 @@ class OWSparkMLDatasetBuilder(SharedSparkContext, widget.OWWidget):
         self.completer.setCompletionMode(QtGui.QCompleter.InlineCompletion)
         self.completer_model = QtGui.QStringListModel()
         self.completer.setModel(self.completer_model)
+        self.completer.setCaseSensitivity(Qt.CaseInsensitive)
         self.completer.setModelSorting(
-            QtGui.QCompleter.CaseSensitivelySortedModel)
+            QtGui.QCompleter.CaseInsensitivelySortedModel)
 
         self.filter_edit.setCompleter(self.completer)
         self.completer_navigator = CompleterNavigator(self)
@@ -344,6 +374,7 @@ class OWSparkMLDatasetBuilder(SharedSparkContext, widget.OWWidget):
         aa.dataChanged.connect(self.update_completer_model)
         aa.rowsInserted.connect(self.update_completer_model)
         aa.rowsRemoved.connect(self.update_completer_model)
+        aa.modelReset.connect(self.update_completer_model)
 
         self.available_attrs_view.selectionModel().selectionChanged.connect(partial(self.update_interface_state, self.available_attrs_view))
         self.filter_edit.textChanged.connect(self.update_completer_prefix)
@@ -394,11 +425,26 @@ class OWSparkMLDatasetBuilder(SharedSparkContext, widget.OWWidget):
         self.move_meta_button = gui.button(bbox, self, ">", callback = partial(self.move_selected, self.meta_attrs_view))
         self.down_meta_button = gui.button(bbox, self, "Down", callback = partial(self.move_down, self.meta_attrs_view))
 
+        box = gui.widgetBox(self.controlArea, "Assign by name and type", orientation = "horizontal", addToLayout = False)
+        self.pattern_edit = QtGui.QLineEdit()
+        self.pattern_edit.setPlaceholderText("Regular expression, empty matches all")
+        box.layout().addWidget(self.pattern_edit)
+        self.type_combo = QtGui.QComboBox()
+        self.type_combo.addItems(["any type"] + TYPE_GROUPS)
+        box.layout().addWidget(self.type_combo)
+        gui.button(box, self, "features", callback = partial(self.assign_matching, self.used_attrs))
+        gui.button(box, self, "label", callback = partial(self.assign_matching, self.class_attrs, exclusive = True))
+        gui.button(box, self, "meta", callback = partial(self.assign_matching, self.meta_attrs))
+        self.assign_label = gui.label(box, self, "")
+        layout.addWidget(box, 3, 0, 1, 3)
+
         bbox = gui.widgetBox(self.controlArea, orientation = "horizontal", addToLayout = False, margin = 0)
+        gui.checkBox(bbox, self, "encode_categorical", "Encode string and boolean columns")
         gui.button(bbox, self, "Apply", callback = self.commit)
         gui.button(bbox, self, "Reset", callback = self.reset)
+        self.commit_label = gui.label(bbox, self, "")
 
-        layout.addWidget(bbox, 3, 0, 1, 3)
+        layout.addWidget(bbox, 4, 0, 1, 3)
         layout.setRowStretch(0, 4)
         layout.setRowStretch(1, 0)
         layout.setRowStretch(2, 2)
@@ -416,18 +462,33 @@ class OWSparkMLDatasetBuilder(SharedSparkContext, widget.OWWidget):
         self.data = data
         if self.data is not None:
             self.in_df = self.data
-            # self.used_attrs.
-            # self.class_attrs = VariablesListItemModel()
-            # self.meta_attrs = VariablesListItemModel()
-            self.available_attrs.extend(sorted(self.in_df.columns))
+            self.column_index = ColumnIndex([(f.name, f.dataType.simpleString()) for f in self.in_df.schema.fields])
+            self.available_attrs_proxy.set_column_index(self.column_index)
+            self.restore_roles(self.domain_role_hints or {})
 
         else:
             self.data = None
             self.in_df = None
-            # self.used_attrs = VariablesListItemModel()
-            # self.class_attrs = VariablesListItemModel()
-            # self.meta_attrs = VariablesListItemModel()
-            # self.available_attrs = VariablesListItemModel()
+            self.column_index = None
+            self.available_attrs_proxy.set_column_index(None)
+            self.restore_roles({})
+
+    def restore_roles(self, hints):
+        """ Fill the role models in one reset each, columns keep their
+        previous role and position, new ones are available.
+        """
+        roles = {"available": [], "attribute": [], "class": [], "meta": []}
+        names = self.column_index.sorted_names if self.column_index is not None else []
+        for name in names:
+            role, position = hints.get(name, ("available", sys.maxsize))
+            roles[role].append((position, name))
+        for role in roles:
+            roles[role] = [name for _, name in sorted(roles[role], key = lambda item: item[0])]
+        roles["available"].extend(roles["class"][1:])
+        self.class_attrs.wrap(roles["class"][:1])
+        self.used_attrs.wrap(roles["attribute"])
+        self.meta_attrs.wrap(roles["meta"])
+        self.available_attrs.wrap(roles["available"])
 
     def update_domain_role_hints(self):
         """ Update the domain hints to be stored in the widgets settings.
@@ -534,18 +595,42 @@ class OWSparkMLDatasetBuilder(SharedSparkContext, widget.OWWidget):
         if move_meta_enabled:
             self.move_meta_button.setText(">" if available_selected else "<")
 
+    def assign_matching(self, dst_model, exclusive = False):
+        """ Move all the available columns matching the pattern and
+        type to `dst_model` at once.
+        """
+        if self.column_index is None:
+            return
+        group = self.type_combo.currentText()
+        try:
+            matched = set(self.column_index.match(self.pattern_edit.text(), None if group == "any type" else group))
+        except re.error as e:
+            self.assign_label.setText("Invalid pattern: " + str(e))
+            return
+
+        available = list(self.available_attrs)
+        moved = [name for name in available if name in matched]
+        if exclusive:
+            moved = moved[:1]
+            if moved and len(dst_model):
+                available.append(dst_model[0])
+                dst_model.wrap([])
+        moved_set = set(moved)
+        self.available_attrs.wrap([name for name in available if name not in moved_set])
+        dst_model.wrap(list(dst_model) + moved)
+        self.assign_label.setText("%d column(s) assigned" % len(moved))
+
     def update_completer_model(self, *_):
         """ This gets called when the model for available attributes changes
         through either drag/drop or the left/right button actions.
 
         """
-        vars = [att for att in self.available_attrs]
-        items = [var for var in vars]
-        labels = [label for label in vars]
-        items.extend(["%s" % item for item in labels])
-        items.extend(reduce(list.__add__, list(map(list, labels)), []))
-
-        new = sorted(set(items))
+        if self.column_index is not None:
+            # Already sorted by the index, linear in the number of columns.
+            available = set(self.available_attrs)
+            new = [name for name in self.column_index.sorted_names if name in available]
+        else:
+            new = sorted(set(self.available_attrs))
         if new != self.original_completer_items:
             self.original_completer_items = new
             self.completer_model.setStringList(self.original_completer_items)
@@ -572,24 +657,44 @@ class OWSparkMLDatasetBuilder(SharedSparkContext, widget.OWWidget):
             attributes = [att for att in self.used_attrs._list]
             class_var = [var for var in self.class_attrs._list]
             metas = [meta for meta in self.meta_attrs._list]
-            VA = VectorAssembler(inputCols = attributes, outputCol = 'features')
-            self.out_df = VA.transform(self.in_df)
-            if len(class_var):
-                self.out_df = self.out_df.withColumn('label', self.out_df[class_var[0]].cast('double'))
+            label = class_var[0] if len(class_var) else None
+            if self.encode_categorical:
+                try:
+                    pipeline, categorical, label_indexed = assembly_pipeline(self.in_df, attributes, label)
+                except ValueError as e:
+                    self.commit_label.setText(str(e))
+                    return
+                n_indexers = sum(isinstance(stage, StringIndexer) for stage in pipeline.getStages())
+                if n_indexers > 1 and not self.in_df.is_cached:
+                    # Older Spark versions fit one indexer at a time, read the input once.
+                    self.in_df.persist()
+                    try:
+                        model = pipeline.fit(self.in_df)
+                    finally:
+                        self.in_df.unpersist()
+                else:
+                    model = pipeline.fit(self.in_df)
+                self.out_df = model.transform(self.in_df)
+                if label_indexed not in (None, 'label'):
+                    # The input already had a 'label' column, the indexed label was written next to it.
+                    self.out_df = self.out_df.withColumn('label', self.out_df[label_indexed]).drop(label_indexed)
+                self.commit_label.setText("%d categorical column(s) encoded, %d stage(s)" % (len(categorical), len(model.stages)))
+            else:
+                model, label_indexed = None, None
+                VA = VectorAssembler(inputCols = attributes, outputCol = 'features')
+                self.out_df = VA.transform(self.in_df)
+                self.commit_label.setText("")
+            if label is not None and label_indexed is None:
+                self.out_df = self.out_df.withColumn('label', self.out_df[label].cast('double'))
 
             self.send("DataFrame", self.out_df)
+            self.send("Pipeline Model", model)
         else:
             self.send("DataFrame", None)
+            self.send("Pipeline Model", None)
 
     def reset(self):
-        if self.data is not None:
-            self.available_attrs.extend(sorted(self.in_df.columns))
-        else:
-            self.available_attrs._list = []
-
-        self.used_attrs._list = []
-        self.class_attrs._list = []
-        self.meta_attrs._list = []
+        self.restore_roles({})
         self.update_domain_role_hints()
 
 
@@ -1,9 +1,12 @@
 __author__ = 'jamh'
 
-from Orange.widgets import widget
-from pyspark.ml import feature
+import pyspark
+from Orange.widgets import widget, gui
+from Orange.widgets.settings import Setting
+from pyspark.ml import feature, Estimator, Model
 
 from orangecontrib.spark.base.spark_ml_transformer import OWSparkTransformer
+from orangecontrib.spark.utils.ml_api_utils import get_feature_stages
 
 
 class OWSparkMLFeature(OWSparkTransformer, widget.OWWidget):
@@ -11,7 +14,57 @@ class OWSparkMLFeature(OWSparkTransformer, widget.OWWidget):
     name = "Feature"
     description = "Features"
     icon = "../icons/FeatureConstructor.svg"
+    outputs = [("DataFrame", pyspark.sql.DataFrame, widget.Dynamic),
+               ("Model", Model, widget.Dynamic)]
 
     module = feature
     module_name = 'feature'
     box_text = "Spark Feature Transformers"
+    get_modules = get_feature_stages
+
+    out_model = None
+    model_key = None
+    persisted_df = None
+    var_reuse_model = Setting(True)
+
+    def __init__(self):
+        super().__init__()
+        gui.checkBox(self.action_box, self, value = 'var_reuse_model', label = 'reuse the fitted model for inputs with the same schema?')
+
+    def get_input(self, obj):
+        if self.persisted_df is not None and self.persisted_df is not obj:
+            self.persisted_df.unpersist()
+            self.persisted_df = None
+        super().get_input(obj)
+        if self.in_df and self.var_reuse_model and self.out_model is not None and self.fit_key() == self.model_key:
+            self.out_df = self.out_model.transform(self.in_df)
+            self.send("DataFrame", self.out_df)
+
+    def fit_key(self):
+        params = tuple((k, self.gui_parameters[k].get_value()) for k in self.method_parameters)
+        return self.method.__name__, params, self.in_df.schema.json()
+
+    def apply(self):
+        if not issubclass(self.method, Estimator):
+            self.send("Model", None)
+            super().apply()
+            return
+
+        key = self.fit_key()
+        if not (self.var_reuse_model and self.out_model is not None and key == self.model_key):
+            method_instance = self.method()
+            paramMap = self.build_param_map(method_instance)
+            # Fit and transform read the same cached input.
+            if not self.in_df.is_cached:
+                self.persisted_df = self.in_df.persist()
+            self.out_model = method_instance.fit(self.in_df, params = paramMap)
+            self.model_key = key
+
+        self.out_df = self.out_model.transform(self.in_df)
+        if self.var_cache_check:
+            self.out_df = self.out_df.cache()
+
+        self.send("DataFrame", self.out_df)
+        self.send("Model", self.out_model)
+        self.update_saved_gui_parameters()
+        self.hide()
@@ -0,0 +1,79 @@
+__author__ = 'jamh'
+from collections import OrderedDict
+
+import pyspark
+from Orange.widgets import widget, gui
+from Orange.widgets.settings import Setting
+
+from orangecontrib.spark.utils.gui_utils import GuiParam
+from orangecontrib.spark.utils.ml_api_utils import hash_features, hashing_collision_stats
+
+
+class OWSparkMLFeatureHasher(widget.OWWidget):
+    priority = 6
+    name = "Feature Hasher"
+    description = "Hash categorical and numeric columns into a fixed size sparse feature vector"
+    icon = "../icons/FeatureConstructor.svg"
+
+    inputs = [("DataFrame", pyspark.sql.DataFrame, "get_input", widget.Default)]
+    outputs = [("DataFrame", pyspark.sql.DataFrame, widget.Dynamic)]
+
+    in_df = None
+    out_df = None
+    want_main_area = False
+    resizing_enabled = True
+    saved_gui_params = Setting(OrderedDict())
+    compute_collisions = Setting(True)
+
+    def __init__(self):
+        super().__init__()
+
+        self.box = gui.widgetBox(self.controlArea, 'Parameters:', addSpace = True)
+
+        self.gui_parameters = OrderedDict()
+        default_value = self.saved_gui_params.get('inputCols', 'None')
+        self.gui_parameters['inputCols'] = GuiParam(parent_widget = self.box, label = 'inputCols', default_value = default_value,
+                                                    place_holder_text = 'comma separated, None hashes all columns')
+        default_value = self.saved_gui_params.get('categoricalCols', 'None')
+        self.gui_parameters['categoricalCols'] = GuiParam(parent_widget = self.box, label = 'categoricalCols', default_value = default_value,
+                                                          place_holder_text = 'numeric columns to hash as categories, e.g. ids')
+        default_value = self.saved_gui_params.get('numFeatures', str(1 << 18))
+        self.gui_parameters['numFeatures'] = GuiParam(parent_widget = self.box, label = 'numFeatures', default_value = default_value)
+        default_value = self.saved_gui_params.get('outputCol', 'features')
+        self.gui_parameters['outputCol'] = GuiParam(parent_widget = self.box, label = 'outputCol', default_value = default_value)
+
+        self.action_box = gui.widgetBox(self.box)
+        gui.checkBox(self.action_box, self, 'compute_collisions', 'Compute collision statistics (one extra pass)')
+        self.create_sc_btn = gui.button(self.action_box, self, label = 'Apply', callback = self.apply)
+
+        self.info_box = gui.widgetBox(self.controlArea, 'Collisions')
+        self.info_label = gui.label(self.info_box, self, '')
+
+    def get_input(self, obj = None):
+        self.in_df = obj
+
+    def get_columns(self, name):
+        value = self.gui_parameters[name].get_usable_value()
+        return [c.strip() for c in str(value).split(',')] if value is not None else None
+
+    def update_saved_gui_parameters(self):
+        for k in self.gui_parameters:
+            self.saved_gui_params[k] = self.gui_parameters[k].get_value()
+
+    def apply(self):
+        if self.in_df:
+            output_col = self.gui_parameters['outputCol'].get_value()
+            num_features = self.gui_parameters['numFeatures'].get_usable_value()
+            input_cols = self.get_columns('inputCols') or [c for c in self.in_df.columns if c != output_col]
+            categorical_cols = self.get_columns('categoricalCols') or []
+
+            if self.compute_collisions:
+                stats = hashing_collision_stats(self.in_df, input_cols, num_features, categorical_cols)
+                stats['collision rate'] = '{0:.2%}'.format(stats['collision rate'])
+                self.info_label.setText('\n'.join('{0}: {1}'.format(k, v) for k, v in stats.items()))
+            else:
+                self.info_label.setText('')
+
+            self.out_df = hash_features(self.in_df, input_cols, num_features, output_col, categorical_cols)
+            self.send("DataFrame", self.out_df)
+            self.update_saved_gui_parameters()
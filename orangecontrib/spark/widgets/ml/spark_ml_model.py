@@ -1,20 +1,30 @@
 __author__ = 'jamh'
 
+from collections import OrderedDict
+
 import pyspark
-from Orange.widgets import widget
+from Orange.widgets import widget, gui
+from Orange.widgets.settings import Setting
+from PyQt4 import QtCore, QtGui
 from pyspark.ml import Model
 from pyspark.sql import HiveContext
 
 from orangecontrib.spark.base.shared_spark_context import SharedSparkContext
+from orangecontrib.spark.utils.spark_api_utils import format_bytes
+from orangecontrib.spark.utils.write_utils import write_dataframe, table_location, partition_stats, list_data_files
+
+OUTPUT_PARAMS = ('predictionCol', 'probabilityCol', 'rawPredictionCol')
+# The default names of the OUTPUT_PARAMS columns.
+OUTPUT_COLUMNS = ('prediction', 'probability', 'rawPrediction')
 
 
 class OWSparkMLMOdel(SharedSparkContext, widget.OWWidget):
     priority = 7
     name = "Model Transformer"
-    description = "Applies a fitted model to an input DataFrame and outputs the resulting DataFrame"
+    description = "Applies fitted models to an input DataFrame and outputs the resulting DataFrame"
     icon = "../icons/Normalize.svg"
     inputs = [("DataFrame", pyspark.sql.DataFrame, "get_input_df", widget.Default),
-              ("Model", pyspark.ml.Model, "get_input_model", widget.Default)]
+              ("Model", pyspark.ml.Model, "get_input_model", widget.Multiple + widget.Default)]
     outputs = [("DataFrame", pyspark.sql.DataFrame, widget.Dynamic)]
     # settingsHandler = settings.DomainContextHandler()
 
@@ -23,14 +33,38 @@ class OWSparkMLMOdel(SharedSparkContext, widget.OWWidget):
 
     conf = None
     in_df = None
-    model = None
     out_df = None
+    sink_targets = ['parquet', 'hive table']
+    sink_target = Setting(0)
+    sink_path = Setting('')
+    sink_mode = Setting(0)
+    sink_partition_columns = Setting('')
+    sink_columns = Setting('')
+    sink_file_mb = Setting(128)
 
     def __init__(self):
         super().__init__()
+        self.models = OrderedDict()
 
         # The main label of the Control's GUI.
         # gui.label(self.controlArea, self, "Spark Context")
+        self.info_box = gui.widgetBox(self.controlArea, 'Info')
+        self.info_label = gui.label(self.info_box, self, 'No model on input.')
+
+        # Sink: write the scored DataFrame instead of pulling it into Orange.
+        self.sink_box = gui.widgetBox(self.controlArea, 'Write predictions')
+        gui.comboBox(self.sink_box, self, 'sink_target', label = 'Target:', items = self.sink_targets, orientation = 'horizontal')
+        gui.lineEdit(self.sink_box, self, 'sink_path', label = 'Path or table:', orientation = 'horizontal')
+        gui.comboBox(self.sink_box, self, 'sink_mode', label = 'Mode:', items = ['overwrite', 'append'], orientation = 'horizontal')
+        gui.lineEdit(self.sink_box, self, 'sink_partition_columns', label = 'Partition columns:', orientation = 'horizontal',
+                     tooltip = 'comma separated')
+        gui.lineEdit(self.sink_box, self, 'sink_columns', label = 'Output columns:', orientation = 'horizontal',
+                     tooltip = 'comma separated, empty writes all the columns')
+        gui.spin(self.sink_box, self, 'sink_file_mb', 1, 10000, label = 'Target file size (MB):')
+        gui.button(self.sink_box, self, 'Write', callback = self.write)
+        self.sink_label = gui.label(self.sink_box, self, '')
+        self.stats_table = QtGui.QTableWidget(0, 0, self.sink_box)
+        self.sink_box.layout().addWidget(self.stats_table)
 
         # Create parameters Box.
         # box = gui.widgetBox(self.controlArea, "Spark Application", addSpace = True)
@@ -42,13 +76,89 @@ class OWSparkMLMOdel(SharedSparkContext, widget.OWWidget):
         self.in_df = obj
         self.transform()
 
-    def get_input_model(self, obj):
-        self.model = obj
+    def get_input_model(self, obj, id = None):
+        if obj is None:
+            self.models.pop(id, None)
+        else:
+            self.models[id] = obj
         self.transform()
 
     def transform(self):
-        if self.in_df and self.model:
-            model_instance = self.model
-            #paramMap = self.build_param_map()
-            self.out_df = model_instance.transform(self.in_df)
+        if self.in_df and self.models:
+            self.out_df, renamed = self.chain_models(self.in_df, list(self.models.values()))
+            self.info_label.setText('\n'.join('{0}: {1}'.format(name, ', '.join(columns)) for name, columns in renamed.items()))
             self.send("DataFrame", self.out_df)
+
+    @staticmethod
+    def chain_models(df, models):
+        """
+        Apply all the models in a single chained projection, the whole batch is then scored in one job.
+        With several models the prediction, probability and raw prediction columns of each one are renamed
+        to <model>_<i>_<column> so they do not collide. Models without these Params (several Spark 2.x models)
+        get their new prediction, probability and raw prediction columns renamed after their transform, before the
+        next model runs. Any other new column, e.g. the features of a transformer, keeps its name so that a later
+        model can read it.
+        :return: the transformed DataFrame and an OrderedDict {model name: output columns}.
+        """
+        renamed = OrderedDict()
+        for i, model in enumerate(models):
+            name = '{0}_{1}'.format(type(model).__name__, i)
+            params = { }
+            if len(models) > 1:
+                for param_name in OUTPUT_PARAMS:
+                    if model.hasParam(param_name):
+                        param = model.getParam(param_name)
+                        params[param] = '{0}_{1}'.format(name, model.getOrDefault(param))
+            columns = set(df.columns)
+            df = model.transform(df, params = params)
+            outputs = [c for c in df.columns if c not in columns]
+            if len(models) > 1:
+                for column in outputs:
+                    if column in OUTPUT_COLUMNS:
+                        df = df.withColumnRenamed(column, '{0}_{1}'.format(name, column))
+                outputs = ['{0}_{1}'.format(name, c) if c in OUTPUT_COLUMNS else c for c in outputs]
+            renamed[name] = outputs
+        return df, renamed
+
+    def write(self):
+        if self.out_df is None or not self.sink_path.strip():
+            return
+        split = lambda text: [c.strip() for c in text.split(',') if c.strip()]
+        partition_cols = split(self.sink_partition_columns)
+        as_table = self.sink_targets[self.sink_target] == 'hive table'
+        target = self.sink_path.strip()
+        mode = ['overwrite', 'append'][self.sink_mode]
+        try:
+            # Files already there before an append are not part of this write.
+            previous_files = self.existing_files(target, as_table) if mode == 'append' else { }
+            write_dataframe(self.out_df, target, 'parquet', mode, partition_cols,
+                            self.sink_file_mb * 1024 * 1024, split(self.sink_columns) or None, as_table)
+            path = table_location(self.hc, target) if as_table else target
+            stats = partition_stats(self.sc, self.hc, path, 'parquet', partition_cols, previous_files)
+        except Exception as e:
+            self.sink_label.setText('Write failed: ' + str(e))
+            return
+        self.show_stats(stats)
+        self.sink_label.setText('{0} rows, {1} written to {2}'.format(sum(s['rows'] for s in stats), format_bytes(sum(s['bytes'] for s in stats)), path))
+
+    def existing_files(self, target, as_table):
+        if as_table:
+            try:
+                target = table_location(self.hc, target)
+            except Exception:
+                # The table does not exist yet.
+                return { }
+        return list_data_files(self.sc, target) if target else { }
+
+    def show_stats(self, stats):
+        headers = list(stats[0].keys()) if stats else []
+        self.stats_table.clear()
+        self.stats_table.setColumnCount(len(headers))
+        self.stats_table.setRowCount(len(stats))
+        self.stats_table.setHorizontalHeaderLabels(headers)
+        for i, item in enumerate(stats):
+            for j, (k, v) in enumerate(item.items()):
+                cell = QtGui.QTableWidgetItem(format_bytes(v) if k == 'bytes' else str(v))
+                cell.setFlags(QtCore.Qt.ItemIsEnabled)
+                self.stats_table.setItem(i, j, cell)
+        self.stats_table.resizeColumnsToContents()
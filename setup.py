@@ -72,6 +72,7 @@ if __name__ == '__main__':
             ],
             extras_require = {
                 'pyspark': [],
+                'odbc': ['pyodbc', 'pyarrow'],
 
             },
             entry_points = ENTRY_POINTS,